@@ -0,0 +1,310 @@
+"""
+Token and latency accounting per generation.
+
+Every generation (a created, regenerated, streamed or bulk blog, or one
+regenerated section) runs under a GenerationAccounting that collects the
+tokens and model of each LLM call and the wall time of each stage:
+
+    with track_generation(request.user, 'regenerate', blog=blog) as accounting:
+        with track_stage('context'):
+            context = select_documents_context(...)
+        result = generate_blog_content(...)
+        with track_stage('db'):
+            blog.apply_generation(result)
+        accounting.succeeded = True
+
+The active accounting lives in a context variable, so the LLM layer can
+report usage (core.routing records every finished call) without it being
+passed through every function; outside a tracked generation the helpers
+do nothing. When the block exits, a GenerationRecord is written together
+with an update of the user's GenerationDailyUsage row, and usage_report()
+reads those daily rows, so reports stay cheap however many records pile up.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+ACCOUNTED_STAGES = ['extraction', 'context', 'llm', 'parse', 'db']
+
+DAILY_USAGE_FIELDS = [
+    'generations', 'cached_generations', 'failed', 'llm_calls',
+    'prompt_tokens', 'completion_tokens', 'llm_ms', 'total_ms',
+]
+
+_current = ContextVar('generation_accounting', default=None)
+
+
+class GenerationAccounting:
+    """
+    Collects the usage of one generation until it is saved.
+
+    Attributes:
+        user (User): User the generation runs for
+        kind (str): One of GenerationRecord.KIND_CHOICES
+        blog (Blog): Blog created or updated, set once known
+        cached (bool): True if the result came from the generation cache
+        succeeded (bool): Set by the caller once the generation succeeded
+        prompt_tokens (int): Prompt tokens so far
+        completion_tokens (int): Completion tokens so far
+        llm_calls (int): LLM calls so far
+        timings (dict): Stage -> seconds
+    """
+
+    def __init__(self, user, kind, blog=None):
+        self.user = user
+        self.kind = kind
+        self.blog = blog
+        self.cached = False
+        self.succeeded = False
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.timings = dict.fromkeys(ACCOUNTED_STAGES, 0.0)
+        self.total_seconds = None
+        self._model_tokens = {}
+        self._open_stages = set()
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage; nested blocks of the same stage are counted once."""
+        if name in self._open_stages:
+            yield
+            return
+        self._open_stages.add(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._open_stages.discard(name)
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def add_usage(self, model=None, prompt_tokens=0, completion_tokens=0, calls=1):
+        """
+        Count the tokens of LLM calls.
+
+        Args:
+            model (str): Model that answered, if known
+            prompt_tokens (int): Prompt tokens
+            completion_tokens (int): Completion tokens
+            calls (int): Number of calls the tokens belong to
+        """
+        self.prompt_tokens += prompt_tokens or 0
+        self.completion_tokens += completion_tokens or 0
+        self.llm_calls += calls
+        if model:
+            self._model_tokens[model] = self._model_tokens.get(model, 0) + (completion_tokens or 0)
+
+    @property
+    def model(self):
+        """The model that produced most of the completion tokens, or ''."""
+        if not self._model_tokens:
+            return ''
+        return max(self._model_tokens.items(), key=lambda item: item[1])[0]
+
+    @contextmanager
+    def activate(self):
+        """Make this the accounting the helpers below report to."""
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            try:
+                _current.reset(token)
+            except ValueError:
+                # Exited in another context, e.g. a stream resumed on another thread
+                _current.set(None)
+
+    @contextmanager
+    def track(self):
+        """
+        Activate this accounting and save it when the block exits.
+
+        The generation counts as failed unless the block sets `succeeded`;
+        an exception leaving the block always does. Saving errors are
+        logged, never raised, so accounting cannot break a generation.
+        """
+        try:
+            with self.activate():
+                yield self
+        except BaseException:
+            self.succeeded = False
+            raise
+        finally:
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Error saving generation accounting: {str(e)}")
+
+    def finish(self, succeeded=None):
+        """Stop the clock; later stages (such as a batched DB write) are still added."""
+        if succeeded is not None:
+            self.succeeded = succeeded
+        if self.total_seconds is None:
+            self.total_seconds = time.perf_counter() - self._started
+
+    def to_record(self):
+        """
+        Build the GenerationRecord of this accounting (not saved).
+
+        Returns:
+            GenerationRecord: The record
+        """
+        from .models import GenerationRecord
+
+        self.finish()
+
+        def ms(seconds):
+            return int(round(seconds * 1000))
+
+        return GenerationRecord(
+            user=self.user,
+            blog=self.blog,
+            kind=self.kind,
+            model=self.model[:100],
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            llm_calls=self.llm_calls,
+            cached=self.cached,
+            succeeded=self.succeeded,
+            extraction_ms=ms(self.timings['extraction']),
+            context_ms=ms(self.timings['context']),
+            llm_ms=ms(self.timings['llm']),
+            parse_ms=ms(self.timings['parse']),
+            db_ms=ms(self.timings['db']),
+            total_ms=max(ms(self.total_seconds), sum(ms(value) for value in self.timings.values())),
+        )
+
+    def save(self):
+        """Write the record and update the daily totals."""
+        return save_generation_records([self])[0]
+
+
+def current_accounting():
+    """Return the active GenerationAccounting, or None."""
+    return _current.get()
+
+
+@contextmanager
+def track_stage(name):
+    """Time a stage of the active generation; does nothing outside one."""
+    accounting = _current.get()
+    if accounting is None:
+        yield
+        return
+    with accounting.stage(name):
+        yield
+
+
+def record_llm_usage(model=None, prompt_tokens=0, completion_tokens=0, calls=1):
+    """Count an LLM call in the active generation, if any."""
+    accounting = _current.get()
+    if accounting is not None:
+        accounting.add_usage(model, prompt_tokens, completion_tokens, calls)
+
+
+@contextmanager
+def track_generation(user, kind, blog=None):
+    """
+    Account a generation and save its record when the block exits.
+
+    See GenerationAccounting.track().
+
+    Yields:
+        GenerationAccounting: The active accounting
+    """
+    accounting = GenerationAccounting(user, kind, blog=blog)
+    with accounting.track():
+        yield accounting
+
+
+def _daily_totals(records):
+    """Group records by (user id, local date) and sum the daily usage fields."""
+    totals = {}
+    for record in records:
+        key = (record.user_id, timezone.localdate(record.created_at))
+        row = totals.setdefault(key, dict.fromkeys(DAILY_USAGE_FIELDS, 0))
+        row['generations'] += 1
+        row['cached_generations'] += int(record.cached)
+        row['failed'] += int(not record.succeeded)
+        row['llm_calls'] += record.llm_calls
+        row['prompt_tokens'] += record.prompt_tokens
+        row['completion_tokens'] += record.completion_tokens
+        row['llm_ms'] += record.llm_ms
+        row['total_ms'] += record.total_ms
+    return totals
+
+
+def _add_daily_usage(user_id, day, values):
+    from .models import GenerationDailyUsage
+
+    changes = {field: F(field) + value for field, value in values.items()}
+    for _ in range(3):
+        if GenerationDailyUsage.objects.filter(user_id=user_id, day=day).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                GenerationDailyUsage.objects.create(user_id=user_id, day=day, **values)
+            return
+        except IntegrityError:
+            # Created concurrently; update it instead
+            continue
+    raise RuntimeError(f"Could not update daily usage of user {user_id} on {day}")
+
+
+def save_generation_records(accountings):
+    """
+    Write the records of several generations in one transaction.
+
+    Args:
+        accountings (list): GenerationAccounting objects
+
+    Returns:
+        list: The saved GenerationRecords
+    """
+    from .models import GenerationRecord
+
+    records = [accounting.to_record() for accounting in accountings]
+    if not records:
+        return []
+    with transaction.atomic():
+        records = GenerationRecord.objects.bulk_create(records)
+        for (user_id, day), values in _daily_totals(records).items():
+            _add_daily_usage(user_id, day, values)
+    return records
+
+
+def usage_report(user=None, days=30):
+    """
+    Summarize generation usage per day from the daily totals.
+
+    Args:
+        user (User): Whose usage to report, None for every user
+        days (int): Number of days to cover, today included
+
+    Returns:
+        dict: from/to dates, one row per day with usage (oldest first)
+        and the totals of the period
+    """
+    from .models import GenerationDailyUsage
+
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rows = GenerationDailyUsage.objects.filter(day__gte=start, day__lte=today)
+    if user is not None:
+        rows = rows.filter(user=user)
+    sums = {field: Sum(field) for field in DAILY_USAGE_FIELDS}
+    daily = [
+        {'day': row['day'].isoformat(), **{field: row[field] or 0 for field in DAILY_USAGE_FIELDS}}
+        for row in rows.order_by().values('day').annotate(**sums).order_by('day')
+    ]
+    totals = {field: sum(row[field] for row in daily) for field in DAILY_USAGE_FIELDS}
+    return {'from': start.isoformat(), 'to': today.isoformat(), 'days': daily, 'totals': totals}
@@ -0,0 +1,379 @@
+"""
+Bulk blog generation from a CSV topic list.
+
+A CSV is imported once into a BulkGeneration with one BulkGenerationRow
+per topic. run_bulk_generation() then works through the pending rows:
+the dispatcher thread resolves documents, checks the generation cache and
+packs the context, and up to BULK_GENERATION_CONCURRENCY completions run
+in a thread pool at once. Each result is stored on its row as soon as it
+arrives, and Blog rows are written in batches of
+BULK_GENERATION_BATCH_SIZE.
+
+Progress lives in the database, so a crashed run resumes where it
+stopped: submitting the same file again (or running the command again)
+picks up the existing batch, finished rows are skipped, stored results
+are written without regenerating, and only unfinished rows are generated.
+Only one run per batch should be active at a time; the upload endpoint
+guarantees this through the job queue's dedupe key.
+"""
+import csv
+import hashlib
+import io
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .accounting import GenerationAccounting, save_generation_records, track_stage
+from .generation_cache import lookup_generation, store_result
+from .models import Blog, BulkGeneration, BulkGenerationRow, Document
+
+TOPIC_COLUMNS = ['topic', 'title']
+KEYWORD_COLUMNS = ['keywords', 'user_keywords', 'target_keywords']
+DOCUMENT_COLUMNS = ['documents', 'document_ids', 'document_refs']
+
+
+def _column(fieldnames, candidates):
+    normalized = {name.strip().lower(): name for name in fieldnames if name}
+    for candidate in candidates:
+        if candidate in normalized:
+            return normalized[candidate]
+    return None
+
+
+def _split(value, separators):
+    for separator in separators[1:]:
+        value = value.replace(separator, separators[0])
+    return [part.strip() for part in value.split(separators[0]) if part.strip()]
+
+
+def parse_topic_csv(data):
+    """
+    Read the topics of a bulk generation CSV.
+
+    The file needs a `topic` column; `tone`, `keywords` (comma-separated)
+    and `documents` (document ids or titles separated by `;` or `|`) are
+    optional. Rows without a topic are ignored.
+
+    Args:
+        data (bytes): Contents of the CSV file
+
+    Returns:
+        list: Dicts with row_number, topic, tone, keywords and document_refs
+
+    Raises:
+        ValueError: If the file has no topic column or no topics
+    """
+    # Imported here because core.utils pulls in the document extractors
+    from .utils import decode_text_stream
+
+    reader = csv.DictReader(io.StringIO(decode_text_stream(io.BytesIO(data))))
+    fieldnames = reader.fieldnames or []
+    topic_column = _column(fieldnames, TOPIC_COLUMNS)
+    if topic_column is None:
+        raise ValueError("The CSV needs a 'topic' column")
+    tone_column = _column(fieldnames, ['tone'])
+    keyword_column = _column(fieldnames, KEYWORD_COLUMNS)
+    document_column = _column(fieldnames, DOCUMENT_COLUMNS)
+
+    rows = []
+    for row_number, record in enumerate(reader, start=2):
+        topic = (record.get(topic_column) or '').strip()
+        if not topic:
+            continue
+        rows.append({
+            'row_number': row_number,
+            'topic': topic[:255],
+            'tone': ((record.get(tone_column) or '').strip() if tone_column else '') or 'professional',
+            'keywords': _split(record.get(keyword_column) or '', [',']) if keyword_column else [],
+            'document_refs': _split(record.get(document_column) or '', [';', '|']) if document_column else [],
+        })
+    if not rows:
+        raise ValueError('The CSV does not contain any topics')
+    return rows
+
+
+def create_bulk_generation(user, data, name):
+    """
+    Import a topic CSV, or return the batch previously imported from it.
+
+    Args:
+        user (User): Owner of the batch
+        data (bytes): Contents of the CSV file
+        name (str): Name of the batch
+
+    Returns:
+        tuple: (BulkGeneration, created)
+    """
+    source_hash = hashlib.sha256(data).hexdigest()
+    existing = BulkGeneration.objects.filter(user=user, source_hash=source_hash).first()
+    if existing is not None:
+        return existing, False
+
+    rows = parse_topic_csv(data)
+    with transaction.atomic():
+        batch = BulkGeneration.objects.create(
+            user=user, name=name[:255], source_hash=source_hash, total_rows=len(rows)
+        )
+        BulkGenerationRow.objects.bulk_create(
+            [BulkGenerationRow(batch=batch, **row) for row in rows]
+        )
+    return batch, True
+
+
+def resolve_documents(user, refs):
+    """
+    Look up the documents a row refers to by id or title.
+
+    Returns:
+        list: The user's matching documents
+
+    Raises:
+        ValueError: If a reference matches none of the user's documents
+    """
+    documents = []
+    for ref in refs:
+        queryset = Document.objects.filter(user=user)
+        if ref.isdigit():
+            document = queryset.filter(pk=int(ref)).first()
+        else:
+            document = queryset.filter(title__iexact=ref).order_by('-uploaded_at').first()
+        if document is None:
+            raise ValueError(f"Document not found: {ref}")
+        documents.append(document)
+    return documents
+
+
+def _prepare_row(row, user):
+    """
+    Do the database work for a row before it is generated.
+
+    Returns:
+        dict: documents, fingerprint, and either a cached result or the
+        packed context text
+    """
+    from .utils import get_readable_documents, select_documents_context
+
+    documents = resolve_documents(user, row.document_refs)
+    with track_stage('extraction'):
+        readable = get_readable_documents(documents)
+    if documents and not readable:
+        raise ValueError('None of the referenced documents contain readable text')
+
+    fingerprint, result = lookup_generation(row.topic, row.tone, row.keywords, readable)
+    prepared = {'documents': documents, 'fingerprint': fingerprint, 'result': result, 'context': ''}
+    if result is None and readable:
+        with track_stage('context'):
+            prepared['context'] = select_documents_context(user, readable, row.topic, row.keywords)['text']
+    return prepared
+
+
+def _generate(row, context, accounting):
+    """Generate one row's blog. Runs in a pool thread."""
+    from .utils import generate_blog_content
+
+    try:
+        with accounting.activate():
+            return generate_blog_content(
+                topic=row.topic, tone=row.tone, target_keywords=row.keywords, documents_content=context
+            )
+    finally:
+        # The rate limiter may have opened a connection for this thread
+        connection.close()
+
+
+def write_generated_blogs(batch, rows):
+    """
+    Write the Blogs of generated rows in one transaction.
+
+    Rows generated by this run carry their GenerationAccounting; its
+    record is written in the same transaction, with an even share of the
+    write time as the DB stage.
+
+    Args:
+        batch (BulkGeneration): The rows' batch
+        rows (list): Rows in the generated state
+
+    Returns:
+        int: Number of blogs written
+    """
+    if not rows:
+        return 0
+    started = time.perf_counter()
+    with transaction.atomic():
+        blogs = Blog.objects.bulk_create([
+            Blog(
+                user=batch.user,
+                topic=row.topic,
+                tone=row.tone,
+                target_keywords=row.keywords,
+                additional_keywords=row.result.get('keywords', {}).get('additional_keywords', []),
+                blog_title=row.result.get('blog_title', row.topic),
+                blog_outline=row.result.get('blog_outline', ''),
+                blog_draft=row.result.get('blog_draft', ''),
+            )
+            for row in rows
+        ])
+        Reference = Blog.reference_documents.through
+        Reference.objects.bulk_create([
+            Reference(blog_id=blog.id, document_id=document_id)
+            for row, blog in zip(rows, blogs)
+            for document_id in set(row.document_ids)
+        ], ignore_conflicts=True)
+
+        finished_at = timezone.now()
+        for row, blog in zip(rows, blogs):
+            row.blog = blog
+            row.status = 'done'
+            row.result = None
+            row.finished_at = finished_at
+        BulkGenerationRow.objects.bulk_update(rows, ['blog', 'status', 'result', 'finished_at'])
+
+        # Rows resumed from an earlier run have no accounting
+        accountings = []
+        share = (time.perf_counter() - started) / len(rows)
+        for row, blog in zip(rows, blogs):
+            accounting = getattr(row, 'accounting', None)
+            if accounting is not None:
+                accounting.blog = blog
+                accounting.add_time('db', share)
+                accountings.append(accounting)
+        save_generation_records(accountings)
+    return len(blogs)
+
+
+def run_bulk_generation(batch, concurrency=None, batch_size=None, retry_failed=False, stdout=None):
+    """
+    Generate the unfinished rows of a batch.
+
+    Args:
+        batch (BulkGeneration): Batch to process
+        concurrency (int): Maximum completions in flight, defaults to
+            BULK_GENERATION_CONCURRENCY
+        batch_size (int): Blogs written per transaction, defaults to
+            BULK_GENERATION_BATCH_SIZE
+        retry_failed (bool): Generate rows that failed in earlier runs again
+        stdout: Stream for progress output
+
+    Returns:
+        dict: Report with row counts, elapsed time, throughput and failures
+    """
+    concurrency = max(concurrency or getattr(settings, 'BULK_GENERATION_CONCURRENCY', 4), 1)
+    batch_size = max(batch_size or getattr(settings, 'BULK_GENERATION_BATCH_SIZE', 20), 1)
+    started = time.monotonic()
+
+    def log(message):
+        if stdout:
+            stdout.write(message + '\n')
+        else:
+            print(message)
+
+    # Rows left running by a crashed run start over; stored results are kept
+    BulkGenerationRow.objects.filter(batch=batch, status='running').update(status='pending', started_at=None)
+    if retry_failed:
+        BulkGenerationRow.objects.filter(batch=batch, status='failed').update(
+            status='pending', error='', finished_at=None
+        )
+    skipped = BulkGenerationRow.objects.filter(batch=batch, status__in=['done', 'failed']).count()
+    BulkGeneration.objects.filter(pk=batch.pk).update(
+        status='running', started_at=timezone.now(), finished_at=None
+    )
+
+    written = write_generated_blogs(
+        batch, list(BulkGenerationRow.objects.filter(batch=batch, status='generated'))
+    )
+    pending = list(BulkGenerationRow.objects.filter(batch=batch, status='pending'))
+    log(f"Bulk generation {batch.id}: {len(pending)} rows to generate, {skipped} already finished")
+
+    buffer = []
+    failed = 0
+
+    def finish(row, result, documents, accounting):
+        accounting.finish(succeeded=True)
+        row.accounting = accounting
+        row.result = result
+        row.document_ids = [document.id for document in documents]
+        row.status = 'generated'
+        BulkGenerationRow.objects.filter(pk=row.pk).update(
+            result=result, document_ids=row.document_ids, status='generated'
+        )
+        buffer.append(row)
+
+    def fail(row, error, accounting):
+        nonlocal failed
+        failed += 1
+        accounting.finish(succeeded=False)
+        save_generation_records([accounting])
+        BulkGenerationRow.objects.filter(pk=row.pk).update(
+            status='failed', error=str(error), finished_at=timezone.now()
+        )
+        log(f"Row {row.row_number} ({row.topic}) failed: {error}")
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='bulk-generation') as executor:
+        while pending or in_flight:
+            while pending and len(in_flight) < concurrency:
+                row = pending.pop(0)
+                accounting = GenerationAccounting(batch.user, 'bulk')
+                try:
+                    with accounting.activate():
+                        prepared = _prepare_row(row, batch.user)
+                except Exception as e:
+                    fail(row, e, accounting)
+                    continue
+                if prepared['result'] is not None:
+                    accounting.cached = True
+                    finish(row, prepared['result'], prepared['documents'], accounting)
+                    continue
+                BulkGenerationRow.objects.filter(pk=row.pk).update(status='running', started_at=timezone.now())
+                future = executor.submit(_generate, row, prepared['context'], accounting)
+                in_flight[future] = (row, prepared, accounting)
+
+            if in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    row, prepared, accounting = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        fail(row, e, accounting)
+                        continue
+                    if prepared['fingerprint']:
+                        store_result(prepared['fingerprint'], result)
+                    finish(row, result, prepared['documents'], accounting)
+
+            if len(buffer) >= batch_size:
+                written += write_generated_blogs(batch, buffer)
+                log(f"Bulk generation {batch.id}: {written} blogs written")
+                buffer = []
+
+    written += write_generated_blogs(batch, buffer)
+
+    elapsed = time.monotonic() - started
+    counts = BulkGeneration.objects.get(pk=batch.pk).get_counts()
+    failures = [
+        {'row': row_number, 'topic': topic, 'error': error}
+        for row_number, topic, error in BulkGenerationRow.objects.filter(
+            batch=batch, status='failed'
+        ).values_list('row_number', 'topic', 'error')
+    ]
+    report = {
+        'batch_id': batch.id,
+        'total': batch.total_rows,
+        'done': counts['done'],
+        'failed': counts['failed'],
+        'skipped': skipped,
+        'written': written,
+        'failed_this_run': failed,
+        'elapsed_seconds': round(elapsed, 2),
+        'blogs_per_minute': round(written / elapsed * 60, 2) if elapsed else 0.0,
+        'failures': failures,
+    }
+    BulkGeneration.objects.filter(pk=batch.pk).update(
+        status='done', finished_at=timezone.now(), report=report
+    )
+    log(f"Bulk generation {batch.id}: {written} blogs in {elapsed:.1f}s "
+        f"({report['blogs_per_minute']}/min), {counts['failed']} failed")
+    return report
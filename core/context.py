@@ -0,0 +1,186 @@
+"""
+Token-budgeted packing of reference passages into the generation prompt.
+
+Budgets are counted in model tokens so prompt size, latency and cost stay
+predictable no matter how many or how large the selected documents are.
+Exact counts need the optional tiktoken package (see the README); without
+it every budget is an estimate of about four characters per token.
+"""
+import math
+import re
+from functools import lru_cache
+
+from django.conf import settings
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+APPROX_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Tokens spent on the "Document: <title>" heading and separators
+DOCUMENT_HEADER_TOKENS = 8
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        try:
+            return tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            # Encodings are downloaded on first use; offline hosts fall back
+            return None
+
+
+def default_token_model():
+    """Return the model whose tokenizer budgets are counted with: the routed blog model."""
+    route = (getattr(settings, 'LLM_ROUTES', {}) or {}).get('blog') or {}
+    return route.get('model') or getattr(settings, 'LLM_PRIMARY_MODEL', 'gpt-4-turbo-preview')
+
+
+def count_tokens(text, model=None):
+    """
+    Count the tokens `text` uses for `model` (default_token_model() if None).
+
+    Without tiktoken the count is approximate: words count as one token per
+    four characters and each punctuation mark as one token, which tracks
+    cl100k within a few percent on English prose.
+
+    Returns:
+        int: Number of tokens
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model or default_token_model())
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return sum(math.ceil(len(piece) / 4) for piece in APPROX_TOKEN_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text, max_tokens, model=None):
+    """
+    Cut `text` down to at most `max_tokens` tokens, on a paragraph boundary
+    where possible.
+
+    Returns:
+        str: The text, truncated if it exceeded the budget
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text
+
+    kept = []
+    used = 0
+    for paragraph in text.split('\n\n'):
+        tokens = count_tokens(paragraph, model) + 1
+        if used + tokens > max_tokens:
+            break
+        kept.append(paragraph)
+        used += tokens
+    if kept:
+        return '\n\n'.join(kept)
+
+    # A single paragraph is over budget: cut it by words
+    words = text.split()
+    low, high = 0, len(words)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(' '.join(words[:mid]), model) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return ' '.join(words[:low])
+
+
+def pack_context(passages, budget=None, model=None):
+    """
+    Pack the highest-value passages into a token budget, sharing it fairly
+    between documents.
+
+    Each document first receives an equal share of the budget, filled with
+    its best-scoring passages. Whatever a document leaves unused is then
+    handed out to the remaining passages by score, so one large document
+    can use spare room but cannot crowd the others out.
+
+    Args:
+        passages (list): Dicts with document, position, text and score
+        budget (int): Token budget for the whole context
+        model (str): Model whose tokenizer should be used
+
+    Returns:
+        dict: text, tokens, budget, included and dropped passage summaries
+    """
+    budget = budget or getattr(settings, 'CONTEXT_TOKEN_BUDGET', 3000)
+    for passage in passages:
+        passage.setdefault('tokens', count_tokens(passage['text'], model))
+
+    documents = []
+    by_document = {}
+    for passage in sorted(passages, key=lambda p: p['score'], reverse=True):
+        document = passage['document']
+        if document not in by_document:
+            documents.append(document)
+            by_document[document] = []
+        by_document[document].append(passage)
+
+    included = set()
+    used = 0
+    headers = set()
+
+    def try_include(passage):
+        nonlocal used
+        cost = passage['tokens'] + (0 if passage['document'] in headers else DOCUMENT_HEADER_TOKENS)
+        if used + cost > budget:
+            return False
+        included.add(id(passage))
+        headers.add(passage['document'])
+        used += cost
+        return True
+
+    # First pass: every document gets an equal share
+    share = budget // max(len(documents), 1)
+    for document in documents:
+        spent = 0
+        for passage in by_document[document]:
+            cost = passage['tokens'] + (0 if spent else DOCUMENT_HEADER_TOKENS)
+            if spent + cost > share:
+                continue
+            if try_include(passage):
+                spent += cost
+
+    # Second pass: redistribute unused budget by score
+    for passage in sorted(passages, key=lambda p: p['score'], reverse=True):
+        if id(passage) not in included:
+            try_include(passage)
+
+    kept = [p for p in passages if id(p) in included]
+    dropped = [p for p in passages if id(p) not in included]
+
+    sections = []
+    for document in documents:
+        document_passages = sorted(
+            (p for p in kept if p['document'] == document), key=lambda p: p['position']
+        )
+        if document_passages:
+            body = '\n\n'.join(p['text'] for p in document_passages)
+            sections.append(f"Document: {document.title}\n{body}")
+
+    def summary(passage):
+        return {
+            'document_id': passage['document'].id,
+            'document_title': passage['document'].title,
+            'position': passage['position'],
+            'tokens': passage['tokens'],
+        }
+
+    return {
+        'text': '\n\n'.join(sections),
+        'tokens': used,
+        'budget': budget,
+        'included': [summary(p) for p in kept],
+        'dropped': [summary(p) for p in dropped],
+    }
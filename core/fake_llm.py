@@ -0,0 +1,380 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Runs an HTTP/1.1 keep-alive server in a background thread so tests,
+benchmarks and load tests can exercise the real client stack without
+network access or API cost. Point OPENAI_BASE_URL at `server.base_url` to
+use it, or run `python manage.py run_fake_llm` for a standalone endpoint.
+
+Latency follows a configurable distribution (see parse_latency), replies
+can be streamed, and a share of requests can be answered with injected
+errors. By default replies are generated by fake_completion_content, which
+returns a well-formed blog for JSON requests and a Markdown section
+otherwise, so the whole generation pipeline works against it.
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_DISTRIBUTIONS = ['fixed', 'uniform', 'normal', 'lognormal', 'exponential']
+
+FILLER_SENTENCES = [
+    'Good planning makes the difference between a quick win and a costly detour.',
+    'Start with the outcome your readers care about and work backwards from it.',
+    'Small, measurable steps keep a project moving when priorities change.',
+    'Real examples make abstract advice easier to apply.',
+    'Review the results regularly and adjust the approach as you learn.',
+    'Clear ownership avoids the gaps where work quietly stalls.',
+]
+
+
+def parse_latency(spec, rng=None):
+    """
+    Build a latency sampler.
+
+    Args:
+        spec: Seconds as a number, a callable returning seconds, or a string:
+            'fixed:S', 'uniform:LOW,HIGH', 'normal:MEAN,STDDEV',
+            'lognormal:MEDIAN,SIGMA' or 'exponential:MEAN' (a plain number
+            means fixed)
+        rng (random.Random): Random source, for reproducible runs
+
+    Returns:
+        callable: Function returning a latency in seconds, never negative
+
+    Raises:
+        ValueError: If the spec cannot be parsed
+    """
+    rng = rng or random.Random()
+    if callable(spec):
+        return spec
+    if spec is None:
+        return lambda: 0.0
+    if isinstance(spec, (int, float)):
+        return lambda: float(spec)
+
+    name, _, args = str(spec).partition(':')
+    if not args:
+        name, args = 'fixed', name
+    try:
+        values = [float(value) for value in args.split(',')]
+    except ValueError:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    samplers = {
+        'fixed': (1, lambda value: value),
+        'uniform': (2, lambda low, high: rng.uniform(low, high)),
+        'normal': (2, lambda mean, stddev: rng.gauss(mean, stddev)),
+        'lognormal': (2, lambda median, sigma: rng.lognormvariate(math.log(median), sigma)),
+        'exponential': (1, lambda mean: rng.expovariate(1.0 / mean)),
+    }
+    if name not in samplers or len(values) != samplers[name][0]:
+        raise ValueError(
+            f"Invalid latency spec: {spec} (expected one of {', '.join(LATENCY_DISTRIBUTIONS)})"
+        )
+    sample = samplers[name][1]
+    return lambda: max(sample(*values), 0.0)
+
+
+def _prompt(request):
+    return '\n'.join(str(message.get('content') or '') for message in request.get('messages', []))
+
+
+def fake_completion_content(request):
+    """
+    Produce a plausible reply for a chat completion request.
+
+    JSON-mode requests (the single-shot blog and the outline) get a blog
+    object with every field the parser requires; other requests (section
+    drafts) get Markdown of roughly the requested length.
+
+    Returns:
+        str: Reply text
+    """
+    prompt = _prompt(request)
+    topic_match = re.search(r'^Topic: (.+)$', prompt, re.MULTILINE)
+    topic = topic_match.group(1).strip() if topic_match else 'Your Topic'
+    keywords_match = re.search(r'^Target Keywords: (.*)$', prompt, re.MULTILINE)
+    keywords = [kw.strip() for kw in (keywords_match.group(1) if keywords_match else '').split(',') if kw.strip()]
+
+    if (request.get('response_format') or {}).get('type') != 'json_object':
+        words_match = re.search(r'about (\d+) words', prompt)
+        words = int(words_match.group(1)) if words_match else 150
+        sentences = []
+        while sum(len(sentence.split()) for sentence in sentences) < words:
+            sentences.append(FILLER_SENTENCES[len(sentences) % len(FILLER_SENTENCES)])
+        paragraphs = [' '.join(sentences[i:i + 4]) for i in range(0, len(sentences), 4)]
+        return '\n\n'.join(paragraphs)
+
+    sections = ['Why It Matters', 'Getting Started', 'Common Mistakes']
+    outline = {'introduction': {'content': f'An overview of {topic}'}}
+    draft = {'introduction': f'{topic} is worth understanding. ' + FILLER_SENTENCES[0]}
+    for number, heading in enumerate(sections, start=1):
+        outline[f'H2_{number}'] = heading
+        outline[f'H2_{number}_1'] = {'content': f'{heading}: the essentials'}
+        draft[f'H2_{number}'] = ' '.join(FILLER_SENTENCES[number:number + 3])
+    outline['conclusion'] = {'content': 'Key takeaways'}
+    draft['conclusion'] = FILLER_SENTENCES[-1]
+    return json.dumps({
+        'blog_title': f'A Practical Guide to {topic}',
+        'meta_description': f'Everything you need to know about {topic}.',
+        'keywords': {
+            'user_keywords': keywords,
+            'additional_keywords': [f'{topic} tips', f'{topic} guide'],
+            'lsi_keywords': [],
+            'semantic_variations': [],
+        },
+        'word_count': '1500-2000 words',
+        'blog_outline': outline,
+        'blog_draft': draft,
+        'seo_recommendations': {
+            'internal_linking': [], 'featured_snippet_opportunities': [], 'content_gaps': [],
+        },
+    })
+
+
+def _count_tokens(text):
+    return math.ceil(len(text or '') / 4)
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, Nagle's
+    # algorithm adds ~40 ms of delayed-ACK latency to every response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up on a slow response, e.g. at its deadline
+            pass
+
+    def setup(self):
+        super().setup()
+        with self.server.stats_lock:
+            self.server.connections += 1
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json({'object': 'list', 'data': [{'id': 'fake-model', 'object': 'model'}]})
+        else:
+            self._send_json({'error': {'message': 'Not found'}}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        with self.server.stats_lock:
+            self.server.requests += 1
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json({'error': {'message': 'Not found'}}, status=404)
+            return
+
+        failure = self.server.next_failure()
+        if failure is not None:
+            status, headers = failure
+            with self.server.stats_lock:
+                self.server.errors += 1
+            self._send_json({'error': {'message': f'Injected error {status}', 'type': 'fake_error'}},
+                            status=status, headers=headers)
+            return
+
+        with self.server.stats_lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        try:
+            latency = self.server.sample_latency()
+            if latency:
+                time.sleep(latency)
+            content = self.server.content
+            if callable(content):
+                content = content(request)
+        finally:
+            with self.server.stats_lock:
+                self.server.in_flight -= 1
+        if request.get('stream'):
+            self._send_stream(request, content)
+            return
+        self._send_json({
+            'id': f'chatcmpl-fake-{self.server.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake-model'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': _count_tokens(_prompt(request)),
+                'completion_tokens': _count_tokens(content),
+                'total_tokens': _count_tokens(_prompt(request)) + _count_tokens(content),
+            },
+        })
+
+    def _write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def _send_stream(self, request, content):
+        """Send the reply as chat.completion.chunk events, a few characters at a time."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        size = self.server.stream_chunk_size
+        base = {
+            'id': f'chatcmpl-fake-{self.server.requests}',
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake-model'),
+        }
+        for start in range(0, len(content), size):
+            delay = self.server.stream_delay()
+            if delay:
+                time.sleep(delay)
+            chunk = dict(base, choices=[{
+                'index': 0, 'delta': {'content': content[start:start + size]}, 'finish_reason': None,
+            }])
+            self._write_chunk(b'data: ' + json.dumps(chunk).encode('utf-8') + b'\n\n')
+        done = dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+        self._write_chunk(b'data: ' + json.dumps(done).encode('utf-8') + b'\n\n')
+        self._write_chunk(b'data: [DONE]\n\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+
+class FakeLLMHTTPServer(ThreadingHTTPServer):
+    """HTTP server holding the fake endpoint's configuration and counters."""
+    daemon_threads = True
+
+    def sample_latency(self):
+        """Return the latency of the next completion, in seconds."""
+        if self.latency != self._latency_spec:
+            self._latency_spec = self.latency
+            self._latency_sampler = parse_latency(self.latency, self.rng)
+        return self._latency_sampler()
+
+    def next_failure(self):
+        """
+        Decide whether the next completion fails.
+
+        Returns:
+            tuple or None: (status, headers) of the injected error
+        """
+        with self.stats_lock:
+            if self.failures:
+                return self.failures.popleft()
+            if self.error_rate and self.rng.random() < self.error_rate:
+                headers = {'Retry-After': str(self.retry_after)} if self.retry_after is not None else {}
+                return self.rng.choice(self.error_statuses), headers
+        return None
+
+
+class FakeLLMServer:
+    """
+    Fake chat completions endpoint.
+
+    Attributes:
+        content: Reply text, or a callable taking the request JSON
+            (defaults to fake_completion_content)
+        latency: Seconds to wait before answering a completion, or a
+            distribution spec (see parse_latency)
+        stream_chunk_size (int): Characters per streamed delta
+        stream_delay: Seconds between streamed deltas, or a distribution spec
+        error_rate (float): Share of completions answered with an error
+        error_statuses (list): HTTP statuses injected errors are drawn from
+        retry_after (float): Retry-After header sent with injected errors
+        seed (int): Seed for latency and error sampling
+    """
+
+    def __init__(self, content=fake_completion_content, latency=0.0, stream_chunk_size=8,
+                 stream_delay=0.0, error_rate=0.0, error_statuses=(429, 500, 503), retry_after=None,
+                 seed=None, host='127.0.0.1', port=0):
+        self.httpd = FakeLLMHTTPServer((host, port), FakeLLMHandler)
+        self.httpd.content = content
+        self.httpd.rng = random.Random(seed)
+        self.httpd.latency = latency
+        self.httpd._latency_spec = object()
+        self.httpd.stream_chunk_size = stream_chunk_size
+        self.httpd.stream_delay = parse_latency(stream_delay, self.httpd.rng)
+        self.httpd.error_rate = error_rate
+        self.httpd.error_statuses = list(error_statuses)
+        self.httpd.retry_after = retry_after
+        self.httpd.connections = 0
+        self.httpd.requests = 0
+        self.httpd.errors = 0
+        self.httpd.in_flight = 0
+        self.httpd.max_in_flight = 0
+        self.httpd.failures = deque()
+        self.httpd.stats_lock = threading.Lock()
+        # Validate the spec up front rather than on the first request
+        self.httpd.sample_latency()
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    @property
+    def connections(self):
+        """Number of TCP connections accepted so far."""
+        return self.httpd.connections
+
+    @property
+    def requests(self):
+        """Number of completion requests served so far."""
+        return self.httpd.requests
+
+    @property
+    def errors(self):
+        """Number of completions answered with an injected error."""
+        return self.httpd.errors
+
+    @property
+    def max_in_flight(self):
+        """Largest number of completions that were being answered at once."""
+        return self.httpd.max_in_flight
+
+    def fail_next(self, status=500, count=1, retry_after=None):
+        """
+        Answer the next `count` completions with an error.
+
+        Args:
+            status (int): HTTP status of the errors
+            retry_after (float): Value of the Retry-After header, if any
+        """
+        headers = {'Retry-After': str(retry_after)} if retry_after is not None else {}
+        with self.httpd.stats_lock:
+            self.httpd.failures.extend([(status, headers)] * count)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
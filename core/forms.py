@@ -1,6 +1,8 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from django.template.defaultfilters import filesizeformat
 from .models import Document, Blog
 
 # Define allowed content types for document uploads
@@ -60,10 +62,10 @@ class DocumentUploadForm(forms.ModelForm):
                     "Unsupported file type. Allowed types: PDF, DOC, DOCX."
                 )
             
-            # Check file size (10MB limit)
-            if file.size > 10 * 1024 * 1024:
+            # Check file size
+            if file.size > settings.MAX_UPLOAD_SIZE:
                 raise forms.ValidationError(
-                    "File size too large. Maximum size is 10MB."
+                    f"File size too large. Maximum size is {filesizeformat(settings.MAX_UPLOAD_SIZE)}."
                 )
         return file
 
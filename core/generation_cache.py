@@ -0,0 +1,138 @@
+"""
+Opt-in cache of blog generation results.
+
+Results are keyed by a fingerprint of everything that shapes the prompt:
+topic, tone, normalized keywords, the model parameters and stage routes,
+and the content hashes of the reference documents. Entries live in the
+`generation` cache alias, whose backend provides the LRU (MAX_ENTRIES) and
+TTL (TIMEOUT) eviction. Enable with GENERATION_CACHE_ENABLED; a request can always
+bypass the cache to regenerate.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import get_metrics, increment
+
+# Bump when the prompt changes so old results stop matching
+GENERATION_CACHE_VERSION = 2
+
+CACHE_METRICS = ['generation_cache_hits', 'generation_cache_misses', 'generation_cache_bypasses']
+
+
+def cache_enabled():
+    """Return True if generation results should be cached."""
+    return getattr(settings, 'GENERATION_CACHE_ENABLED', False)
+
+
+def _cache():
+    return caches['generation']
+
+
+def normalize_keywords(keywords):
+    """
+    Normalize keywords so equivalent lists produce the same fingerprint.
+
+    Returns:
+        list: Lowercased, whitespace-collapsed, de-duplicated, sorted keywords
+    """
+    if isinstance(keywords, str):
+        keywords = keywords.split(',')
+    return sorted({' '.join(keyword.lower().split()) for keyword in keywords if keyword.strip()})
+
+
+def generation_fingerprint(topic, tone, keywords, documents, params=None):
+    """
+    Hash the inputs of a generation request.
+
+    Args:
+        topic (str): Blog topic
+        tone (str): Writing tone
+        keywords (list or str): Target keywords
+        documents: Reference documents
+        params (dict): Model parameters, defaults to BLOG_COMPLETION_PARAMS
+
+    Returns:
+        str: Hex digest identifying the request
+    """
+    if params is None:
+        from .utils import BLOG_COMPLETION_PARAMS
+        params = BLOG_COMPLETION_PARAMS
+
+    fingerprint = {
+        'version': GENERATION_CACHE_VERSION,
+        'topic': ' '.join(topic.split()).lower(),
+        'tone': tone.lower(),
+        'keywords': normalize_keywords(keywords),
+        'params': params,
+        'pipeline': getattr(settings, 'GENERATION_PIPELINE', 'single'),
+        'routes': {
+            stage: getattr(settings, 'LLM_ROUTES', {}).get(stage)
+            for stage in ('blog', 'outline', 'section')
+        },
+        'documents': sorted(document.get_content_hash() for document in documents),
+    }
+    encoded = json.dumps(fingerprint, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def get_cached_result(fingerprint):
+    """
+    Look up a cached generation result and count the hit or miss.
+
+    Returns:
+        dict or None: The cached result
+    """
+    result = _cache().get(f'generation:{fingerprint}')
+    increment('generation_cache_hits' if result is not None else 'generation_cache_misses')
+    return result
+
+
+def store_result(fingerprint, result):
+    """Cache a generation result under its fingerprint."""
+    _cache().set(f'generation:{fingerprint}', result)
+
+
+def record_bypass():
+    """Count a request that skipped the cache to regenerate."""
+    increment('generation_cache_bypasses')
+
+
+def cache_stats():
+    """
+    Return the hit, miss and bypass counters.
+
+    Returns:
+        dict: Counters plus the hit rate of cache lookups
+    """
+    stats = get_metrics(CACHE_METRICS)
+    lookups = stats['generation_cache_hits'] + stats['generation_cache_misses']
+    stats['generation_cache_hit_rate'] = (stats['generation_cache_hits'] / lookups) if lookups else 0.0
+    return stats
+
+
+def is_cached(fingerprint):
+    """Return True if a result is cached, without counting a lookup."""
+    return _cache().get(f'generation:{fingerprint}') is not None
+
+
+def lookup_generation(topic, tone, keywords, documents, regenerate=False):
+    """
+    Fingerprint a generation request and fetch its cached result.
+
+    Args:
+        regenerate (bool): Skip the cached result (a fresh one is still stored)
+
+    Returns:
+        tuple: (fingerprint, cached result); the fingerprint is None when
+        caching is disabled and the result is None on a miss or bypass
+    """
+    if not cache_enabled():
+        return None, None
+    fingerprint = generation_fingerprint(topic, tone, keywords, documents)
+    if regenerate:
+        record_bypass()
+        return fingerprint, None
+    return fingerprint, get_cached_result(fingerprint)
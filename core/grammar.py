@@ -0,0 +1,331 @@
+"""
+Process-wide pool of warm LanguageTool instances.
+
+Creating a LanguageTool starts a Java server, which takes seconds before
+the first check can run. The pool keeps GRAMMAR_POOL_SIZE instances alive
+for the life of the process, so a grammar check only pays for the text it
+checks. Requests take an idle instance from the pool and wait up to
+GRAMMAR_QUEUE_TIMEOUT seconds when every instance is busy.
+
+Instances that sat idle for GRAMMAR_HEALTH_CHECK_INTERVAL seconds are
+checked with a tiny request before use, and an instance that fails is
+closed and replaced, so a crashed Java server does not fail every later
+request.
+
+With LANGUAGETOOL_URL set, the instances are thin clients of that shared
+LanguageTool server and no local Java process is started; the pool size
+then caps the concurrent requests a process sends to it.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_started
+
+from .metrics import get_metrics, increment
+
+GRAMMAR_METRICS = ['grammar_checks', 'grammar_wait_seconds', 'grammar_tools_started', 'grammar_tools_replaced']
+
+HEALTH_CHECK_TEXT = 'This is a test.'
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_pid = os.getpid()
+_warmed_pid = None
+
+
+class GrammarUnavailable(Exception):
+    """No LanguageTool instance became available in time."""
+
+
+def create_language_tool():
+    """
+    Start one LanguageTool instance as configured in the settings.
+
+    Returns:
+        language_tool_python.LanguageTool: A local server, or a client of
+        LANGUAGETOOL_URL
+    """
+    import language_tool_python
+
+    language = getattr(settings, 'GRAMMAR_LANGUAGE', 'en-US')
+    url = getattr(settings, 'LANGUAGETOOL_URL', '')
+    if url:
+        return language_tool_python.LanguageTool(language, remote_server=url)
+    return language_tool_python.LanguageTool(language)
+
+
+class _PooledTool:
+    __slots__ = ('tool', 'last_used')
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.last_used = time.monotonic()
+
+
+class GrammarToolPool:
+    """
+    Bounded pool of LanguageTool instances.
+
+    Instances are created on demand up to `size`; warm_up() creates them
+    all ahead of the first request.
+
+    Args:
+        size (int): Maximum number of instances
+        factory: Function returning a new instance
+        timeout (float): Seconds a request waits for an idle instance
+        health_check_interval (float): Idle seconds after which an
+            instance is checked before use (0 disables the check)
+    """
+
+    def __init__(self, size, factory=create_language_tool, timeout=10, health_check_interval=60):
+        self.size = max(size, 1)
+        self.factory = factory
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.created = 0
+        self.closed = False
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    def _start(self):
+        tool = self.factory()
+        increment('grammar_tools_started')
+        return _PooledTool(tool)
+
+    def _reserve_slot(self):
+        """Claim room for a new instance; False if the pool is full."""
+        with self._lock:
+            if self.created >= self.size:
+                return False
+            self.created += 1
+            return True
+
+    def _release_slot(self):
+        with self._lock:
+            self.created -= 1
+
+    def _discard(self, pooled):
+        self._release_slot()
+        try:
+            pooled.tool.close()
+        except Exception as e:
+            print(f"Error closing LanguageTool: {str(e)}")
+
+    def _healthy(self, pooled):
+        if not self.health_check_interval:
+            return True
+        if time.monotonic() - pooled.last_used < self.health_check_interval:
+            return True
+        try:
+            pooled.tool.check(HEALTH_CHECK_TEXT)
+            return True
+        except Exception as e:
+            print(f"LanguageTool failed its health check, replacing it: {str(e)}")
+            return False
+
+    def acquire(self):
+        """
+        Take an instance, starting one if the pool has room.
+
+        Returns:
+            _PooledTool: The instance; hand it back with release()
+
+        Raises:
+            GrammarUnavailable: If none became idle within the timeout
+        """
+        if self.closed:
+            raise GrammarUnavailable('The grammar checker is shutting down')
+        started = time.monotonic()
+        deadline = started + self.timeout
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                pooled = None
+                if self._reserve_slot():
+                    try:
+                        pooled = self._start()
+                    except Exception:
+                        self._release_slot()
+                        raise
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise GrammarUnavailable(
+                            'The grammar checker is busy. Please try again in a moment.'
+                        )
+                    try:
+                        # Wake up now and then: a discarded instance frees a slot
+                        pooled = self._idle.get(timeout=min(remaining, 0.5))
+                    except queue.Empty:
+                        continue
+            if not self._healthy(pooled):
+                increment('grammar_tools_replaced')
+                self._discard(pooled)
+                continue
+            increment('grammar_wait_seconds', time.monotonic() - started)
+            return pooled
+
+    def release(self, pooled, broken=False):
+        """Return an instance to the pool, or close it if it failed."""
+        if broken or self.closed:
+            if broken:
+                increment('grammar_tools_replaced')
+            self._discard(pooled)
+            return
+        pooled.last_used = time.monotonic()
+        self._idle.put(pooled)
+
+    def check(self, text):
+        """
+        Check text with a pooled instance.
+
+        Returns:
+            list: language_tool_python Match objects
+
+        Raises:
+            GrammarUnavailable: If no instance became idle in time
+        """
+        pooled = self.acquire()
+        try:
+            matches = pooled.tool.check(text)
+        except Exception:
+            # The server may have died; the next request gets a fresh one
+            self.release(pooled, broken=True)
+            raise
+        self.release(pooled)
+        increment('grammar_checks')
+        return matches
+
+    def warm_up(self):
+        """Start every instance the pool has room for."""
+        started = []
+        try:
+            while self._reserve_slot():
+                try:
+                    started.append(self._start())
+                except Exception:
+                    self._release_slot()
+                    raise
+        finally:
+            for pooled in started:
+                self.release(pooled)
+        return len(started)
+
+    def close(self):
+        """Close the idle instances; busy ones are closed when released."""
+        self.closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
+
+    def stats(self):
+        return {'size': self.size, 'started': self.created, 'idle': self._idle.qsize()}
+
+
+def get_grammar_pool():
+    """
+    Return this process's grammar pool, creating it on first use.
+
+    Returns:
+        GrammarToolPool: The shared pool
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            # The parent's Java servers belong to the parent
+            _pool = None
+            _pool_pid = os.getpid()
+        if _pool is None:
+            _pool = GrammarToolPool(
+                size=getattr(settings, 'GRAMMAR_POOL_SIZE', 2),
+                timeout=getattr(settings, 'GRAMMAR_QUEUE_TIMEOUT', 10),
+                health_check_interval=getattr(settings, 'GRAMMAR_HEALTH_CHECK_INTERVAL', 60),
+            )
+        return _pool
+
+
+def close_grammar_pool():
+    """Close the pool's LanguageTool instances, e.g. at exit or between tests."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None and _pool_pid == os.getpid():
+        pool.close()
+
+
+atexit.register(close_grammar_pool)
+
+
+def warm_up_grammar_pool(background=True):
+    """
+    Start the pool's LanguageTool instances before the first request.
+
+    Failures are logged and otherwise ignored, so a web worker still
+    starts without Java; requests then retry starting instances.
+
+    Args:
+        background (bool): Start them in a daemon thread
+
+    Returns:
+        threading.Thread or None: The warm-up thread when run in background
+    """
+    if not getattr(settings, 'GRAMMAR_WARMUP', True):
+        return None
+
+    def warm_up():
+        try:
+            started = get_grammar_pool().warm_up()
+            print(f"Started {started} LanguageTool instances")
+        except Exception as e:
+            print(f"LanguageTool warm-up failed: {str(e)}")
+
+    if not background:
+        warm_up()
+        return None
+    thread = threading.Thread(target=warm_up, name='grammar-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def _warm_up_on_first_request(sender, **kwargs):
+    global _warmed_pid
+    pid = os.getpid()
+    with _pool_lock:
+        if _warmed_pid == pid:
+            return
+        _warmed_pid = pid
+    warm_up_grammar_pool()
+
+
+def warm_up_grammar_pool_per_process():
+    """
+    Warm up the pool when each process serves its first request.
+
+    Unlike warming up at import, this starts no instances in a server's
+    master process (e.g. gunicorn --preload), whose instances the forked
+    workers could not use and would never close.
+    """
+    request_started.connect(_warm_up_on_first_request, dispatch_uid='grammar-warmup')
+
+
+def grammar_stats():
+    """
+    Return the pool's size and the grammar counters.
+
+    Returns:
+        dict: Pool size, started and idle instances, check and restart counts
+    """
+    stats = get_metrics(GRAMMAR_METRICS)
+    pool = _pool
+    stats.update(pool.stats() if pool is not None and _pool_pid == os.getpid() else {
+        'size': getattr(settings, 'GRAMMAR_POOL_SIZE', 2), 'started': 0, 'idle': 0,
+    })
+    return stats
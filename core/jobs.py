@@ -0,0 +1,460 @@
+import hashlib
+import heapq
+import json
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .accounting import track_generation, track_stage
+from .generation_cache import (
+    cache_enabled, generation_fingerprint, is_cached, lookup_generation, normalize_keywords,
+    store_result
+)
+from .llm import warm_up_client
+from .metrics import get_metrics, increment
+from .models import Blog, Job, Document
+
+
+def ingest_document(job):
+    """Run text extraction for the document referenced by the job."""
+    # Imported lazily so worker processes only load the extractors when needed
+    from .utils import process_document
+
+    document = Document.objects.get(pk=job.payload['document_id'])
+    success = process_document(document)
+    return {
+        'document_id': document.id,
+        'status': document.status,
+        'word_count': document.word_count,
+        'success': success,
+    }
+
+
+def generate_blog(job):
+    """
+    Generate a blog from the job's topic and documents and save it.
+
+    Raises:
+        ValueError: If none of the selected documents has readable text
+    """
+    from .utils import generate_blog_content, get_readable_documents, select_documents_context
+
+    payload = job.payload
+    with track_generation(job.user, 'create') as accounting:
+        documents = list(Document.objects.filter(id__in=payload['document_ids'], user=job.user))
+        with track_stage('extraction'):
+            readable_documents = get_readable_documents(documents)
+        if not readable_documents:
+            raise ValueError(
+                'Could not extract content from any of the selected documents. '
+                'Please ensure the documents contain readable text.'
+            )
+
+        fingerprint, result = lookup_generation(
+            payload['topic'], payload['tone'], payload['user_keywords'], readable_documents,
+            regenerate=payload.get('regenerate', False)
+        )
+        cached = accounting.cached = result is not None
+        context = {'tokens': 0, 'budget': 0, 'dropped': []}
+        if not cached:
+            with track_stage('context'):
+                context = select_documents_context(
+                    job.user, readable_documents, payload['topic'], payload['user_keywords']
+                )
+            result = generate_blog_content(
+                topic=payload['topic'],
+                tone=payload['tone'],
+                target_keywords=payload['user_keywords'],
+                documents_content=context['text']
+            )
+            if fingerprint:
+                store_result(fingerprint, result)
+
+        with track_stage('db'):
+            blog = Blog.create_from_generation(
+                job.user, payload['topic'], payload['tone'], payload['user_keywords'], documents, result
+            )
+        accounting.blog = blog
+        accounting.succeeded = True
+    print(f"Successfully created blog with ID: {blog.id}")
+
+    return {
+        'blog_id': blog.id,
+        'blog_title': blog.blog_title,
+        'cached': cached,
+        'keywords': {
+            'user_keywords': payload['user_keywords'],
+            'additional_keywords': blog.additional_keywords,
+        },
+        'context': {
+            'tokens': context['tokens'],
+            'budget': context['budget'],
+            'dropped': context['dropped'],
+        },
+    }
+
+
+def bulk_generate(job):
+    """Generate the unfinished rows of a bulk generation batch."""
+    from .bulk import run_bulk_generation
+    from .models import BulkGeneration
+
+    batch = BulkGeneration.objects.get(pk=job.payload['batch_id'], user=job.user)
+    return run_bulk_generation(batch, retry_failed=job.payload.get('retry_failed', False))
+
+
+QUEUE_METRICS = ['jobs_started', 'job_queue_wait_seconds']
+
+# Maps Job.kind to the function that runs it
+JOB_HANDLERS = {
+    'ingest_document': ingest_document,
+    'generate_blog': generate_blog,
+    'bulk_generate': bulk_generate,
+}
+
+
+def enqueue_job(kind, user=None, dedupe_key='', **payload):
+    """
+    Persist a job for the worker pool.
+
+    With a dedupe_key, a request identical to one that is still queued or
+    running attaches to that job instead of creating another one. The
+    database enforces the key's uniqueness among active jobs, so concurrent
+    callers cannot both create a job.
+
+    Args:
+        kind (str): Key in JOB_HANDLERS
+        user (User): Owner of the job
+        dedupe_key (str): Identifies identical requests, empty to disable
+        **payload: JSON-serializable handler arguments
+
+    Returns:
+        Job: The queued job, or the active job it attached to (check
+        `job.attached`)
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    for _ in range(3):
+        if dedupe_key:
+            active = Job.objects.filter(
+                kind=kind, dedupe_key=dedupe_key, status__in=['queued', 'running']
+            ).first()
+            if active is not None:
+                increment('job_dedupe_attached')
+                active.attached = True
+                return active
+        try:
+            with transaction.atomic():
+                job = Job.objects.create(kind=kind, user=user, payload=payload, dedupe_key=dedupe_key)
+        except IntegrityError:
+            # An identical job was created concurrently; attach to it
+            continue
+        job.attached = False
+        return job
+    raise RuntimeError(f"Could not enqueue {kind} job with key {dedupe_key}")
+
+
+def blog_generation_key(user, topic, tone, user_keywords, document_ids):
+    """
+    Identify a blog generation request for single-flight deduplication.
+
+    Returns:
+        str: Hex digest of the owner, normalized inputs and document ids
+    """
+    request = {
+        'user': user.id if user else None,
+        'topic': ' '.join(topic.split()).lower(),
+        'tone': tone.lower(),
+        'keywords': normalize_keywords(user_keywords),
+        'documents': sorted(int(document_id) for document_id in document_ids),
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def enqueue_document_ingestion(document):
+    """
+    Queue text extraction for a freshly uploaded document.
+
+    When JOB_QUEUE_ASYNC is disabled the job runs inline, which keeps
+    development setups working without a worker process. Duplicates of an
+    already extracted blob are also finished inline since they only copy
+    the stored text.
+
+    Returns:
+        Job: The queued (or already finished) job
+    """
+    job = enqueue_job('ingest_document', user=document.user, document_id=document.id)
+    already_extracted = document.blob is not None and document.blob.status == 'completed'
+    if already_extracted or not getattr(settings, 'JOB_QUEUE_ASYNC', True):
+        run_job(job.id)
+        job.refresh_from_db()
+    return job
+
+
+def enqueue_blog_generation(user, topic, tone, user_keywords, document_ids, regenerate=False):
+    """
+    Queue generation of a new blog.
+
+    Runs inline when JOB_QUEUE_ASYNC is disabled, and when the result is
+    already in the generation cache since only the Blog has to be written.
+    An identical request that is still queued or running is joined rather
+    than generated twice.
+
+    Args:
+        regenerate (bool): Bypass the generation cache
+
+    Returns:
+        Job: The queued (or already finished) job
+    """
+    job = enqueue_job(
+        'generate_blog', user=user,
+        dedupe_key=blog_generation_key(user, topic, tone, user_keywords, document_ids),
+        topic=topic, tone=tone, user_keywords=user_keywords,
+        document_ids=document_ids, regenerate=regenerate
+    )
+    if job.attached:
+        print(f"Attached to in-flight generation job {job.id}")
+        return job
+    cached = False
+    if cache_enabled() and not regenerate:
+        documents = Document.objects.filter(id__in=document_ids, user=user, status='completed')
+        cached = is_cached(generation_fingerprint(topic, tone, user_keywords, documents))
+    if cached or not getattr(settings, 'JOB_QUEUE_ASYNC', True):
+        run_job(job.id)
+        job.refresh_from_db()
+    return job
+
+
+def enqueue_bulk_generation(batch, retry_failed=False):
+    """
+    Queue a run of a bulk generation batch.
+
+    A batch never has two runs queued or running at once; a second request
+    attaches to the active one.
+
+    Returns:
+        Job: The queued (or already finished) job
+    """
+    job = enqueue_job(
+        'bulk_generate', user=batch.user, dedupe_key=f'bulk:{batch.id}',
+        batch_id=batch.id, retry_failed=retry_failed
+    )
+    if not job.attached and not getattr(settings, 'JOB_QUEUE_ASYNC', True):
+        run_job(job.id)
+        job.refresh_from_db()
+    return job
+
+
+def run_job(job_id):
+    """
+    Claim and execute a single job. Runs inside a worker process.
+
+    Args:
+        job_id (int): Primary key of the job
+
+    Returns:
+        str: Final status of the job
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id)
+        if job.status == 'queued':
+            if not job.claim():
+                return job.status
+            record_queue_wait(job)
+        elif job.status != 'running':
+            # Already finished by another worker
+            return job.status
+
+        handler = JOB_HANDLERS[job.kind]
+        try:
+            result = handler(job)
+        except Exception as e:
+            print(f"Error running job {job.id} ({job.kind}): {str(e)}")
+            job.mark_failed(str(e))
+        else:
+            job.mark_done(result)
+        return job.status
+    finally:
+        close_old_connections()
+
+
+def record_queue_wait(job):
+    """Add the time a freshly claimed job spent queued to the queue metrics."""
+    increment('jobs_started')
+    increment('job_queue_wait_seconds', (job.started_at - job.created_at).total_seconds())
+
+
+def queue_stats():
+    """
+    Return the job queue counters.
+
+    Returns:
+        dict: Jobs started, their total and average queue wait, and the
+        number of jobs queued and running right now
+    """
+    stats = get_metrics(QUEUE_METRICS)
+    started = stats['jobs_started']
+    stats['job_queue_average_wait_seconds'] = stats['job_queue_wait_seconds'] / started if started else 0.0
+    counts = dict(Job.objects.order_by().values_list('status').annotate(count=Count('id')))
+    stats['jobs_queued'] = counts.get('queued', 0)
+    stats['jobs_running'] = counts.get('running', 0)
+    return stats
+
+
+def claim_jobs(limit):
+    """
+    Claim up to `limit` queued jobs, sharing workers fairly between users.
+
+    Each free slot goes to the user with the fewest running (and just
+    claimed) jobs, oldest job first among equals, so a user who queues many
+    generations cannot starve everybody else. Within a user jobs run in the
+    order they were queued.
+
+    Returns:
+        list: Primary keys of the claimed jobs
+    """
+    running = dict(
+        Job.objects.filter(status='running').order_by().values_list('user_id').annotate(count=Count('id'))
+    )
+    queued_users = Job.objects.filter(status='queued').order_by().values_list('user_id', flat=True).distinct()
+    candidates = {
+        user_id: list(Job.objects.filter(status='queued', user_id=user_id).order_by('created_at')[:limit])
+        for user_id in queued_users
+    }
+
+    # (running jobs, oldest queued job, tie-breaker, user id)
+    heap = [
+        (running.get(user_id, 0), jobs[0].created_at, index, user_id)
+        for index, (user_id, jobs) in enumerate(candidates.items()) if jobs
+    ]
+    heapq.heapify(heap)
+
+    claimed = []
+    while heap and len(claimed) < limit:
+        count, _, index, user_id = heapq.heappop(heap)
+        jobs = candidates[user_id]
+        job = jobs.pop(0)
+        if job.claim():
+            record_queue_wait(job)
+            claimed.append(job.id)
+            count += 1
+        if jobs:
+            heapq.heappush(heap, (count, jobs[0].created_at, index, user_id))
+    return claimed
+
+
+def requeue_stale_jobs(max_age=None):
+    """
+    Put running jobs whose worker disappeared back on the queue.
+
+    Dispatchers refresh `heartbeat_at` for the jobs they are running, so a
+    job is only stale once nothing has touched it for `max_age` seconds,
+    however long it has been running.
+
+    Args:
+        max_age (int): Seconds without a heartbeat after which a running job
+            is considered stale
+
+    Returns:
+        int: Number of jobs requeued
+    """
+    if max_age is None:
+        max_age = getattr(settings, 'JOB_STALE_AFTER', 5 * 60)
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    # Jobs claimed before heartbeats existed only have a start time
+    stale = Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    return Job.objects.filter(stale, status='running').update(
+        status='queued', started_at=None, heartbeat_at=None
+    )
+
+
+def send_heartbeats(job_ids):
+    """
+    Mark jobs as still being worked on.
+
+    Args:
+        job_ids (iterable): Primary keys of the jobs this dispatcher is running
+
+    Returns:
+        int: Number of jobs updated
+    """
+    return Job.objects.filter(pk__in=list(job_ids), status='running').update(heartbeat_at=timezone.now())
+
+
+def init_worker():
+    """Set up Django in a new worker process and open the API connection early."""
+    django.setup()
+    warm_up_client()
+
+
+def run_worker_pool(workers=None, poll_interval=None, once=False, stdout=None):
+    """
+    Dispatch queued jobs to a process pool until interrupted.
+
+    Args:
+        workers (int): Number of worker processes
+        poll_interval (float): Seconds to wait between polls when idle
+        once (bool): Exit once the queue is drained
+        stdout: Stream for progress output
+
+    Returns:
+        int: Number of jobs processed
+    """
+    workers = workers or getattr(settings, 'JOB_WORKERS', None) or os.cpu_count() or 1
+    poll_interval = poll_interval or getattr(settings, 'JOB_POLL_INTERVAL', 1.0)
+    heartbeat_interval = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', 30)
+    processed = 0
+    in_flight = {}
+    last_heartbeat = time.monotonic()
+
+    requeue_stale_jobs()
+
+    # Spawned (not forked) workers never inherit the dispatcher's database
+    # connections; the initializer sets up Django so the app registry is
+    # ready before the first job is unpickled.
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker
+    )
+    with executor:
+        while True:
+            free_slots = workers - len(in_flight)
+            if free_slots > 0:
+                for job_id in claim_jobs(free_slots):
+                    in_flight[executor.submit(run_job, job_id)] = job_id
+
+            if not in_flight:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+            if time.monotonic() - last_heartbeat >= heartbeat_interval:
+                send_heartbeats(in_flight.values())
+                last_heartbeat = time.monotonic()
+            for future in done:
+                job_id = in_flight.pop(future)
+                processed += 1
+                try:
+                    status = future.result()
+                except Exception as e:
+                    # The worker process died; record it so the job is not lost
+                    status = 'failed'
+                    Job.objects.filter(pk=job_id).update(
+                        status='failed', error=str(e), finished_at=timezone.now()
+                    )
+                if stdout:
+                    stdout.write(f"Job {job_id}: {status}\n")
+
+    return processed
@@ -0,0 +1,297 @@
+"""
+Tolerant parsing of JSON written by a language model.
+
+Model output is usually valid JSON, but not always: it may be wrapped in a
+Markdown code fence or a sentence of prose, contain trailing commas,
+Python literals, unescaped quotes or raw newlines inside strings, or stop
+in the middle of a value because the completion hit max_tokens.
+repair_json() reads all of these locally, without another model call.
+
+A truncated document is closed where it stopped: an unfinished string
+keeps the text received so far, a key without a value or a cut-off number
+is dropped, and the path of the value that was being written is reported
+so the caller can ask the model to continue just that part and merge the
+answer back in with merge_continuation().
+"""
+import json
+import re
+
+NUMBER = re.compile(r'-?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?')
+BARE_KEY = re.compile(r'[A-Za-z_][\w-]*')
+LITERALS = {'true': True, 'false': False, 'null': None, 'True': True, 'False': False, 'None': None}
+ESCAPES = {'"': '"', "'": "'", '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+WHITESPACE = ' \t\r\n'
+
+# Characters that may follow the closing quote of a string
+STRING_END_FOLLOWERS = ',:}]'
+
+
+class JSONRepairError(ValueError):
+    """The text contains no JSON value that can be recovered."""
+
+
+class RepairedJSON:
+    """
+    Result of repair_json().
+
+    Attributes:
+        value: The parsed value
+        truncated_path (tuple): Keys (and list indexes) of the value that was
+            being written when the text ended, or None if the text was complete
+        repaired (bool): False if the text was valid JSON as it was
+    """
+
+    def __init__(self, value, truncated_path=None, repaired=False):
+        self.value = value
+        self.truncated_path = truncated_path
+        self.repaired = repaired
+
+    @property
+    def truncated(self):
+        return self.truncated_path is not None
+
+
+class _Truncated(Exception):
+    """The text ended before a value could be read."""
+
+
+class _Parser:
+    def __init__(self, text, pos=0):
+        self.text = text
+        self.pos = pos
+        self.path = []
+        self.truncated_path = None
+
+    def _skip_whitespace(self):
+        while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+            self.pos += 1
+
+    def _at_end(self):
+        return self.pos >= len(self.text)
+
+    def _truncate(self):
+        if self.truncated_path is None:
+            self.truncated_path = tuple(self.path)
+
+    def value(self):
+        self._skip_whitespace()
+        if self._at_end():
+            self._truncate()
+            raise _Truncated()
+        char = self.text[self.pos]
+        if char == '{':
+            return self.object()
+        if char == '[':
+            return self.array()
+        if char in '"\'':
+            return self.string()
+        match = NUMBER.match(self.text, self.pos)
+        if match:
+            self.pos = match.end()
+            if self._at_end():
+                # More digits may have followed
+                self._truncate()
+                raise _Truncated()
+            number = match.group()
+            return float(number) if any(c in number for c in '.eE') else int(number)
+        rest = self.text[self.pos:self.pos + 5]
+        for word, literal in LITERALS.items():
+            if rest.startswith(word):
+                self.pos += len(word)
+                return literal
+            if word.startswith(rest) and self.pos + len(rest) >= len(self.text):
+                self._truncate()
+                raise _Truncated()
+        raise JSONRepairError(f"Unexpected {char!r} at position {self.pos}")
+
+    def object(self):
+        self.pos += 1
+        result = {}
+        while True:
+            self._skip_whitespace()
+            if self._at_end():
+                self._truncate()
+                return result
+            char = self.text[self.pos]
+            if char in '}]':
+                # A mismatched bracket closes the object too
+                if char == '}':
+                    self.pos += 1
+                return result
+            if char == ',':
+                self.pos += 1
+                continue
+            if char in '"\'':
+                key = self.string()
+            else:
+                match = BARE_KEY.match(self.text, self.pos)
+                if not match:
+                    raise JSONRepairError(f"Expected a key at position {self.pos}")
+                key = match.group()
+                self.pos = match.end()
+            self._skip_whitespace()
+            if self._at_end():
+                self._truncate()
+                return result
+            if self.text[self.pos] == ':':
+                self.pos += 1
+            self.path.append(key)
+            try:
+                result[key] = self.value()
+            except _Truncated:
+                return result
+            finally:
+                self.path.pop()
+
+    def array(self):
+        self.pos += 1
+        result = []
+        while True:
+            self._skip_whitespace()
+            if self._at_end():
+                self._truncate()
+                return result
+            char = self.text[self.pos]
+            if char in ']}':
+                if char == ']':
+                    self.pos += 1
+                return result
+            if char == ',':
+                self.pos += 1
+                continue
+            self.path.append(len(result))
+            try:
+                result.append(self.value())
+            except _Truncated:
+                return result
+            finally:
+                self.path.pop()
+
+    def _closes_string(self, pos):
+        """True if the quote at pos ends the string rather than being part of it."""
+        pos += 1
+        while pos < len(self.text) and self.text[pos] in WHITESPACE:
+            pos += 1
+        return pos >= len(self.text) or self.text[pos] in STRING_END_FOLLOWERS
+
+    def string(self):
+        quote = self.text[self.pos]
+        self.pos += 1
+        parts = []
+        text = self.text
+        while self.pos < len(text):
+            char = text[self.pos]
+            if char == '\\':
+                if self.pos + 1 >= len(text):
+                    break
+                escaped = text[self.pos + 1]
+                if escaped == 'u':
+                    digits = text[self.pos + 2:self.pos + 6]
+                    if len(digits) < 4:
+                        break
+                    try:
+                        parts.append(chr(int(digits, 16)))
+                    except ValueError:
+                        parts.append(digits)
+                    self.pos += 6
+                    continue
+                parts.append(ESCAPES.get(escaped, escaped))
+                self.pos += 2
+                continue
+            if char == quote and self._closes_string(self.pos):
+                self.pos += 1
+                return _join_surrogates(''.join(parts))
+            # Raw newlines, tabs and stray quotes are kept as they are
+            parts.append(char)
+            self.pos += 1
+        self.pos = len(text)
+        self._truncate()
+        return _join_surrogates(''.join(parts))
+
+
+def _join_surrogates(text):
+    """Combine \\uD83D\\uDE00-style surrogate pairs into the characters they encode."""
+    try:
+        return text.encode('utf-16', 'surrogatepass').decode('utf-16')
+    except UnicodeDecodeError:
+        return text
+
+
+def repair_json(text):
+    """
+    Parse JSON written by a model, repairing what can be repaired.
+
+    Args:
+        text (str): Raw model output
+
+    Returns:
+        RepairedJSON: The value, where it was cut off, and whether it needed repair
+
+    Raises:
+        JSONRepairError: If the text holds no recoverable object or array
+    """
+    if not text:
+        raise JSONRepairError('The response is empty')
+    try:
+        return RepairedJSON(json.loads(text))
+    except ValueError:
+        pass
+    # Skip code fences and prose before the document
+    match = re.search(r'[{\[]', text)
+    if not match:
+        raise JSONRepairError('The response contains no JSON object')
+    parser = _Parser(text, match.start())
+    try:
+        value = parser.value()
+    except _Truncated:
+        raise JSONRepairError('The response contains no JSON object')
+    return RepairedJSON(value, parser.truncated_path, repaired=True)
+
+
+def join_continuation(text, continuation, max_overlap=200):
+    """
+    Append the continuation of a cut-off text, dropping any repeated overlap.
+
+    Models asked to continue sometimes repeat the last words they wrote;
+    the longest suffix of `text` that starts `continuation` is skipped.
+
+    Returns:
+        str: The joined text
+    """
+    for size in range(min(len(text), len(continuation), max_overlap), 0, -1):
+        if continuation.startswith(text[-size:]):
+            # Ignore coincidental one- or two-character overlaps
+            if size > 2:
+                return text + continuation[size:]
+            break
+    return text + continuation
+
+
+def merge_continuation(value, continuation, truncated_path=None, _path=()):
+    """
+    Merge the answer to a continuation request into a partial value.
+
+    Objects are merged key by key, the string at `truncated_path` is
+    extended with the continuation's text, and any other value in the
+    continuation replaces or adds to the partial one.
+
+    Args:
+        value: The partial value
+        continuation: The value the model returned for the missing part
+        truncated_path (tuple): Path of the cut-off value, from repair_json()
+
+    Returns:
+        The merged value
+    """
+    if isinstance(value, dict) and isinstance(continuation, dict):
+        merged = dict(value)
+        for key, extra in continuation.items():
+            if key in merged:
+                merged[key] = merge_continuation(merged[key], extra, truncated_path, _path + (key,))
+            else:
+                merged[key] = extra
+        return merged
+    if (isinstance(value, str) and isinstance(continuation, str)
+            and truncated_path is not None and tuple(truncated_path) == _path):
+        return join_continuation(value, continuation)
+    return continuation
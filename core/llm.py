@@ -0,0 +1,291 @@
+"""
+Process-wide OpenAI client registry.
+
+Creating an OpenAI client per request throws away its connection pool, so
+every generation pays for client setup plus a fresh TCP/TLS handshake.
+Clients here are created once per process (and per API key / base URL),
+keep their connections alive between requests, and can be warmed up when a
+worker starts so the first user request does not pay the handshake either.
+
+Async clients live on a single background event loop per process, so
+their connection pools also survive between requests; use run_async() to
+execute coroutines that call them from synchronous code.
+
+complete() and acomplete() are the entry points for chat completions:
+they route the request to its stage's model (core.routing), admit it
+through the global rate limiter (core.rate_limit) and run it with
+retries, deadlines and circuit breaking (core.resilience).
+
+Point OPENAI_BASE_URL at a local endpoint (see core.fake_llm) to run
+without the real API.
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+
+import httpx
+import openai
+from django.conf import settings
+
+from .accounting import track_stage
+from .rate_limit import acquire, estimate_tokens, record_usage, try_acquire
+from .resilience import acall_with_resilience, call_with_resilience
+from .routing import Route
+
+_clients = {}
+_async_clients = {}
+_clients_lock = threading.Lock()
+_clients_pid = os.getpid()
+_loop = None
+
+
+def _pool_settings():
+    limits = httpx.Limits(
+        max_connections=getattr(settings, 'OPENAI_MAX_CONNECTIONS', 20),
+        max_keepalive_connections=getattr(settings, 'OPENAI_MAX_CONNECTIONS', 20),
+        keepalive_expiry=getattr(settings, 'OPENAI_KEEPALIVE_EXPIRY', 60),
+    )
+    timeout = httpx.Timeout(
+        getattr(settings, 'OPENAI_READ_TIMEOUT', 120),
+        connect=getattr(settings, 'OPENAI_CONNECT_TIMEOUT', 5),
+    )
+    return limits, timeout
+
+
+def _build_client(api_key, base_url):
+    limits, timeout = _pool_settings()
+    return openai.OpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=getattr(settings, 'OPENAI_MAX_RETRIES', 2),
+        http_client=openai.DefaultHttpxClient(limits=limits, timeout=timeout),
+    )
+
+
+def _build_async_client(api_key, base_url):
+    limits, timeout = _pool_settings()
+    return openai.AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=getattr(settings, 'OPENAI_MAX_RETRIES', 2),
+        http_client=openai.DefaultAsyncHttpxClient(limits=limits, timeout=timeout),
+    )
+
+
+def _reset_after_fork():
+    """Forget clients and the event loop inherited from a parent process."""
+    global _clients_pid, _loop
+    if _clients_pid != os.getpid():
+        # Sockets and threads must not be shared with a parent process after fork
+        _clients.clear()
+        _async_clients.clear()
+        _loop = None
+        _clients_pid = os.getpid()
+
+
+def get_openai_client(api_key=None, base_url=None):
+    """
+    Return the shared OpenAI client for this process.
+
+    Args:
+        api_key (str): API key, defaults to OPENAI_API_KEY
+        base_url (str): API base URL, defaults to OPENAI_BASE_URL
+
+    Returns:
+        openai.OpenAI: A client whose connection pool is reused across calls
+    """
+    api_key = api_key or settings.OPENAI_API_KEY
+    base_url = base_url or getattr(settings, 'OPENAI_BASE_URL', None)
+    key = (api_key, base_url)
+
+    with _clients_lock:
+        _reset_after_fork()
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = _build_client(api_key, base_url)
+    return client
+
+
+def _get_loop():
+    """Return the process-wide event loop, starting its thread on first use."""
+    global _loop
+    with _clients_lock:
+        _reset_after_fork()
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='openai-loop', daemon=True).start()
+        return _loop
+
+
+def run_async(coro, timeout=None):
+    """
+    Run a coroutine on the shared event loop and wait for its result.
+
+    Args:
+        coro: Coroutine to run
+        timeout (float): Seconds to wait, or None to wait indefinitely
+
+    Returns:
+        The coroutine's result
+
+    Raises:
+        concurrent.futures.TimeoutError: If it did not finish in time; the
+            coroutine is cancelled
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _get_loop())
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+def get_async_openai_client(api_key=None, base_url=None):
+    """
+    Return the shared AsyncOpenAI client for this process.
+
+    Must be called from a coroutine running under run_async(), because the
+    client's connections belong to the shared event loop.
+
+    Returns:
+        openai.AsyncOpenAI: A client whose connection pool is reused across calls
+    """
+    api_key = api_key or settings.OPENAI_API_KEY
+    base_url = base_url or getattr(settings, 'OPENAI_BASE_URL', None)
+    key = (api_key, base_url)
+
+    with _clients_lock:
+        client = _async_clients.get(key)
+        if client is None:
+            client = _async_clients[key] = _build_async_client(api_key, base_url)
+    return client
+
+
+def close_clients():
+    """Close every pooled client and empty the registry."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        async_clients = list(_async_clients.values())
+        _clients.clear()
+        _async_clients.clear()
+        loop = _loop
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            print(f"Error closing OpenAI client: {str(e)}")
+    for client in async_clients:
+        try:
+            asyncio.run_coroutine_threadsafe(client.close(), loop).result(5)
+        except Exception as e:
+            print(f"Error closing OpenAI client: {str(e)}")
+
+
+def warm_up_client(background=True):
+    """
+    Create the shared client and open a connection to the API.
+
+    A cheap model listing request establishes the TCP/TLS connection that
+    later generations reuse. Failures are logged and otherwise ignored, so
+    a worker still starts when the API is unreachable.
+
+    Args:
+        background (bool): Run the request in a daemon thread
+
+    Returns:
+        threading.Thread or None: The warm-up thread when run in background
+    """
+    if not getattr(settings, 'OPENAI_WARMUP', True) or not settings.OPENAI_API_KEY:
+        return None
+
+    def warm_up():
+        try:
+            get_openai_client().models.list()
+            print("OpenAI client warmed up")
+        except Exception as e:
+            print(f"OpenAI client warm-up failed: {str(e)}")
+
+    if not background:
+        warm_up()
+        return None
+    thread = threading.Thread(target=warm_up, name='openai-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+def complete(messages, params, stage, hedge=None, stream=False):
+    """
+    Create a chat completion through the rate limiter and resilience layer.
+
+    The stage's route (core.routing) picks the model, max_tokens and
+    temperature and may switch to a faster fallback model; the call's time
+    and token usage are counted per stage.
+
+    Args:
+        messages (list): Chat completion messages
+        params (dict): Completion parameters
+        stage (str): Name of the call, e.g. 'blog' or 'outline'
+        hedge (bool): Allow hedged requests, defaults to LLM_HEDGE_ENABLED;
+            never used for streams
+        stream (bool): Return a stream; only opening it is retried
+
+    Returns:
+        The completion, or the chunk stream when stream=True
+
+    Raises:
+        ProviderUnavailable: If the provider stayed unavailable
+    """
+    client = get_openai_client()
+    route = Route(stage, params)
+    estimated = estimate_tokens(messages, route.params.get('max_tokens', 0))
+    if stream:
+        hedge = False
+    elif hedge is None:
+        hedge = getattr(settings, 'LLM_HEDGE_ENABLED', False)
+
+    def create(request_params, timeout):
+        return client.chat.completions.create(
+            messages=messages, stream=stream, timeout=timeout, **request_params
+        )
+
+    started = time.monotonic()
+    with track_stage('llm'):
+        response = call_with_resilience(
+            lambda timeout: route.call(create, timeout), stage,
+            admit=lambda: acquire(estimated),
+            admit_hedge=lambda: not try_acquire(estimated),
+            hedge=hedge
+        )
+    usage = None if stream else response.usage
+    if not stream:
+        record_usage(estimated, usage)
+    route.record(time.monotonic() - started, usage)
+    return response
+
+
+async def acomplete(messages, params, stage, route=None):
+    """
+    Create a chat completion with the async client, with retries and circuit breaking.
+
+    Must run under run_async(). The caller admits the request through the
+    rate limiter beforehand, since the limiter's database access cannot run
+    on the event loop, and records the stage metrics afterwards for the
+    same reason.
+
+    Args:
+        route (Route): Route built by the caller, defaults to the stage's route
+
+    Returns:
+        The completion
+    """
+    client = get_async_openai_client()
+    route = route or Route(stage, params)
+
+    async def create(request_params, timeout):
+        return await client.chat.completions.create(messages=messages, timeout=timeout, **request_params)
+
+    return await acall_with_resilience(lambda timeout: route.acall(create, timeout), stage)
@@ -0,0 +1,354 @@
+"""
+Load generator for the main user flow.
+
+Each simulated user registers, uploads a document, creates a blog from it
+(polling the generation job), opens and saves the editor, and downloads
+the result, then repeats the create/edit/download part for the requested
+number of iterations. Users run concurrently in threads, each with its
+own HTTP client and session, and every request's latency is recorded per
+endpoint so the report can show throughput and p50/p95/p99.
+
+run_load_test() drives any running instance through its base URL.
+serve_app() starts this project in-process on a free port, wired to a
+FakeLLMServer, so `python manage.py load_test` needs neither a network
+connection nor an API key.
+"""
+import io
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import httpx
+from django.conf import settings
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+
+LOAD_TEST_ENDPOINTS = [
+    'register', 'upload', 'create_blog', 'job_status', 'edit_blog', 'update_blog', 'download_blog',
+]
+
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+class LoadTestError(Exception):
+    """A request of the simulated flow returned an unexpected response."""
+
+
+def percentile(samples, percent):
+    """
+    Return the nearest-rank percentile of a list of numbers.
+
+    Returns:
+        float or None: None when there are no samples
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(int(-(-percent * len(ordered) // 100)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class LoadStats:
+    """Thread-safe latency and error counters of a load test run."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.error_messages = []
+        self.flows = 0
+        self.failed_flows = 0
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok=True, message=None):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(seconds)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+                if message and len(self.error_messages) < 20:
+                    self.error_messages.append(f'{endpoint}: {message}')
+
+    def record_flow(self, ok, message=None):
+        with self.lock:
+            if ok:
+                self.flows += 1
+            else:
+                self.failed_flows += 1
+                if message and len(self.error_messages) < 20:
+                    self.error_messages.append(message)
+
+    def report(self, elapsed):
+        """
+        Summarize the run.
+
+        Args:
+            elapsed (float): Wall-clock seconds of the run
+
+        Returns:
+            dict: Flow and request throughput plus count, errors and
+            p50/p95/p99/max latency in milliseconds per endpoint
+        """
+        with self.lock:
+            latencies = {endpoint: list(samples) for endpoint, samples in self.latencies.items()}
+            errors = dict(self.errors)
+            flows, failed_flows = self.flows, self.failed_flows
+            messages = list(self.error_messages)
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        endpoints = {}
+        for endpoint in LOAD_TEST_ENDPOINTS + sorted(set(latencies) - set(LOAD_TEST_ENDPOINTS)):
+            samples = latencies.get(endpoint)
+            if not samples:
+                continue
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'errors': errors.get(endpoint, 0),
+                'requests_per_second': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+                'p50_ms': ms(percentile(samples, 50)),
+                'p95_ms': ms(percentile(samples, 95)),
+                'p99_ms': ms(percentile(samples, 99)),
+                'max_ms': ms(max(samples)),
+            }
+        total_requests = sum(len(samples) for samples in latencies.values())
+        return {
+            'elapsed_seconds': round(elapsed, 2),
+            'flows': flows,
+            'failed_flows': failed_flows,
+            'flows_per_second': round(flows / elapsed, 3) if elapsed else 0.0,
+            'requests': total_requests,
+            'requests_per_second': round(total_requests / elapsed, 2) if elapsed else 0.0,
+            'endpoints': endpoints,
+            'errors': messages,
+        }
+
+
+def sample_document(topic):
+    """Build a small .docx reference document about a topic."""
+    from docx import Document as DocxDocument
+
+    doc = DocxDocument()
+    doc.add_heading(f'{topic} notes', level=1)
+    for number in range(1, 6):
+        doc.add_paragraph(
+            f'{topic} fact {number}: teams that plan carefully see better results, '
+            f'and measuring progress every week keeps {topic.lower()} projects on track.'
+        )
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+class SimulatedUser:
+    """
+    One user working through the flow with its own session.
+
+    Args:
+        base_url (str): Root URL of the app, e.g. http://127.0.0.1:8000
+        username (str): Account to register
+        stats (LoadStats): Shared counters
+        job_timeout (float): Seconds to wait for a generation job
+        poll_interval (float): Seconds between job status polls
+    """
+    password = 'Quiet-harbor-4821'
+
+    def __init__(self, base_url, username, stats, job_timeout=300, poll_interval=0.5):
+        self.username = username
+        self.stats = stats
+        self.job_timeout = job_timeout
+        self.poll_interval = poll_interval
+        self.client = httpx.Client(base_url=base_url.rstrip('/'), timeout=job_timeout)
+
+    def close(self):
+        self.client.close()
+
+    def _request(self, endpoint, method, path, expected=(200,), **kwargs):
+        headers = kwargs.pop('headers', {})
+        if method == 'POST':
+            headers['X-CSRFToken'] = self.client.cookies.get('csrftoken', '')
+        started = time.perf_counter()
+        try:
+            response = self.client.request(method, path, headers=headers, **kwargs)
+        except httpx.HTTPError as e:
+            self.stats.record(endpoint, time.perf_counter() - started, ok=False, message=str(e))
+            raise LoadTestError(f'{endpoint}: {e}')
+        elapsed = time.perf_counter() - started
+        if response.status_code not in expected:
+            message = f'HTTP {response.status_code} {response.text[:200]}'
+            self.stats.record(endpoint, elapsed, ok=False, message=message)
+            raise LoadTestError(f'{endpoint}: {message}')
+        self.stats.record(endpoint, elapsed)
+        return response
+
+    def register(self):
+        # The form page sets the CSRF cookie the POST needs
+        self.client.get('/register/')
+        self._request('register', 'POST', '/register/', expected=(302,), data={
+            'username': self.username,
+            'email': f'{self.username}@example.com',
+            'password1': self.password,
+            'password2': self.password,
+        })
+
+    def upload(self, topic):
+        """Upload a reference document; returns its id."""
+        response = self._request('upload', 'POST', '/upload/bulk/', expected=(201,), files={
+            'files': (f'{topic.lower().replace(" ", "-")}.docx', sample_document(topic), DOCX_CONTENT_TYPE),
+        })
+        return response.json()['results'][0]['document_id']
+
+    def create_blog(self, topic, document_id):
+        """Queue a blog generation and wait for it; returns the blog id."""
+        response = self._request('create_blog', 'POST', '/create-blog/', expected=(202,), json={
+            'topic': topic,
+            'tone': 'professional',
+            'user_keywords': f'{topic.lower()}, planning',
+            'document_ids': f'[{document_id}]',
+        })
+        job = response.json()
+        deadline = time.monotonic() + self.job_timeout
+        while job['status'] in ('queued', 'running'):
+            if time.monotonic() > deadline:
+                raise LoadTestError(f"create_blog: job {job['job_id']} did not finish in {self.job_timeout}s")
+            time.sleep(self.poll_interval)
+            job = self._request('job_status', 'GET', job['status_url']).json()
+        if job['status'] != 'done':
+            raise LoadTestError(f"create_blog: job {job['job_id']} {job['status']}: {job.get('error')}")
+        return job['result']['blog_id']
+
+    def edit(self, blog_id):
+        """Open the editor and save a change."""
+        page = self._request('edit_blog', 'GET', f'/edit-blog/{blog_id}/').text
+        marker = 'let blogVersion = '
+        version = None
+        if marker in page:
+            version = int(page.split(marker, 1)[1].split(';', 1)[0])
+        self._request('update_blog', 'POST', f'/update-blog/{blog_id}/', json={
+            'blog_title': f'Edited by {self.username}',
+            'version': version,
+        })
+
+    def download(self, blog_id):
+        self._request('download_blog', 'GET', f'/download-blog/{blog_id}/')
+
+    def run(self, iterations):
+        """Run the whole flow; every iteration after the first reuses the account."""
+        try:
+            self.register()
+            document_id = self.upload('Remote Work')
+        except LoadTestError as e:
+            self.stats.record_flow(False, str(e))
+            return
+        for iteration in range(iterations):
+            try:
+                blog_id = self.create_blog(f'Remote Work {iteration + 1}', document_id)
+                self.edit(blog_id)
+                self.download(blog_id)
+            except LoadTestError as e:
+                self.stats.record_flow(False, str(e))
+            else:
+                self.stats.record_flow(True)
+
+
+def run_load_test(base_url, users=10, iterations=1, prefix=None, job_timeout=300, poll_interval=0.5):
+    """
+    Drive the flow with concurrent simulated users.
+
+    Args:
+        base_url (str): Root URL of the app
+        users (int): Concurrent users
+        iterations (int): Create/edit/download rounds per user
+        prefix (str): Username prefix, defaults to a unique 'loadtest-<id>'
+        job_timeout (float): Seconds to wait for each generation job
+        poll_interval (float): Seconds between job status polls
+
+    Returns:
+        dict: The LoadStats report plus the run's parameters
+    """
+    prefix = prefix or f'loadtest-{uuid.uuid4().hex[:8]}'
+    stats = LoadStats()
+    simulated = [
+        SimulatedUser(base_url, f'{prefix}-{number}', stats, job_timeout, poll_interval)
+        for number in range(1, users + 1)
+    ]
+    threads = [
+        threading.Thread(target=user.run, args=(iterations,), name=f'load-test-{number}')
+        for number, user in enumerate(simulated, start=1)
+    ]
+    started = time.monotonic()
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        for user in simulated:
+            user.close()
+    report = stats.report(time.monotonic() - started)
+    report.update({'users': users, 'iterations': iterations, 'prefix': prefix})
+    return report
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_app(llm_base_url, host='127.0.0.1', port=0):
+    """
+    Serve this project in a background thread.
+
+    Jobs run inline (no worker process is needed) and LLM requests go to
+    `llm_base_url` with the rate limiter disabled, since the stand-in has
+    no quota to protect.
+
+    Yields:
+        str: Root URL of the running app
+    """
+    from . import llm
+
+    overrides = override_settings(
+        OPENAI_API_KEY='load-test',
+        OPENAI_BASE_URL=llm_base_url,
+        JOB_QUEUE_ASYNC=False,
+        LLM_REQUESTS_PER_MINUTE=0,
+        LLM_TOKENS_PER_MINUTE=0,
+        ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + [host],
+    )
+    overrides.enable()
+    llm.close_clients()
+    httpd = ThreadedWSGIServer((host, port), QuietWSGIRequestHandler, allow_reuse_address=True)
+    httpd.daemon_threads = True
+    httpd.set_app(get_wsgi_application())
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{httpd.server_address[1]}'
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+        llm.close_clients()
+        overrides.disable()
+
+
+def delete_load_test_users(prefix):
+    """
+    Delete the accounts (and their documents and blogs) a run created.
+
+    Returns:
+        int: Number of users deleted
+    """
+    from django.contrib.auth.models import User
+
+    from .models import Document
+
+    users = User.objects.filter(username__startswith=f'{prefix}-')
+    # Document.delete() releases shared file blobs and index entries
+    for document in Document.objects.filter(user__in=users):
+        document.delete()
+    count = users.count()
+    users.delete()
+    return count
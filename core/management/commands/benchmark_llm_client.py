@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.fake_llm import FakeLLMServer
+from core.llm import _build_client, close_clients, get_openai_client
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request client creation with the pooled OpenAI client.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Completions per mode.')
+        parser.add_argument(
+            '--base-url',
+            help='Endpoint to call. Defaults to a local fake server.'
+        )
+        parser.add_argument('--api-key', default='benchmark', help='API key sent to the endpoint.')
+        parser.add_argument('--model', default='fake-model', help='Model name sent with each request.')
+
+    def handle(self, *args, **options):
+        server = None
+        base_url = options['base_url']
+        if not base_url:
+            server = FakeLLMServer(content='{"ok": true}').start()
+            base_url = server.base_url
+
+        try:
+            fresh = self._time_requests(
+                lambda: _build_client(options['api_key'], base_url), options, close=True
+            )
+            pooled = self._time_requests(
+                lambda: get_openai_client(options['api_key'], base_url), options
+            )
+        finally:
+            close_clients()
+            if server:
+                server.stop()
+
+        count = options['requests']
+        self.stdout.write(f"{'mode':>8} {'seconds':>9} {'ms/request':>11}")
+        for mode, elapsed in (('fresh', fresh), ('pooled', pooled)):
+            self.stdout.write(f"{mode:>8} {elapsed:>9.3f} {elapsed * 1000 / count:>11.2f}")
+        self.stdout.write(
+            f"Saved {(fresh - pooled) * 1000 / count:.2f} ms per request "
+            f"({fresh / pooled:.2f}x)"
+        )
+
+    def _time_requests(self, make_client, options, close=False):
+        start = time.perf_counter()
+        for _ in range(options['requests']):
+            client = make_client()
+            client.chat.completions.create(
+                model=options['model'],
+                messages=[{'role': 'user', 'content': 'ping'}],
+                max_tokens=1,
+            )
+            if close:
+                client.close()
+        return time.perf_counter() - start
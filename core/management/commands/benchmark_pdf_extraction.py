@@ -0,0 +1,124 @@
+import os
+import tempfile
+import time
+
+import PyPDF2
+from django.core.management.base import BaseCommand, CommandError
+
+from core.pdf_extraction import extract_page_range, extract_pdf_pages_parallel, warm_up_executor
+
+LOREM = (
+    "Solar panels convert sunlight into electricity using photovoltaic cells. "
+    "Our product line covers residential, commercial and industrial installations. "
+)
+
+
+def build_synthetic_pdf(path, num_pages, lines_per_page=45):
+    """
+    Write a text-only PDF with `num_pages` pages to `path`.
+
+    Builds the file by hand so the benchmark has no dependencies beyond
+    PyPDF2 itself.
+    """
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages object, filled in once the page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page_number in range(num_pages):
+        lines = [f"BT /F1 9 Tf 40 800 Td 11 TL (Page {page_number + 1}) Tj"]
+        for line in range(lines_per_page):
+            lines.append(f"T* ({LOREM[:90]} {line}) Tj")
+        lines.append("ET")
+        stream = "\n".join(lines).encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, num_pages)
+
+    with open(path, 'wb') as fh:
+        fh.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(fh.tell())
+            fh.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref_offset = fh.tell()
+        fh.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            fh.write(b"%010d 00000 n \n" % offset)
+        fh.write(
+            b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+            % (len(objects) + 1, xref_offset)
+        )
+
+
+class Command(BaseCommand):
+    help = 'Benchmark serial vs page-parallel PDF text extraction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            help='PDF to benchmark. Defaults to synthetic documents of each --pages size.'
+        )
+        parser.add_argument(
+            '--pages', default='10,50,200,500',
+            help='Comma-separated page counts for synthetic documents.'
+        )
+        parser.add_argument(
+            '--workers', default='1,2,4,8',
+            help='Comma-separated worker counts to compare.'
+        )
+        parser.add_argument(
+            '--page-timeout', type=float, default=10,
+            help='Per-page timeout in seconds.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            worker_counts = [int(w) for w in options['workers'].split(',') if w]
+            page_counts = [int(p) for p in options['pages'].split(',') if p]
+        except ValueError:
+            raise CommandError('--pages and --workers must be comma-separated integers.')
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if options['file']:
+                if not os.path.isfile(options['file']):
+                    raise CommandError(f"File not found: {options['file']}")
+                with open(options['file'], 'rb') as fh:
+                    num_pages = len(PyPDF2.PdfReader(fh).pages)
+                documents = [(options['file'], num_pages)]
+            else:
+                documents = []
+                for num_pages in page_counts:
+                    path = os.path.join(tmp_dir, f'synthetic_{num_pages}.pdf')
+                    build_synthetic_pdf(path, num_pages)
+                    documents.append((path, num_pages))
+
+            self.stdout.write(f"{'pages':>6} {'workers':>8} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+            for path, num_pages in documents:
+                baseline = None
+                for workers in worker_counts:
+                    elapsed = self._time_extraction(path, num_pages, workers, options['page_timeout'])
+                    baseline = baseline or elapsed
+                    self.stdout.write(
+                        f"{num_pages:>6} {workers:>8} {elapsed:>9.3f} "
+                        f"{num_pages / elapsed:>9.1f} {baseline / elapsed:>7.2f}x"
+                    )
+
+    def _time_extraction(self, path, num_pages, workers, page_timeout):
+        if workers <= 1:
+            start = time.perf_counter()
+            extract_page_range(path, 0, num_pages, page_timeout)
+            return time.perf_counter() - start
+
+        # Start every pool process so start-up is not counted against throughput
+        warm_up_executor(workers)
+        start = time.perf_counter()
+        extract_pdf_pages_parallel(path, num_pages, workers, page_timeout)
+        return time.perf_counter() - start
@@ -0,0 +1,71 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk import create_bulk_generation, run_bulk_generation
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a blog for every topic in a CSV (columns: topic, tone, keywords, documents). '
+        'Running the command again with the same file resumes the batch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', help='CSV file with one topic per row.')
+        parser.add_argument('--user', required=True, help='Username that owns the documents and blogs.')
+        parser.add_argument('--name', default=None, help='Batch name (defaults to the file name).')
+        parser.add_argument(
+            '--concurrency', type=int, default=None,
+            help='Generations in flight at once (defaults to BULK_GENERATION_CONCURRENCY).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Blogs written per transaction (defaults to BULK_GENERATION_BATCH_SIZE).'
+        )
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Generate rows that failed in earlier runs again.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User not found: {options['user']}")
+        try:
+            with open(options['csv_path'], 'rb') as fh:
+                data = fh.read()
+        except OSError as e:
+            raise CommandError(str(e))
+
+        try:
+            batch, created = create_bulk_generation(
+                user, data, options['name'] or os.path.basename(options['csv_path'])
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        if created:
+            self.stdout.write(f'Imported {batch.total_rows} topics as batch {batch.id}.')
+        else:
+            self.stdout.write(f'Resuming batch {batch.id} ({batch.total_rows} topics).')
+
+        report = run_bulk_generation(
+            batch,
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+            retry_failed=options['retry_failed'],
+            stdout=self.stdout
+        )
+
+        for failure in report['failures']:
+            self.stdout.write(self.style.WARNING(
+                f"Row {failure['row']} ({failure['topic']}): {failure['error']}"
+            ))
+        summary = (
+            f"{report['done']}/{report['total']} done, {report['failed']} failed, "
+            f"{report['skipped']} skipped; wrote {report['written']} blogs in "
+            f"{report['elapsed_seconds']}s ({report['blogs_per_minute']} blogs/min)."
+        )
+        self.stdout.write(self.style.SUCCESS(summary) if not report['failed'] else self.style.WARNING(summary))
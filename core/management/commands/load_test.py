@@ -0,0 +1,85 @@
+import json
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.fake_llm import FakeLLMServer
+from core.loadtest import delete_load_test_users, run_load_test, serve_app
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive register, upload, create blog, edit and download with concurrent simulated users '
+        'and report throughput and p50/p95/p99 latency per endpoint. By default the app is served '
+        'in-process against a local fake LLM, so no network access or API key is needed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent simulated users.')
+        parser.add_argument('--iterations', type=int, default=1, help='Blogs each user creates.')
+        parser.add_argument(
+            '--base-url', default=None,
+            help='Load test a running instance instead of serving the app in-process.'
+        )
+        parser.add_argument(
+            '--latency', default='lognormal:1.5,0.4',
+            help="Fake LLM latency in seconds or a distribution, e.g. 'uniform:1,3' (in-process only)."
+        )
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of fake LLM calls that fail.')
+        parser.add_argument('--seed', type=int, default=None, help='Seed for fake LLM latency and errors.')
+        parser.add_argument('--job-timeout', type=float, default=300, help='Seconds to wait for each blog.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the simulated users afterwards.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['iterations'] < 1:
+            raise CommandError('--users and --iterations must be at least 1.')
+
+        with ExitStack() as stack:
+            base_url = options['base_url']
+            llm_server = None
+            if not base_url:
+                try:
+                    llm_server = stack.enter_context(FakeLLMServer(
+                        latency=options['latency'], error_rate=options['error_rate'], seed=options['seed']
+                    ))
+                except ValueError as e:
+                    raise CommandError(str(e))
+                base_url = stack.enter_context(serve_app(llm_server.base_url))
+
+            self.stdout.write(
+                f"Load testing {base_url} with {options['users']} users x {options['iterations']} iterations..."
+            )
+            report = run_load_test(
+                base_url, users=options['users'], iterations=options['iterations'],
+                job_timeout=options['job_timeout']
+            )
+            if llm_server:
+                report['llm'] = {'requests': llm_server.requests, 'injected_errors': llm_server.errors}
+
+        if options['cleanup']:
+            report['deleted_users'] = delete_load_test_users(report['prefix'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self._print_report(report)
+
+    def _print_report(self, report):
+        self.stdout.write(
+            f"{'endpoint':<14} {'requests':>8} {'errors':>6} {'req/s':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+        )
+        for endpoint, row in report['endpoints'].items():
+            self.stdout.write(
+                f"{endpoint:<14} {row['requests']:>8} {row['errors']:>6} {row['requests_per_second']:>7} "
+                f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}"
+            )
+        for message in report['errors']:
+            self.stdout.write(self.style.WARNING(message))
+        summary = (
+            f"{report['flows']} flows completed, {report['failed_flows']} failed in "
+            f"{report['elapsed_seconds']}s ({report['flows_per_second']} flows/s, "
+            f"{report['requests_per_second']} requests/s)."
+        )
+        self.stdout.write(self.style.SUCCESS(summary) if not report['failed_flows'] else self.style.WARNING(summary))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.fake_llm import FakeLLMServer
+
+
+class Command(BaseCommand):
+    help = (
+        'Serve a local stand-in for the OpenAI chat completions API. '
+        'Point OPENAI_BASE_URL at the printed URL to use it.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Address to listen on.')
+        parser.add_argument('--port', type=int, default=8001, help='Port to listen on.')
+        parser.add_argument(
+            '--latency', default='0',
+            help="Completion latency in seconds or a distribution, e.g. 'lognormal:2,0.5' or 'uniform:1,3'."
+        )
+        parser.add_argument('--stream-delay', default='0', help='Delay between streamed deltas (same format).')
+        parser.add_argument('--stream-chunk-size', type=int, default=8, help='Characters per streamed delta.')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of completions that fail (0-1).')
+        parser.add_argument(
+            '--error-statuses', default='429,500,503',
+            help='Comma-separated HTTP statuses injected errors are drawn from.'
+        )
+        parser.add_argument('--retry-after', type=float, default=None, help='Retry-After sent with injected errors.')
+        parser.add_argument('--seed', type=int, default=None, help='Seed for latency and error sampling.')
+
+    def handle(self, *args, **options):
+        try:
+            statuses = [int(status) for status in options['error_statuses'].split(',') if status.strip()]
+            server = FakeLLMServer(
+                latency=options['latency'],
+                stream_delay=options['stream_delay'],
+                stream_chunk_size=options['stream_chunk_size'],
+                error_rate=options['error_rate'],
+                error_statuses=statuses,
+                retry_after=options['retry_after'],
+                seed=options['seed'],
+                host=options['host'],
+                port=options['port'],
+            )
+        except (ValueError, OSError) as e:
+            raise CommandError(str(e))
+
+        server.start()
+        self.stdout.write(self.style.SUCCESS(f'Fake LLM API listening on {server.base_url}'))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.stop()
+            self.stdout.write(f'Served {server.requests} requests ({server.errors} injected errors).')
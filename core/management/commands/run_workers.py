@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from core.jobs import run_worker_pool
+
+
+class Command(BaseCommand):
+    help = 'Process queued background jobs (document ingestion, etc.) with a process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of worker processes (defaults to JOB_WORKERS or the CPU count).'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=None,
+            help='Seconds between queue polls when idle (defaults to JOB_POLL_INTERVAL).'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once the queue is empty instead of polling forever.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Starting job workers...')
+        try:
+            processed = run_worker_pool(
+                workers=options['workers'],
+                poll_interval=options['poll_interval'],
+                once=options['once'],
+                stdout=self.stdout
+            )
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping job workers.')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs.'))
@@ -0,0 +1,47 @@
+"""
+Lightweight counters kept in the Django cache.
+
+With the default local-memory cache the counters are per process; point
+CACHES['default'] at a shared backend (Redis, Memcached, database) to
+aggregate them across workers.
+"""
+from django.core.cache import cache
+
+METRICS_PREFIX = 'metrics:'
+
+
+def increment(name, amount=1):
+    """
+    Add `amount` to a counter, creating it if needed.
+
+    Args:
+        name (str): Counter name
+        amount (int or float): Value to add
+    """
+    key = METRICS_PREFIX + name
+    if cache.add(key, amount, timeout=None):
+        return
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, amount, timeout=None)
+
+
+def get_metrics(names):
+    """
+    Return the current value of several counters.
+
+    Args:
+        names (list): Counter names
+
+    Returns:
+        dict: Counter name -> value (0 for counters never incremented)
+    """
+    values = cache.get_many([METRICS_PREFIX + name for name in names])
+    return {name: values.get(METRICS_PREFIX + name, 0) for name in names}
+
+
+def reset_metrics(names):
+    """Delete the given counters."""
+    cache.delete_many([METRICS_PREFIX + name for name in names])
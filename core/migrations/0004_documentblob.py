@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:37
+
+import core.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('file', models.FileField(upload_to=core.models.blob_upload_path)),
+                ('size', models.IntegerField(default=0)),
+                ('ref_count', models.IntegerField(default=0)),
+                ('processed_content', models.TextField(blank=True)),
+                ('word_count', models.IntegerField(default=0)),
+                ('status', models.CharField(default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to='core.documentblob'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_documentchunk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='section_summaries',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='summary',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='summary_key',
+            field=models.CharField(blank=True, max_length=80),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_blog_locking_job_dedupe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('requests', models.FloatField(default=0)),
+                ('tokens', models.FloatField(default=0)),
+                ('updated_at', models.FloatField(default=0)),
+                ('version', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
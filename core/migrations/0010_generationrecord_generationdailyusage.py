@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_bulkgeneration'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationDailyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('generations', models.IntegerField(default=0)),
+                ('cached_generations', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('llm_calls', models.IntegerField(default=0)),
+                ('prompt_tokens', models.BigIntegerField(default=0)),
+                ('completion_tokens', models.BigIntegerField(default=0)),
+                ('llm_ms', models.BigIntegerField(default=0)),
+                ('total_ms', models.BigIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='core_genera_day_310378_idx')],
+                'unique_together': {('user', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='GenerationRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('create', 'Create'), ('regenerate', 'Regenerate'), ('section', 'Section'), ('stream', 'Stream'), ('bulk', 'Bulk')], max_length=20)),
+                ('model', models.CharField(blank=True, max_length=100)),
+                ('prompt_tokens', models.IntegerField(default=0)),
+                ('completion_tokens', models.IntegerField(default=0)),
+                ('llm_calls', models.IntegerField(default=0)),
+                ('cached', models.BooleanField(default=False)),
+                ('succeeded', models.BooleanField(default=True)),
+                ('extraction_ms', models.IntegerField(default=0)),
+                ('context_ms', models.IntegerField(default=0)),
+                ('llm_ms', models.IntegerField(default=0)),
+                ('parse_ms', models.IntegerField(default=0)),
+                ('db_ms', models.IntegerField(default=0)),
+                ('total_ms', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('blog', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='generation_records', to='core.blog')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='core_genera_user_id_4e230e_idx')],
+            },
+        ),
+    ]
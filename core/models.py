@@ -3,6 +3,10 @@ from django.contrib.auth.models import User
 from django.core.validators import FileExtensionValidator
 from django.conf import settings
 from django.utils.text import slugify
+from django.utils import timezone
+from django.db import transaction
+import hashlib
+from datetime import timedelta
 import os
 
 def document_upload_path(instance, filename):
@@ -22,6 +26,96 @@ def document_upload_path(instance, filename):
     # Return path with user-specific directory
     return os.path.join('documents', f'user_{instance.user.id}', clean_filename)
 
+def blob_upload_path(instance, filename):
+    """
+    Generate the content-addressed path for a stored document blob.
+
+    Args:
+        instance: The DocumentBlob instance
+        filename: Original filename
+
+    Returns:
+        str: Path derived from the SHA-256 digest of the file
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join('documents', 'blobs', instance.sha256[:2], f'{instance.sha256}{ext}')
+
+class DocumentBlob(models.Model):
+    """
+    Model representing the stored bytes of one or more identical documents.
+
+    Uploads are addressed by their SHA-256 digest so duplicate uploads share
+    a single file on disk and a single extraction result.
+
+    Attributes:
+        sha256 (CharField): Hex digest of the file contents
+        file (FileField): The stored file
+        size (IntegerField): Size of the file in bytes
+        ref_count (IntegerField): Number of documents pointing at this blob
+        processed_content (TextField): Extracted text shared by all documents
+        word_count (IntegerField): Number of words in the extracted text
+        status (CharField): Extraction status of the blob
+        created_at (DateTimeField): Timestamp of the first upload
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to=blob_upload_path)
+    size = models.IntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    processed_content = models.TextField(blank=True)
+    word_count = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+    @classmethod
+    def store(cls, uploaded_file):
+        """
+        Return the blob for the uploaded bytes, saving the file only if no
+        identical blob exists yet, and take a reference to it.
+
+        Args:
+            uploaded_file: Django UploadedFile
+
+        Returns:
+            DocumentBlob: The shared blob
+        """
+        # Imported here to keep models free of upload-handler imports at load time
+        from .uploads import file_sha256
+
+        digest = file_sha256(uploaded_file)
+        with transaction.atomic():
+            blob, created = cls.objects.select_for_update().get_or_create(
+                sha256=digest,
+                defaults={'size': uploaded_file.size}
+            )
+            if created:
+                blob.file.save(uploaded_file.name, uploaded_file, save=False)
+            blob.ref_count = models.F('ref_count') + 1
+            blob.save()
+            blob.refresh_from_db()
+        return blob
+
+    def release(self):
+        """
+        Drop one reference and delete the stored file once nothing uses it.
+
+        Returns:
+            bool: True if the blob and its file were deleted
+        """
+        with transaction.atomic():
+            blob = DocumentBlob.objects.select_for_update().get(pk=self.pk)
+            blob.ref_count -= 1
+            if blob.ref_count > 0:
+                blob.save(update_fields=['ref_count'])
+                return False
+            path = blob.file.path if blob.file else None
+            blob.delete()
+        if path and os.path.isfile(path):
+            os.remove(path)
+        return True
+
 class Document(models.Model):
     """
     Model representing a document uploaded by a user.
@@ -36,6 +130,10 @@ class Document(models.Model):
         processed_content (TextField): Extracted text content from the document
         word_count (IntegerField): Number of words in the document
         status (CharField): Processing status of the document
+        blob (ForeignKey): Shared content-addressed file, if deduplicated
+        summary (TextField): Precomputed summary of the whole document
+        section_summaries (JSONField): Summaries of each section of the document
+        summary_key (CharField): Content hash the summary was built from
     """
     
     STATUS_CHOICES = [
@@ -61,11 +159,41 @@ class Document(models.Model):
         choices=STATUS_CHOICES,
         default='pending'
     )
+    blob = models.ForeignKey(DocumentBlob, on_delete=models.PROTECT, null=True, blank=True)
+    summary = models.TextField(blank=True)
+    section_summaries = models.JSONField(default=list, blank=True)
+    summary_key = models.CharField(max_length=80, blank=True)
 
     def __str__(self):
         """Return string representation of the document."""
         return self.title
 
+    @classmethod
+    def create_from_upload(cls, user, title, uploaded_file):
+        """
+        Create a document backed by a content-addressed blob.
+
+        Identical uploads share one stored file, so re-uploading a brochure
+        under another title costs neither disk space nor a second extraction.
+
+        Args:
+            user (User): Owner of the document
+            title (str): Document title
+            uploaded_file: Django UploadedFile
+
+        Returns:
+            Document: The saved document
+        """
+        blob = DocumentBlob.store(uploaded_file)
+        document = cls(user=user, title=title, blob=blob)
+        document.file.name = blob.file.name
+        try:
+            document.save()
+        except Exception:
+            blob.release()
+            raise
+        return document
+
     def save(self, *args, **kwargs):
         """
         Override save method to set file type and size.
@@ -81,19 +209,6 @@ class Document(models.Model):
             self.file_size = self.file.size
         super().save(*args, **kwargs)
 
-    def delete(self, *args, **kwargs):
-        """
-        Override delete method to remove the file from storage.
-        
-        Args:
-            *args: Additional arguments
-            **kwargs: Additional keyword arguments
-        """
-        if self.file:
-            if os.path.isfile(self.file.path):
-                os.remove(self.file.path)
-        super().delete(*args, **kwargs)
-
     def get_file_extension(self):
         """
         Get the file extension of the document.
@@ -123,6 +238,20 @@ class Document(models.Model):
             return len(self.processed_content.split())
         return 0
 
+    def get_content_hash(self):
+        """
+        Return a digest identifying the document's content.
+
+        Documents backed by a blob use the file's SHA-256; older documents
+        fall back to a digest of their extracted text.
+
+        Returns:
+            str: Hex digest
+        """
+        if self.blob_id is not None:
+            return self.blob.sha256
+        return hashlib.sha256(self.processed_content.encode('utf-8')).hexdigest()
+
     def update_status(self, status):
         """
         Update the processing status of the document.
@@ -138,6 +267,30 @@ class Document(models.Model):
         self.status = status
         self.save()
 
+class DocumentChunk(models.Model):
+    """
+    Model representing a passage of a document's extracted text.
+
+    Chunks are created at ingestion time and indexed for retrieval so
+    generation can use the passages most relevant to a topic.
+
+    Attributes:
+        document (ForeignKey): The document the passage belongs to
+        position (IntegerField): Order of the passage within the document
+        text (TextField): Passage text
+        word_count (IntegerField): Number of words in the passage
+    """
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='chunks')
+    position = models.IntegerField()
+    text = models.TextField()
+    word_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.document.title} #{self.position}"
+
+    class Meta:
+        ordering = ['document', 'position']
+
 class Blog(models.Model):
     """
     Model representing generated blog posts.
@@ -154,6 +307,8 @@ class Blog(models.Model):
         created_at (DateTimeField): Creation timestamp
         updated_at (DateTimeField): Last update timestamp
         reference_documents (ManyToManyField): Documents referenced in the blog
+        version (IntegerField): Incremented on every write, for optimistic locking
+        generation_started_at (DateTimeField): Set while a generation holds the blog
     """
     STATUS_CHOICES = [
         ('draft', 'Draft'),
@@ -172,10 +327,145 @@ class Blog(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     reference_documents = models.ManyToManyField(Document, blank=True)
+    version = models.IntegerField(default=0)
+    generation_started_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.blog_title or self.topic
 
+    @staticmethod
+    def _generation_lock_cutoff():
+        max_age = getattr(settings, 'BLOG_GENERATION_LOCK_TIMEOUT', 10 * 60)
+        return timezone.now() - timedelta(seconds=max_age)
+
+    def claim_generation(self):
+        """
+        Take the blog's generation lock.
+
+        The conditional update makes the claim atomic, so only one of several
+        concurrent regenerations of the same blog proceeds. A lock older than
+        BLOG_GENERATION_LOCK_TIMEOUT is treated as abandoned.
+
+        Returns:
+            bool: True if this caller holds the lock
+        """
+        started_at = timezone.now()
+        claimed = Blog.objects.filter(pk=self.pk).filter(
+            models.Q(generation_started_at__isnull=True)
+            | models.Q(generation_started_at__lt=self._generation_lock_cutoff())
+        ).update(generation_started_at=started_at)
+        if claimed:
+            self.generation_started_at = started_at
+        return bool(claimed)
+
+    def release_generation(self):
+        """Drop the generation lock without changing the content."""
+        Blog.objects.filter(pk=self.pk, generation_started_at=self.generation_started_at).update(
+            generation_started_at=None
+        )
+        self.generation_started_at = None
+
+    def is_generating(self):
+        """Return True if a generation currently holds the blog."""
+        return (self.generation_started_at is not None
+                and self.generation_started_at >= self._generation_lock_cutoff())
+
+    def apply_generation(self, result):
+        """
+        Store a generation result and release the generation lock.
+
+        Written with a single UPDATE that bumps the version, so editors
+        holding the previous version get a conflict instead of silently
+        overwriting the new content.
+
+        Args:
+            result (dict): Parsed generation result
+
+        Returns:
+            bool: False if the lock was lost to another generation
+        """
+        return self.apply_partial_generation({
+            'blog_title': result.get('blog_title', self.topic),
+            'additional_keywords': result.get('keywords', {}).get('additional_keywords', []),
+            'blog_outline': result.get('blog_outline', ''),
+            'blog_draft': result.get('blog_draft', ''),
+        })
+
+    def apply_partial_generation(self, fields):
+        """
+        Store regenerated fields (e.g. only blog_draft) and release the generation lock.
+
+        Args:
+            fields (dict): Field name -> new value
+
+        Returns:
+            bool: False if the lock was lost to another generation
+        """
+        updated = Blog.objects.filter(
+            pk=self.pk, generation_started_at=self.generation_started_at
+        ).update(
+            **fields,
+            version=models.F('version') + 1,
+            generation_started_at=None,
+            updated_at=timezone.now()
+        )
+        if updated:
+            self.refresh_from_db()
+        return bool(updated)
+
+    def update_content(self, fields, expected_version=None):
+        """
+        Save edited fields unless the blog changed since the editor loaded it.
+
+        Args:
+            fields (dict): Field name -> new value
+            expected_version (int): Version the edit was based on, or None to
+                skip the check
+
+        Returns:
+            bool: False if the version no longer matches or a generation is
+            in progress
+        """
+        blogs = Blog.objects.filter(pk=self.pk).filter(
+            models.Q(generation_started_at__isnull=True)
+            | models.Q(generation_started_at__lt=self._generation_lock_cutoff())
+        )
+        if expected_version is not None:
+            blogs = blogs.filter(version=expected_version)
+        updated = blogs.update(**fields, version=models.F('version') + 1, updated_at=timezone.now())
+        if updated:
+            self.refresh_from_db()
+        return bool(updated)
+
+    @classmethod
+    def create_from_generation(cls, user, topic, tone, target_keywords, documents, result):
+        """
+        Save a blog from the parsed output of a generation request.
+
+        Args:
+            user (User): Owner of the blog
+            topic (str): Blog topic
+            tone (str): Writing tone
+            target_keywords (list): Keywords supplied by the user
+            documents: Reference documents to associate with the blog
+            result (dict): Parsed generation result
+
+        Returns:
+            Blog: The saved blog
+        """
+        blog = cls.objects.create(
+            user=user,
+            topic=topic,
+            tone=tone,
+            target_keywords=target_keywords,
+            additional_keywords=result.get('keywords', {}).get('additional_keywords', []),
+            blog_title=result.get('blog_title', topic),
+            blog_outline=result.get('blog_outline', ''),
+            blog_draft=result.get('blog_draft', ''),
+        )
+        blog.reference_documents.set(documents)
+        return blog
+
     def save(self, *args, **kwargs):
         """
         Override save method to update timestamps.
@@ -200,3 +490,354 @@ class Blog(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+
+class Job(models.Model):
+    """
+    Model representing a unit of background work processed by the worker pool.
+
+    Jobs are stored in the database so no external broker is required; the
+    `run_workers` management command claims queued jobs and runs them in a
+    process pool.
+
+    Attributes:
+        user (ForeignKey): User the job was enqueued for
+        kind (CharField): Name of the handler that runs the job
+        payload (JSONField): Arguments passed to the handler
+        status (CharField): Current state of the job
+        result (JSONField): Value returned by the handler
+        error (TextField): Error message if the job failed
+        attempts (IntegerField): Number of times the job was claimed
+        dedupe_key (CharField): Identifies identical requests; at most one
+            queued or running job may hold a given key
+        created_at (DateTimeField): Timestamp of when the job was enqueued
+        started_at (DateTimeField): Timestamp of when a worker claimed the job
+        heartbeat_at (DateTimeField): Last time the dispatcher running the
+            job reported it alive
+        finished_at (DateTimeField): Timestamp of when the job finished
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    dedupe_key = models.CharField(max_length=64, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    def claim(self):
+        """
+        Atomically move the job from queued to running.
+
+        The conditional update makes claiming safe when several dispatchers
+        poll the same table.
+
+        Returns:
+            bool: True if this caller claimed the job
+        """
+        now = timezone.now()
+        claimed = Job.objects.filter(pk=self.pk, status='queued').update(
+            status='running',
+            started_at=now,
+            heartbeat_at=now,
+            attempts=models.F('attempts') + 1
+        )
+        if claimed:
+            self.refresh_from_db()
+        return bool(claimed)
+
+    def mark_done(self, result=None):
+        """
+        Record a successful run.
+
+        Args:
+            result: JSON-serializable value returned by the handler
+        """
+        self.status = 'done'
+        self.result = result
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'result', 'finished_at'])
+
+    def mark_failed(self, error):
+        """
+        Record a failed run.
+
+        Args:
+            error (str): Error message
+        """
+        self.status = 'failed'
+        self.error = error
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'error', 'finished_at'])
+
+    def get_timings(self):
+        """
+        Calculate how long the job waited and ran.
+
+        Returns:
+            dict: queue_seconds and run_seconds (None until known); unfinished
+            phases are measured up to now
+        """
+        now = timezone.now()
+        queue_end = self.started_at or (None if self.finished_at else now)
+        queue_seconds = (queue_end - self.created_at).total_seconds() if queue_end else None
+        run_seconds = None
+        if self.started_at:
+            run_seconds = ((self.finished_at or now) - self.started_at).total_seconds()
+        return {'queue_seconds': queue_seconds, 'run_seconds': run_seconds}
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['kind', 'dedupe_key'],
+                condition=models.Q(status__in=['queued', 'running']) & ~models.Q(dedupe_key=''),
+                name='unique_active_job_dedupe_key',
+            ),
+        ]
+
+class RateLimitBucket(models.Model):
+    """
+    Model holding the shared state of a token-bucket rate limiter.
+
+    See core.rate_limit; storing the balances in the database lets every
+    web and worker process draw from the same budget.
+
+    Attributes:
+        name (CharField): Limiter name
+        requests (FloatField): Requests available at updated_at
+        tokens (FloatField): Tokens available at updated_at
+        updated_at (FloatField): Unix time of the last change
+        version (IntegerField): Incremented on every change, for compare-and-swap
+    """
+    name = models.CharField(max_length=50, unique=True)
+    requests = models.FloatField(default=0)
+    tokens = models.FloatField(default=0)
+    updated_at = models.FloatField(default=0)
+    version = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.requests:.1f} requests, {self.tokens:.0f} tokens"
+
+class BulkGeneration(models.Model):
+    """
+    Model representing a batch of blogs generated from an uploaded topic list.
+
+    Attributes:
+        user (ForeignKey): Owner of the batch and of the generated blogs
+        name (CharField): Name of the batch, usually the CSV file name
+        source_hash (CharField): SHA-256 of the CSV, used to resume a batch
+            when the same file is submitted again
+        status (CharField): Current state of the batch
+        total_rows (IntegerField): Number of topics in the batch
+        report (JSONField): Summary of the last run
+        created_at (DateTimeField): Timestamp of the upload
+        started_at (DateTimeField): Timestamp of when the last run started
+        finished_at (DateTimeField): Timestamp of when the last run finished
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    source_hash = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total_rows = models.IntegerField(default=0)
+    report = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+    def get_counts(self):
+        """
+        Count the batch's rows by status.
+
+        Returns:
+            dict: Status -> number of rows, with every status present
+        """
+        counts = dict(
+            self.rows.order_by().values_list('status').annotate(count=models.Count('id'))
+        )
+        return {status: counts.get(status, 0) for status, _ in BulkGenerationRow.STATUS_CHOICES}
+
+    class Meta:
+        ordering = ['-created_at']
+
+class BulkGenerationRow(models.Model):
+    """
+    Model representing one topic of a bulk generation batch.
+
+    Rows move from pending to running while their blog is generated, to
+    generated once the result is stored, and to done when their Blog has
+    been written. Finished rows are skipped when a batch is resumed.
+
+    Attributes:
+        batch (ForeignKey): Batch the row belongs to
+        row_number (IntegerField): Line of the row in the CSV
+        topic (CharField): Blog topic
+        tone (CharField): Writing tone
+        keywords (JSONField): Target keywords
+        document_refs (JSONField): Reference document ids or titles
+        document_ids (JSONField): Ids of the resolved reference documents
+        status (CharField): Current state of the row
+        result (JSONField): Generation result waiting to be written as a Blog
+        error (TextField): Error message if the row failed
+        blog (ForeignKey): Blog generated for the row
+        started_at (DateTimeField): Timestamp of when generation started
+        finished_at (DateTimeField): Timestamp of when the row finished
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('generated', 'Generated'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    batch = models.ForeignKey(BulkGeneration, on_delete=models.CASCADE, related_name='rows')
+    row_number = models.IntegerField()
+    topic = models.CharField(max_length=255)
+    tone = models.CharField(max_length=50, default='professional')
+    keywords = models.JSONField(default=list)
+    document_refs = models.JSONField(default=list)
+    document_ids = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    blog = models.ForeignKey(Blog, on_delete=models.SET_NULL, null=True, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Row {self.row_number}: {self.topic} ({self.status})"
+
+    class Meta:
+        ordering = ['row_number']
+        unique_together = ['batch', 'row_number']
+        indexes = [
+            models.Index(fields=['batch', 'status']),
+        ]
+
+class GenerationRecord(models.Model):
+    """
+    Model holding the token and latency accounting of one generation.
+
+    One row is written per generation attempt, failed ones included (see
+    core.accounting). Stage timings are wall-clock milliseconds; stages
+    that overlap (e.g. sections drafted in parallel) are counted once.
+
+    Attributes:
+        user (ForeignKey): User the generation ran for
+        blog (ForeignKey): Blog created or updated, if any
+        kind (CharField): Entry point of the generation
+        model (CharField): Model that produced most of the completion tokens
+        prompt_tokens (IntegerField): Prompt tokens over every LLM call
+        completion_tokens (IntegerField): Completion tokens over every LLM call
+        llm_calls (IntegerField): Number of LLM calls
+        cached (BooleanField): True if the result came from the generation cache
+        succeeded (BooleanField): False if the generation failed
+        extraction_ms (IntegerField): Time spent extracting document text
+        context_ms (IntegerField): Time spent retrieving and packing context
+        llm_ms (IntegerField): Time spent waiting for the model
+        parse_ms (IntegerField): Time spent parsing the model's output
+        db_ms (IntegerField): Time spent saving the blog
+        total_ms (IntegerField): Wall-clock time of the whole generation
+        created_at (DateTimeField): Timestamp of the generation
+    """
+    KIND_CHOICES = [
+        ('create', 'Create'),
+        ('regenerate', 'Regenerate'),
+        ('section', 'Section'),
+        ('stream', 'Stream'),
+        ('bulk', 'Bulk'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    blog = models.ForeignKey(
+        Blog, on_delete=models.SET_NULL, null=True, blank=True, related_name='generation_records'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    model = models.CharField(max_length=100, blank=True)
+    prompt_tokens = models.IntegerField(default=0)
+    completion_tokens = models.IntegerField(default=0)
+    llm_calls = models.IntegerField(default=0)
+    cached = models.BooleanField(default=False)
+    succeeded = models.BooleanField(default=True)
+    extraction_ms = models.IntegerField(default=0)
+    context_ms = models.IntegerField(default=0)
+    llm_ms = models.IntegerField(default=0)
+    parse_ms = models.IntegerField(default=0)
+    db_ms = models.IntegerField(default=0)
+    total_ms = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} by {self.user}: {self.prompt_tokens}+{self.completion_tokens} tokens, {self.total_ms} ms"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+class GenerationDailyUsage(models.Model):
+    """
+    Model holding per-user, per-day totals of GenerationRecord.
+
+    Updated in the same transaction as every record it counts, so usage
+    reports read one row per user and day instead of scanning records.
+
+    Attributes:
+        user (ForeignKey): User the totals belong to
+        day (DateField): Local date of the generations
+        generations (IntegerField): Number of generations
+        cached_generations (IntegerField): Generations served from the cache
+        failed (IntegerField): Generations that failed
+        llm_calls (IntegerField): Number of LLM calls
+        prompt_tokens (BigIntegerField): Prompt tokens
+        completion_tokens (BigIntegerField): Completion tokens
+        llm_ms (BigIntegerField): Milliseconds spent waiting for the model
+        total_ms (BigIntegerField): Wall-clock milliseconds of the generations
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    day = models.DateField()
+    generations = models.IntegerField(default=0)
+    cached_generations = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    llm_calls = models.IntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    completion_tokens = models.BigIntegerField(default=0)
+    llm_ms = models.BigIntegerField(default=0)
+    total_ms = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user} on {self.day}: {self.generations} generations"
+
+    class Meta:
+        ordering = ['-day']
+        unique_together = ['user', 'day']
+        indexes = [
+            models.Index(fields=['day']),
+        ]
@@ -0,0 +1,226 @@
+"""
+Page-parallel text extraction for large PDF files.
+
+Kept separate from core.utils so the spawned worker processes only import
+PyPDF2 and the standard library, not the OpenAI/LanguageTool stack.
+"""
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+import PyPDF2
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+class PageTimeout(Exception):
+    """Raised inside a worker when a single page takes too long to extract."""
+
+
+def _raise_page_timeout(signum, frame):
+    raise PageTimeout()
+
+
+def extract_page_range(path, start, stop, page_timeout=None):
+    """
+    Extract text from pages [start, stop) of the PDF at `path`.
+
+    Runs inside a pool worker. Each page is guarded by a SIGALRM timer where
+    the platform supports it, so one pathological page is skipped instead of
+    stalling the whole range.
+
+    Returns:
+        list: Text of each page, or None for pages that failed or timed out
+    """
+    use_alarm = (
+        page_timeout
+        and hasattr(signal, 'SIGALRM')
+        and threading.current_thread() is threading.main_thread()
+    )
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_page_timeout)
+
+    texts = []
+    try:
+        with open(path, 'rb') as fh:
+            reader = PyPDF2.PdfReader(fh)
+            for index in range(start, stop):
+                try:
+                    if use_alarm:
+                        signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                    texts.append(reader.pages[index].extract_text() or None)
+                except PageTimeout:
+                    print(f"Timed out extracting text from PDF page {index + 1}")
+                    texts.append(None)
+                except Exception as e:
+                    print(f"Error extracting text from PDF page {index + 1}: {str(e)}")
+                    texts.append(None)
+                finally:
+                    if use_alarm:
+                        signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous_handler)
+    return texts
+
+
+def split_page_ranges(num_pages, workers, min_chunk=4):
+    """
+    Split `num_pages` into contiguous ranges for the pool.
+
+    Creates a few ranges per worker so slow pages do not leave the other
+    workers idle, but never ranges smaller than `min_chunk` pages because
+    each range re-opens the file.
+
+    Returns:
+        list: (start, stop) tuples in page order
+    """
+    if num_pages <= 0:
+        return []
+    chunk = max(min_chunk, math.ceil(num_pages / (max(workers, 1) * 4)))
+    return [(start, min(start + chunk, num_pages)) for start in range(0, num_pages, chunk)]
+
+
+def _get_executor(workers):
+    """Return the shared extraction pool, creating it on first use."""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _executor_workers = workers
+        return _executor
+
+
+def _worker_pid(delay):
+    time.sleep(delay)
+    return os.getpid()
+
+
+def warm_up_executor(workers, max_rounds=20):
+    """
+    Start every process of the extraction pool, e.g. before timing it.
+
+    The pool starts processes lazily, so a small warm-up document would
+    leave most of them to start inside the first real extraction.
+
+    Returns:
+        int: Number of distinct worker processes that answered
+    """
+    executor = _get_executor(workers)
+    pids = set()
+    for _ in range(max_rounds):
+        # Tasks linger briefly so one fast-starting process cannot take them all
+        futures = [executor.submit(_worker_pid, 0.05) for _ in range(workers)]
+        pids.update(future.result() for future in futures)
+        if len(pids) >= workers:
+            break
+    return len(pids)
+
+
+def _discard_executor():
+    """
+    Drop the shared pool after a stuck range so later calls get a fresh one.
+
+    shutdown() alone leaves a worker that is stuck in a page running, so the
+    pool's processes are terminated as well.
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is None:
+        return
+    processes = list((getattr(executor, '_processes', None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout=1)
+
+
+def extraction_workers(requested, job_workers=None, cpu_count=None):
+    """
+    Cap the extraction pool at this process's share of the CPUs.
+
+    Every job worker may run its own pool, so JOB_WORKERS processes each
+    spawning `requested` extractors would oversubscribe the machine.
+
+    Args:
+        requested (int): PDF_EXTRACTION_WORKERS
+        job_workers (int): Job worker processes sharing the machine
+        cpu_count (int): CPUs available
+
+    Returns:
+        int: Number of extraction processes to use (1 means serial)
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    job_workers = max(job_workers or 1, 1)
+    return max(1, min(requested, cpu_count // job_workers))
+
+
+def _deadline_seconds(ranges, workers, page_timeout):
+    """Seconds the whole extraction may take: the pages one worker gets, plus slack."""
+    if not page_timeout:
+        return None
+    largest = max(stop - start for start, stop in ranges)
+    rounds = math.ceil(len(ranges) / max(workers, 1))
+    return rounds * largest * page_timeout + 5
+
+
+def extract_pdf_pages_parallel(path, num_pages, workers, page_timeout=None):
+    """
+    Extract text from a PDF by fanning page ranges out across a process pool.
+
+    The ranges share one deadline counted from their submission, so a slow
+    PDF cannot hold the caller for the sum of per-range timeouts; ranges
+    still running at the deadline come back as None and the pool's processes
+    are terminated.
+
+    Args:
+        path (str): Path of the PDF on disk
+        num_pages (int): Number of pages in the document
+        workers (int): Number of worker processes
+        page_timeout (float): Seconds allowed per page, or None for no limit
+
+    Returns:
+        list: Text of each page in page order (None for failed pages)
+    """
+    ranges = split_page_ranges(num_pages, workers)
+    if not ranges:
+        return []
+    executor = _get_executor(workers)
+    futures = [
+        (start, stop, executor.submit(extract_page_range, path, start, stop, page_timeout))
+        for start, stop in ranges
+    ]
+    # Backstop for pages the in-worker timer cannot interrupt
+    wait([future for _, _, future in futures], timeout=_deadline_seconds(ranges, workers, page_timeout))
+
+    pages = []
+    stuck = False
+    for start, stop, future in futures:
+        if not future.done():
+            print(f"Timed out extracting PDF pages {start + 1}-{stop}")
+            pages.extend([None] * (stop - start))
+            stuck = True
+            continue
+        try:
+            pages.extend(future.result())
+        except Exception as e:
+            print(f"Error extracting PDF pages {start + 1}-{stop}: {str(e)}")
+            pages.extend([None] * (stop - start))
+
+    if stuck:
+        _discard_executor()
+    return pages
@@ -0,0 +1,300 @@
+"""
+Outline-first blog generation.
+
+Instead of one long completion, the blog is generated in two phases:
+
+1. A short completion returns the title, metadata and an outline keyed the
+   way format_blog_content expects (introduction, H2_n, H2_n_m, conclusion).
+2. Every top-level section is drafted by its own completion. The requests
+   run concurrently on the shared event loop, at most
+   GENERATION_SECTION_CONCURRENCY at a time, and the results are assembled
+   into the draft in outline order. Every request is routed to the
+   section model (core.routing) and admitted through the global rate
+   limiter (core.rate_limit) first.
+
+Wall-clock time is then roughly the outline plus the slowest section, and
+no single completion has to fit the whole post.
+"""
+import asyncio
+import json
+import re
+import time
+
+from django.conf import settings
+
+from .accounting import track_stage
+from .context import truncate_to_tokens
+from .llm import acomplete, complete, run_async
+from .rate_limit import acquire_for_completion, record_usage
+from .resilience import ProviderUnavailable
+from .routing import Route
+from .utils import BLOG_COMPLETION_PARAMS, BLOG_SYSTEM_PROMPT, complete_blog_response
+
+H2_KEY = re.compile(r'^H2_(\d+)$')
+H3_KEY = re.compile(r'^H2_(\d+)_(\d+)$')
+
+OUTLINE_REQUIRED_KEYS = ['blog_title', 'blog_outline']
+
+
+def _heading(value):
+    """Return the text of an outline entry, which may be a string or {'content': ...}."""
+    if isinstance(value, dict):
+        return str(value.get('content', '')).strip()
+    return str(value or '').strip()
+
+
+def build_outline_messages(topic, tone, target_keywords, documents_content):
+    """
+    Build the messages for the outline phase.
+
+    Returns:
+        list: Chat completion messages
+    """
+    documents_content = truncate_to_tokens(
+        documents_content, getattr(settings, 'CONTEXT_TOKEN_BUDGET', 3000)
+    )
+    prompt = f"""Plan a high-quality, SEO-optimized blog article. Do not write the article yet.
+
+Topic: {topic}
+Tone: {tone}
+Target Keywords: {', '.join(target_keywords)}
+Reference Documents Summary: {documents_content}
+
+Return JSON with:
+{{
+    "blog_title": "SEO-optimized, engaging title",
+    "meta_description": "Compelling meta description for SEO",
+    "keywords": {{
+        "user_keywords": {json.dumps(target_keywords)},
+        "additional_keywords": [],
+        "lsi_keywords": [],
+        "semantic_variations": []
+    }},
+    "word_count": "Recommended word count based on competitor analysis",
+    "blog_outline": {{
+        "introduction": {{"content": "What the introduction covers"}},
+        "H2_1": "First section heading",
+        "H2_1_1": {{"content": "First subsection heading of section 1"}},
+        "H2_2": "Second section heading",
+        "conclusion": {{"content": "What the conclusion covers"}}
+    }},
+    "seo_recommendations": {{
+        "internal_linking": [],
+        "featured_snippet_opportunities": [],
+        "content_gaps": []
+    }}
+}}
+Use as many H2_n sections and H2_n_m subsections as the topic needs."""
+    return [
+        {"role": "system", "content": BLOG_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def outline_sections(outline):
+    """
+    Turn an outline into the list of sections to draft, in reading order.
+
+    Args:
+        outline (dict): Outline with introduction, H2_n, H2_n_m and conclusion keys
+
+    Returns:
+        list: Dicts with key, heading and subheadings
+    """
+    if not isinstance(outline, dict):
+        return []
+
+    subheadings = {}
+    for key, value in outline.items():
+        match = H3_KEY.match(key)
+        if match:
+            subheadings.setdefault(match.group(1), []).append((int(match.group(2)), _heading(value)))
+
+    sections = []
+    if 'introduction' in outline:
+        sections.append({'key': 'introduction', 'heading': 'Introduction',
+                         'brief': _heading(outline['introduction']), 'subheadings': []})
+    h2_keys = sorted(
+        (int(match.group(1)), key) for key in outline for match in [H2_KEY.match(key)] if match
+    )
+    for number, key in h2_keys:
+        sections.append({
+            'key': key,
+            'heading': _heading(outline[key]),
+            'brief': '',
+            'subheadings': [text for _, text in sorted(subheadings.get(str(number), []))],
+        })
+    if 'conclusion' in outline:
+        sections.append({'key': 'conclusion', 'heading': 'Conclusion',
+                         'brief': _heading(outline['conclusion']), 'subheadings': []})
+    return sections
+
+
+def target_word_count(word_count, default=1500):
+    """Return the first number in the recommended word count, e.g. 1500 for '1500-2000 words'."""
+    match = re.search(r'\d[\d,]*', str(word_count or ''))
+    return int(match.group().replace(',', '')) if match else default
+
+
+def build_section_messages(plan, section, tone, target_keywords, documents_content, words):
+    """
+    Build the messages that draft one section.
+
+    Returns:
+        list: Chat completion messages
+    """
+    outline_overview = '\n'.join(f"- {s['heading']}" for s in plan['sections'])
+    instructions = f"Write the \"{section['heading']}\" section of the article \"{plan['blog_title']}\"."
+    if section['brief']:
+        instructions += f" It should cover: {section['brief']}."
+    if section['subheadings']:
+        subheadings = '\n'.join(f"#### {heading}" for heading in section['subheadings'])
+        instructions += f"\nUse exactly these subsection headings, in this order:\n{subheadings}"
+
+    prompt = f"""{instructions}
+
+Tone: {tone}
+Target Keywords: {', '.join(target_keywords)}
+Length: about {words} words
+Full article outline, for context (write only the requested section):
+{outline_overview}
+
+Reference Documents Summary: {documents_content}
+
+Return only the section body as Markdown, without the section heading itself."""
+    return [
+        {"role": "system", "content": BLOG_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def section_requests(plan, tone, target_keywords, documents_content):
+    """
+    Build the completion request of every section in the plan.
+
+    Returns:
+        tuple: (completion params, list of (section, messages))
+    """
+    words = max(target_word_count(plan['word_count']) // max(len(plan['sections']), 1), 80)
+    params = dict(BLOG_COMPLETION_PARAMS)
+    params.pop('response_format', None)
+    params['max_tokens'] = getattr(settings, 'GENERATION_SECTION_MAX_TOKENS', 1500)
+    requests = [
+        (section, build_section_messages(plan, section, tone, target_keywords, documents_content, words))
+        for section in plan['sections']
+    ]
+    return params, requests
+
+
+async def draft_sections(requests, params, routes, concurrency=None, deadline=None):
+    """
+    Draft every section concurrently.
+
+    Args:
+        requests (list): (section, messages) pairs from section_requests()
+        params (dict): Completion parameters
+        routes (list): Route of each request (see core.routing)
+        concurrency (int): Maximum number of simultaneous requests
+        deadline (float): Seconds all sections may take together, or None
+
+    Returns:
+        tuple: (section key -> drafted Markdown, list of response usages,
+        list of seconds per section)
+
+    Raises:
+        ProviderUnavailable: If the sections missed the deadline or a
+            section was cancelled
+        Exception: The first section failure, once every request has finished
+    """
+    concurrency = concurrency or getattr(settings, 'GENERATION_SECTION_CONCURRENCY', 4)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def draft(section, messages, route):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await acomplete(messages, params, stage='section', route=route)
+            elapsed = time.perf_counter() - started
+            print(f"Drafted section {section['key']} with {route.model} in {elapsed:.1f}s")
+            return response.choices[0].message.content.strip(), response.usage, elapsed
+
+    gathered = asyncio.gather(
+        *(draft(section, messages, route) for (section, messages), route in zip(requests, routes)),
+        return_exceptions=True
+    )
+    try:
+        results = await asyncio.wait_for(gathered, deadline)
+    except asyncio.TimeoutError:
+        raise ProviderUnavailable(f'Drafting the sections took longer than {deadline}s.')
+    for (section, _), result in zip(requests, results):
+        if isinstance(result, Exception):
+            raise result
+        if isinstance(result, BaseException):
+            # A cancelled section is a failed section, not a cancelled request
+            raise ProviderUnavailable(f"Drafting section {section['key']} was cancelled.")
+    drafts = {section['key']: text for (section, _), (text, _, _) in zip(requests, results)}
+    return drafts, [usage for _, usage, _ in results], [elapsed for _, _, elapsed in results]
+
+
+def assemble_draft(sections, drafts):
+    """
+    Join the drafted sections into one Markdown document.
+
+    Section headings use `###` and subsections `####`, the format the blog
+    editor renders.
+
+    Returns:
+        str: The complete draft
+    """
+    parts = []
+    for section in sections:
+        parts.append(f"### {section['heading']}\n\n{drafts.get(section['key'], '').strip()}")
+    return '\n\n'.join(parts)
+
+
+def generate_sectioned_blog_content(topic, tone, target_keywords, documents_content):
+    """
+    Generate a blog outline first, then draft its sections in parallel.
+
+    Returns:
+        dict: The same fields as generate_blog_content, with blog_draft
+        assembled from the section drafts
+    """
+    started = time.perf_counter()
+
+    outline_params = dict(BLOG_COMPLETION_PARAMS)
+    outline_params['max_tokens'] = getattr(settings, 'GENERATION_OUTLINE_MAX_TOKENS', 1500)
+    messages = build_outline_messages(topic, tone, target_keywords, documents_content)
+    response = complete(messages, outline_params, stage='outline')
+    # The draft comes from the section phase, so only the outline fields are required
+    result = complete_blog_response(
+        messages, outline_params, response.choices[0].message.content or '', topic, target_keywords,
+        required=OUTLINE_REQUIRED_KEYS
+    )
+    print(f"Generated outline in {time.perf_counter() - started:.1f}s")
+
+    sections = outline_sections(result['blog_outline'])
+    if not sections:
+        raise ValueError("The generated outline has no sections")
+
+    plan = {'blog_title': result['blog_title'], 'word_count': result['word_count'], 'sections': sections}
+    section_context = truncate_to_tokens(
+        documents_content, getattr(settings, 'GENERATION_SECTION_CONTEXT_TOKENS', 1500)
+    )
+    params, requests = section_requests(plan, tone, target_keywords, section_context)
+    # Route and admit every section through the rate limiter before fanning out
+    routes = [Route('section', params) for _ in requests]
+    estimates = [
+        acquire_for_completion(messages, route.params) for (_, messages), route in zip(requests, routes)
+    ]
+    deadline = getattr(settings, 'LLM_DEADLINE', 300)
+    with track_stage('llm'):
+        # The coroutine enforces the deadline; the extra wait is a backstop for a stuck loop
+        drafts, usages, timings = run_async(
+            draft_sections(requests, params, routes, deadline=deadline), timeout=deadline + 5
+        )
+    for route, estimated, usage, elapsed in zip(routes, estimates, usages, timings):
+        record_usage(estimated, usage)
+        route.record(elapsed, usage)
+    result['blog_draft'] = assemble_draft(sections, drafts)
+    print(f"Generated {len(sections)} sections in {time.perf_counter() - started:.1f}s total")
+    return result
@@ -0,0 +1,207 @@
+"""
+Global rate limiter for LLM requests.
+
+A token bucket per limit (requests per minute and tokens per minute) is
+stored in the database, so every web and worker process draws from the
+same budget. Buckets refill continuously; a caller that does not fit waits
+until it does, for at most LLM_RATE_LIMIT_MAX_WAIT seconds. Updates are
+compare-and-swap on a version column, the same conditional-update pattern
+Job.claim uses, so no row locks are needed. Admission happens in
+synchronous code only; callers that fan out async requests admit each one
+before starting the event loop work.
+
+Set LLM_REQUESTS_PER_MINUTE or LLM_TOKENS_PER_MINUTE to 0 to disable that
+limit.
+"""
+import time
+
+from django.conf import settings
+from django.db.models import F
+
+from .context import count_tokens
+from .metrics import get_metrics, increment
+from .resilience import ProviderUnavailable
+
+BUCKET_NAME = 'openai'
+
+RATE_LIMIT_METRICS = ['llm_rate_limit_acquired', 'llm_rate_limit_waits', 'llm_rate_limit_wait_seconds']
+
+
+class RateLimitTimeout(ProviderUnavailable):
+    """Raised when the rate limiter cannot admit a request in time."""
+
+
+def _limits():
+    return (
+        getattr(settings, 'LLM_REQUESTS_PER_MINUTE', 0),
+        getattr(settings, 'LLM_TOKENS_PER_MINUTE', 0),
+    )
+
+
+def estimate_tokens(messages, max_tokens=0):
+    """
+    Estimate the tokens a completion will consume.
+
+    Providers count the prompt plus the requested completion limit against
+    the tokens-per-minute budget, so the estimate does the same.
+
+    Returns:
+        int: Prompt tokens plus max_tokens
+    """
+    prompt = sum(count_tokens(message.get('content') or '') + 4 for message in messages)
+    return prompt + (max_tokens or 0)
+
+
+def _get_bucket():
+    # Imported here because core.models is loaded before this module is needed
+    from .models import RateLimitBucket
+
+    requests_per_minute, tokens_per_minute = _limits()
+    bucket, _ = RateLimitBucket.objects.get_or_create(
+        name=BUCKET_NAME,
+        defaults={
+            'requests': float(requests_per_minute),
+            'tokens': float(tokens_per_minute),
+            'updated_at': time.time(),
+        }
+    )
+    return bucket
+
+
+def _refill(bucket, now):
+    """Return the request and token balances of a bucket at `now`."""
+    requests_per_minute, tokens_per_minute = _limits()
+    elapsed = max(now - bucket.updated_at, 0.0)
+    requests = min(float(requests_per_minute), bucket.requests + elapsed * requests_per_minute / 60.0)
+    tokens = min(float(tokens_per_minute), bucket.tokens + elapsed * tokens_per_minute / 60.0)
+    return requests, tokens
+
+
+def try_acquire(tokens):
+    """
+    Take one request and `tokens` tokens from the bucket if both are available.
+
+    Args:
+        tokens (int): Estimated tokens of the request
+
+    Returns:
+        float: 0.0 if admitted, otherwise the seconds until the request fits
+    """
+    from .models import RateLimitBucket
+
+    requests_per_minute, tokens_per_minute = _limits()
+    if not requests_per_minute and not tokens_per_minute:
+        return 0.0
+    # A request larger than the whole bucket could never fit; let it drain the bucket instead
+    if tokens_per_minute:
+        tokens = min(tokens, tokens_per_minute)
+
+    while True:
+        bucket = _get_bucket()
+        now = time.time()
+        available_requests, available_tokens = _refill(bucket, now)
+
+        wait = 0.0
+        if requests_per_minute and available_requests < 1:
+            wait = max(wait, (1 - available_requests) * 60.0 / requests_per_minute)
+        if tokens_per_minute and available_tokens < tokens:
+            wait = max(wait, (tokens - available_tokens) * 60.0 / tokens_per_minute)
+        if wait > 0:
+            return wait
+
+        updated = RateLimitBucket.objects.filter(pk=bucket.pk, version=bucket.version).update(
+            requests=available_requests - 1 if requests_per_minute else 0.0,
+            tokens=available_tokens - tokens if tokens_per_minute else 0.0,
+            updated_at=now,
+            version=bucket.version + 1
+        )
+        if updated:
+            return 0.0
+        # Another process changed the bucket in between; read it again
+
+
+def acquire(tokens, timeout=None):
+    """
+    Wait until the bucket admits a request of `tokens` tokens.
+
+    Args:
+        tokens (int): Estimated tokens of the request
+        timeout (float): Maximum seconds to wait, defaults to
+            LLM_RATE_LIMIT_MAX_WAIT
+
+    Returns:
+        float: Seconds spent waiting
+
+    Raises:
+        RateLimitTimeout: If the request was not admitted in time
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'LLM_RATE_LIMIT_MAX_WAIT', 120)
+    started = time.monotonic()
+    slept = False
+    while True:
+        wait = try_acquire(tokens)
+        waited = time.monotonic() - started if slept else 0.0
+        if not wait:
+            increment('llm_rate_limit_acquired')
+            if slept:
+                increment('llm_rate_limit_waits')
+                increment('llm_rate_limit_wait_seconds', waited)
+            return waited
+        if waited + wait > timeout:
+            raise RateLimitTimeout(
+                f"LLM rate limit: request of {tokens} tokens not admitted within {timeout}s",
+                retry_after=wait
+            )
+        time.sleep(min(wait, 1.0))
+        slept = True
+
+
+def record_usage(estimated, usage):
+    """
+    Return unused tokens to the bucket once the actual usage is known.
+
+    Args:
+        estimated (int): Tokens taken by acquire()
+        usage: The response's usage object, or None
+    """
+    from .models import RateLimitBucket
+
+    actual = getattr(usage, 'total_tokens', 0) or 0
+    if not actual or not _limits()[1] or actual >= estimated:
+        return
+    RateLimitBucket.objects.filter(name=BUCKET_NAME).update(
+        tokens=F('tokens') + (estimated - actual),
+        version=F('version') + 1
+    )
+
+
+def acquire_for_completion(messages, params):
+    """
+    Admit a chat completion through the limiter.
+
+    Args:
+        messages (list): Chat completion messages
+        params (dict): Completion parameters (max_tokens is counted)
+
+    Returns:
+        int: Estimated tokens taken, to pass to record_usage()
+    """
+    estimated = estimate_tokens(messages, params.get('max_tokens', 0))
+    acquire(estimated)
+    return estimated
+
+
+def rate_limit_stats():
+    """
+    Return the limiter counters.
+
+    Returns:
+        dict: Admitted requests, how many had to wait, and the average wait
+    """
+    stats = get_metrics(RATE_LIMIT_METRICS)
+    waits = stats['llm_rate_limit_waits']
+    stats['llm_rate_limit_average_wait_seconds'] = (
+        stats['llm_rate_limit_wait_seconds'] / waits if waits else 0.0
+    )
+    return stats
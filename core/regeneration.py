@@ -0,0 +1,386 @@
+"""
+Regeneration of a single part of an existing blog.
+
+Instead of rerunning the whole generation, one completion rewrites just
+the title, the outline, or one section of the draft (introduction, H2_n,
+H2_n_m or conclusion). The prompt carries the stored outline and the
+neighboring sections so the new text fits its place, and only that part
+of the stored JSON is patched; everything else is kept as it was.
+
+Drafts come in two shapes: single-shot generations store a dict keyed by
+section (introduction, H2_1, ...), while the sectioned pipeline stores one
+Markdown document with `###` section and `####` subsection headings in
+outline order. Both are supported.
+"""
+import json
+import re
+import time
+
+from django.conf import settings
+
+from .accounting import track_stage
+from .context import truncate_to_tokens
+from .json_repair import JSONRepairError, repair_json
+from .llm import complete
+from .pipeline import H2_KEY, H3_KEY, _heading, outline_sections
+from .utils import BLOG_COMPLETION_PARAMS, BLOG_SYSTEM_PROMPT
+
+SECTION_KEY = re.compile(r'^(introduction|conclusion|H2_\d+|H2_\d+_\d+)$')
+
+REGENERATION_TARGETS = ['title', 'outline', 'introduction', 'conclusion', 'H2_n', 'H2_n_m']
+
+# Tokens of each neighboring section included as context
+NEIGHBOR_CONTEXT_TOKENS = 300
+
+
+class SectionNotFound(ValueError):
+    """The requested section does not exist in the blog's outline or draft."""
+
+
+def is_regeneration_target(key):
+    """Return True if `key` names a part of a blog that can be regenerated."""
+    return key in ('title', 'outline') or bool(SECTION_KEY.match(key or ''))
+
+
+def _key_order(key):
+    if key == 'introduction':
+        return (0, 0, 0)
+    if key == 'conclusion':
+        return (2, 0, 0)
+    match = H2_KEY.match(key)
+    if match:
+        return (1, int(match.group(1)), 0)
+    match = H3_KEY.match(key)
+    if match:
+        return (1, int(match.group(1)), int(match.group(2)))
+    return (3, 0, 0)
+
+
+def _split_markdown(text, marker):
+    """
+    Split Markdown at headings starting with `marker` (e.g. '###').
+
+    Returns:
+        tuple: (text before the first heading, list of [heading, body])
+    """
+    matches = list(re.finditer(rf'^{re.escape(marker)} (.+)$', text, re.MULTILINE))
+    if not matches:
+        return text, []
+    parts = []
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        parts.append([match.group(1).strip(), text[match.end():end].strip('\n')])
+    return text[:matches[0].start()], parts
+
+
+def _join_markdown(preamble, parts, marker):
+    body = '\n\n'.join(f'{marker} {heading}\n\n{text.strip()}' for heading, text in parts)
+    preamble = preamble.strip('\n')
+    return f'{preamble}\n\n{body}' if preamble else body
+
+
+def _find_part(parts, heading, index=None):
+    """Find a Markdown part by heading, falling back to its position."""
+    wanted = heading.strip().lower()
+    for position, (part_heading, _) in enumerate(parts):
+        if part_heading.strip().lower() == wanted:
+            return position
+    if index is not None and index < len(parts):
+        return index
+    return None
+
+
+def _text(value):
+    return _heading(value) if isinstance(value, dict) else str(value or '')
+
+
+def _locate_in_dict(draft, outline, key):
+    # A section the outline has but the draft skipped is added
+    if key not in draft and key not in outline:
+        raise SectionNotFound(f'Section {key} is not in the draft')
+    keys = sorted(set(draft) | {key}, key=_key_order)
+    position = keys.index(key)
+
+    def patch(text):
+        return {**draft, key: text}
+
+    return {
+        'text': _text(draft.get(key)),
+        'previous': _text(draft.get(keys[position - 1])) if position > 0 else '',
+        'next': _text(draft.get(keys[position + 1])) if position + 1 < len(keys) else '',
+        'patch': patch,
+    }
+
+
+def _locate_in_markdown(draft, outline, key):
+    sections = outline_sections(outline)
+    top_key = key
+    match = H3_KEY.match(key)
+    if match:
+        top_key = f'H2_{match.group(1)}'
+    section_index = next((i for i, section in enumerate(sections) if section['key'] == top_key), None)
+    if section_index is None:
+        raise SectionNotFound(f'Section {top_key} is not in the outline')
+
+    preamble, parts = _split_markdown(draft, '###')
+    position = _find_part(parts, sections[section_index]['heading'], section_index)
+    if position is None:
+        raise SectionNotFound(f'Section {top_key} is not in the draft')
+
+    if not match:
+        def patch(text):
+            updated = [list(part) for part in parts]
+            updated[position][1] = text
+            return _join_markdown(preamble, updated, '###')
+
+        return {
+            'text': parts[position][1],
+            'previous': parts[position - 1][1] if position > 0 else '',
+            'next': parts[position + 1][1] if position + 1 < len(parts) else '',
+            'patch': patch,
+        }
+
+    # A subsection: a '####' block inside its section
+    if key not in outline:
+        raise SectionNotFound(f'Subsection {key} is not in the outline')
+    section_text = parts[position][1]
+    lead, subparts = _split_markdown(section_text, '####')
+    subheadings = sections[section_index]['subheadings']
+    heading = _heading(outline[key])
+    sub_position = _find_part(
+        subparts, heading, subheadings.index(heading) if heading in subheadings else None
+    )
+    if sub_position is None:
+        raise SectionNotFound(f'Subsection {key} is not in the draft')
+
+    def patch(text):
+        updated_subparts = [list(part) for part in subparts]
+        updated_subparts[sub_position][1] = text
+        updated = [list(part) for part in parts]
+        updated[position][1] = _join_markdown(lead, updated_subparts, '####')
+        return _join_markdown(preamble, updated, '###')
+
+    return {
+        'text': subparts[sub_position][1],
+        'previous': subparts[sub_position - 1][1] if sub_position > 0 else lead,
+        'next': subparts[sub_position + 1][1] if sub_position + 1 < len(subparts) else '',
+        'patch': patch,
+    }
+
+
+def locate_section(blog, key):
+    """
+    Find a section of a blog's draft.
+
+    Args:
+        blog (Blog): The blog
+        key (str): introduction, conclusion, H2_n or H2_n_m
+
+    Returns:
+        dict: heading, current text, previous and next section text, and
+        `patch`, a function returning the draft with the section replaced
+
+    Raises:
+        SectionNotFound: If the section is in neither the outline nor the draft
+    """
+    draft = blog.blog_draft
+    outline = blog.blog_outline if isinstance(blog.blog_outline, dict) else {}
+    if isinstance(draft, str) and draft.lstrip().startswith('{'):
+        try:
+            draft = json.loads(draft)
+        except json.JSONDecodeError:
+            pass
+
+    if isinstance(draft, dict):
+        located = _locate_in_dict(draft, outline, key)
+    elif isinstance(draft, str) and draft.strip():
+        located = _locate_in_markdown(draft, outline, key)
+    else:
+        raise SectionNotFound('The blog has no draft yet')
+
+    if key in ('introduction', 'conclusion'):
+        located['heading'] = key.capitalize()
+    else:
+        located['heading'] = _heading(outline.get(key)) or key
+    return located
+
+
+def _outline_overview(outline):
+    lines = []
+    for section in outline_sections(outline):
+        lines.append(f"- {section['heading']}")
+        lines.extend(f"  - {heading}" for heading in section['subheadings'])
+    return '\n'.join(lines)
+
+
+def build_section_regeneration_messages(blog, key, located, instructions, documents_content):
+    """
+    Build the messages that rewrite one section.
+
+    Returns:
+        list: Chat completion messages
+    """
+    outline = blog.blog_outline if isinstance(blog.blog_outline, dict) else {}
+    words = max(len(located['text'].split()), 80)
+    request = f"Rewrite the \"{located['heading']}\" section of the article \"{blog.blog_title}\"."
+    if H2_KEY.match(key):
+        subheadings = [
+            section['subheadings'] for section in outline_sections(outline) if section['key'] == key
+        ]
+        if subheadings and subheadings[0]:
+            headings = '\n'.join(f"#### {heading}" for heading in subheadings[0])
+            request += f"\nKeep exactly these subsection headings, in this order:\n{headings}"
+    if instructions:
+        request += f"\nEditor's instructions: {instructions}"
+
+    def excerpt(text):
+        return truncate_to_tokens(text, NEIGHBOR_CONTEXT_TOKENS) or '(none)'
+
+    prompt = f"""{request}
+
+Tone: {blog.tone}
+Target Keywords: {', '.join(blog.target_keywords or [])}
+Length: about {words} words
+Full article outline, for context (write only the requested section):
+{_outline_overview(outline) or '(no outline)'}
+
+Current version of the section:
+{located['text'] or '(empty)'}
+
+End of the preceding section:
+{excerpt(located['previous'][-2000:])}
+
+Start of the following section:
+{excerpt(located['next'])}
+
+Reference Documents Summary: {documents_content}
+
+Return only the new section body as Markdown, without the section heading itself."""
+    return [
+        {"role": "system", "content": BLOG_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def build_title_messages(blog, instructions):
+    """Build the messages that propose a new title."""
+    outline = blog.blog_outline if isinstance(blog.blog_outline, dict) else {}
+    prompt = f"""Write a new SEO-optimized, engaging title for this article.
+
+Topic: {blog.topic}
+Current title: {blog.blog_title}
+Target Keywords: {', '.join(blog.target_keywords or [])}
+Outline:
+{_outline_overview(outline) or '(no outline)'}
+{f"Editor's instructions: {instructions}" if instructions else ''}
+Return only the title, without quotes."""
+    return [
+        {"role": "system", "content": BLOG_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def build_outline_regeneration_messages(blog, instructions, documents_content):
+    """Build the messages that replace the outline, keeping the title and keywords."""
+    prompt = f"""Plan a new outline for the article "{blog.blog_title}".
+
+Topic: {blog.topic}
+Tone: {blog.tone}
+Target Keywords: {', '.join(blog.target_keywords or [])}
+Current outline:
+{json.dumps(blog.blog_outline, indent=2) if blog.blog_outline else '(none)'}
+{f"Editor's instructions: {instructions}" if instructions else ''}
+Reference Documents Summary: {documents_content}
+
+Return JSON with a single "blog_outline" object keyed like:
+{{
+    "blog_outline": {{
+        "introduction": {{"content": "What the introduction covers"}},
+        "H2_1": "First section heading",
+        "H2_1_1": {{"content": "First subsection heading of section 1"}},
+        "H2_2": "Second section heading",
+        "conclusion": {{"content": "What the conclusion covers"}}
+    }}
+}}"""
+    return [
+        {"role": "system", "content": BLOG_SYSTEM_PROMPT},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def regenerate_blog_part(blog, key, instructions='', documents_content=''):
+    """
+    Regenerate the title, the outline or one draft section of a blog.
+
+    The blog is not saved; the caller stores the returned field, normally
+    with Blog.apply_partial_generation() while holding the generation lock.
+
+    Args:
+        blog (Blog): The blog
+        key (str): 'title', 'outline', 'introduction', 'conclusion', 'H2_n'
+            or 'H2_n_m'
+        instructions (str): Optional guidance from the editor
+        documents_content (str): Reference context, used for sections and the outline
+
+    Returns:
+        dict: key, field (the Blog field to store), value (its new value),
+        content (the regenerated part), usage and elapsed_seconds
+
+    Raises:
+        SectionNotFound: If the section does not exist
+        ValueError: If the model returned no usable content
+        ProviderUnavailable: If the provider stayed unavailable
+    """
+    started = time.perf_counter()
+    params = dict(BLOG_COMPLETION_PARAMS)
+    params.pop('response_format', None)
+
+    if key == 'title':
+        params['max_tokens'] = 100
+        response = complete(build_title_messages(blog, instructions), params, stage='title')
+        content = (response.choices[0].message.content or '').strip().strip('"').strip()
+        if not content:
+            raise ValueError('The model returned an empty title')
+        field, value = 'blog_title', content[:255]
+    elif key == 'outline':
+        params['response_format'] = {"type": "json_object"}
+        params['max_tokens'] = getattr(settings, 'GENERATION_OUTLINE_MAX_TOKENS', 1500)
+        messages = build_outline_regeneration_messages(blog, instructions, documents_content)
+        response = complete(messages, params, stage='outline')
+        try:
+            with track_stage('parse'):
+                content = repair_json(response.choices[0].message.content or '').value
+        except JSONRepairError:
+            raise ValueError('The model returned an invalid outline')
+        content = content.get('blog_outline', content) if isinstance(content, dict) else None
+        if not isinstance(content, dict) or not outline_sections(content):
+            raise ValueError('The model returned an outline without sections')
+        field, value = 'blog_outline', content
+    else:
+        located = locate_section(blog, key)
+        params['max_tokens'] = getattr(settings, 'GENERATION_SECTION_MAX_TOKENS', 1500)
+        documents_content = truncate_to_tokens(
+            documents_content, getattr(settings, 'GENERATION_SECTION_CONTEXT_TOKENS', 1500)
+        )
+        messages = build_section_regeneration_messages(blog, key, located, instructions, documents_content)
+        response = complete(messages, params, stage='section')
+        content = (response.choices[0].message.content or '').strip()
+        if not content:
+            raise ValueError('The model returned an empty section')
+        field, value = 'blog_draft', located['patch'](content)
+
+    usage = response.usage
+    elapsed = time.perf_counter() - started
+    print(f"Regenerated {key} of blog {blog.id} in {elapsed:.1f}s")
+    return {
+        'key': key,
+        'field': field,
+        'value': value,
+        'content': content,
+        'usage': {
+            'prompt_tokens': getattr(usage, 'prompt_tokens', 0),
+            'completion_tokens': getattr(usage, 'completion_tokens', 0),
+            'total_tokens': getattr(usage, 'total_tokens', 0),
+        },
+        'elapsed_seconds': round(elapsed, 2),
+    }
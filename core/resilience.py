@@ -0,0 +1,422 @@
+"""
+Retries, deadlines, hedging and circuit breaking for LLM calls.
+
+call_with_resilience() runs a request function with:
+
+- a deadline per attempt (passed to the request as its timeout) and an
+  overall deadline across attempts;
+- retries of transient failures (timeouts, connection errors, 429 and
+  5xx responses) with jittered exponential backoff that honors the
+  provider's Retry-After header;
+- optional hedging: when an attempt is slower than the recent p95 latency
+  of its stage, a second identical request is sent and the first answer
+  wins;
+- a per-process circuit breaker that rejects calls immediately after
+  repeated failures and lets a single trial call through once the reset
+  timeout has passed.
+
+Transient failures that outlast the retries surface as ProviderUnavailable,
+which views report as 503 rather than 500. Other errors (bad requests,
+authentication) are raised unchanged on the first attempt.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+import openai
+from django.conf import settings
+
+from .metrics import get_metrics, increment
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+RESILIENCE_METRICS = [
+    'llm_retries', 'llm_hedges', 'llm_hedge_wins', 'llm_circuit_rejections', 'llm_failures',
+]
+
+
+class ProviderUnavailable(Exception):
+    """
+    The provider is rate limiting, failing or too slow; try again later.
+
+    Attributes:
+        retry_after (float): Suggested seconds to wait, if known
+    """
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(ProviderUnavailable):
+    """Raised without calling the provider while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    closed: calls pass. After `failure_threshold` consecutive transient
+    failures the breaker opens and rejects calls for `reset_timeout`
+    seconds, then half-opens and lets one trial call through; its outcome
+    closes or re-opens the breaker. A trial that never reports back (it was
+    cancelled, or failed before reaching the provider) is abandoned, and
+    another is let through once `reset_timeout` passes without an outcome.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started_at = 0.0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may go to the provider now."""
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            now = time.monotonic()
+            if self.state == 'open' and now - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self.trial_started_at = now
+                return True
+            if self.state == 'half_open' and now - self.trial_started_at >= self.reset_timeout:
+                # The last trial was lost; try another
+                self.trial_started_at = now
+                return True
+            return False
+
+    def retry_after(self):
+        """Seconds until the breaker lets a trial call through."""
+        with self.lock:
+            if self.state == 'open':
+                started = self.opened_at
+            elif self.state == 'half_open':
+                started = self.trial_started_at
+            else:
+                return 0.0
+            return max(self.reset_timeout - (time.monotonic() - started), 0.0)
+
+    def abandon_trial(self):
+        """Re-open a half-open breaker whose trial ended without an outcome, allowing a new trial now."""
+        with self.lock:
+            if self.state == 'half_open':
+                self.state = 'open'
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    print(f"Circuit breaker opened after {self.failures} failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Recent successful call latencies of one stage, for hedging thresholds."""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def percentile(self, percent):
+        """
+        Return the given percentile of the recorded latencies.
+
+        Returns:
+            float or None: None until LLM_HEDGE_MIN_SAMPLES calls were recorded
+        """
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples or len(samples) < getattr(settings, 'LLM_HEDGE_MIN_SAMPLES', 20):
+            return None
+        index = min(int(round(percent / 100.0 * (len(samples) - 1))), len(samples) - 1)
+        return samples[index]
+
+
+_breaker = None
+_trackers = {}
+_state_lock = threading.Lock()
+_hedge_executor = None
+
+
+def get_circuit_breaker():
+    """Return this process's circuit breaker for the LLM provider."""
+    global _breaker
+    with _state_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(
+                getattr(settings, 'LLM_CIRCUIT_FAILURE_THRESHOLD', 5),
+                getattr(settings, 'LLM_CIRCUIT_RESET_TIMEOUT', 30),
+            )
+        return _breaker
+
+
+def get_latency_tracker(stage):
+    """Return the latency tracker of a stage (e.g. 'outline' or 'section')."""
+    with _state_lock:
+        return _trackers.setdefault(stage, LatencyTracker())
+
+
+def reset_resilience_state():
+    """Forget the circuit breaker and latency history, e.g. between tests."""
+    global _breaker
+    with _state_lock:
+        _breaker = None
+        _trackers.clear()
+
+
+def _get_hedge_executor():
+    global _hedge_executor
+    with _state_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'LLM_HEDGE_WORKERS', 8), thread_name_prefix='llm-hedge'
+            )
+        return _hedge_executor
+
+
+def is_retryable(error):
+    """Return True for failures worth retrying: timeouts, connection errors, 429 and 5xx."""
+    if isinstance(error, (openai.APIConnectionError, httpx.TimeoutException, httpx.TransportError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return False
+
+
+def retry_after_seconds(error):
+    """
+    Read the delay the provider asked for from a failed response.
+
+    Returns:
+        float or None: Seconds from the retry-after-ms or Retry-After header
+    """
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        # HTTP-date values are rare for this API; fall back to backoff
+        return None
+    return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    Return how long to wait before the next attempt.
+
+    Full-jitter exponential backoff, LLM_RETRY_BASE_DELAY * 2^attempt capped
+    at LLM_RETRY_MAX_DELAY, so concurrent clients do not retry in lockstep.
+    A Retry-After from the provider is a lower bound.
+
+    Args:
+        attempt (int): Number of the attempt that failed, from 0
+
+    Returns:
+        float: Seconds to wait
+    """
+    base = getattr(settings, 'LLM_RETRY_BASE_DELAY', 0.5)
+    cap = getattr(settings, 'LLM_RETRY_MAX_DELAY', 20)
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def _hedge_delay(tracker, timeout):
+    if not getattr(settings, 'LLM_HEDGE_ENABLED', False):
+        return None
+    threshold = tracker.percentile(getattr(settings, 'LLM_HEDGE_PERCENTILE', 95))
+    if threshold is None or threshold >= timeout:
+        return None
+    return max(threshold, getattr(settings, 'LLM_HEDGE_MIN_DELAY', 1.0))
+
+
+def _call_hedged(call, timeout, tracker, admit_hedge):
+    """Run call(timeout), sending a second request if the first is slower than p95."""
+    delay = _hedge_delay(tracker, timeout)
+    if delay is None:
+        return call(timeout)
+
+    executor = _get_hedge_executor()
+    primary = executor.submit(call, timeout)
+    done, _ = wait([primary], timeout=delay)
+    if done or (admit_hedge is not None and not admit_hedge()):
+        return primary.result()
+
+    increment('llm_hedges')
+    hedge = executor.submit(call, timeout - delay)
+    pending = {primary, hedge}
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # The slower request finishes in the background and is discarded
+                if future is hedge:
+                    increment('llm_hedge_wins')
+                return future.result()
+            error = error or future.exception()
+    raise error
+
+
+def _before_attempt(breaker, deadline_at):
+    """Check the breaker and deadline; return the time left for the attempt."""
+    if not breaker.allow():
+        increment('llm_circuit_rejections')
+        raise CircuitOpenError(
+            'The AI provider is currently unavailable. Please try again shortly.',
+            retry_after=breaker.retry_after()
+        )
+    remaining = deadline_at - time.monotonic()
+    return min(getattr(settings, 'LLM_ATTEMPT_TIMEOUT', 120), remaining)
+
+
+def _after_failure(error, attempt, breaker, deadline_at, stage):
+    """
+    Record a failed attempt and decide whether to retry.
+
+    Returns:
+        float: Seconds to wait before retrying
+
+    Raises:
+        The error itself if it is not transient, or ProviderUnavailable if no
+        attempt or time is left
+    """
+    if not is_retryable(error):
+        # The provider answered; a bad request says nothing about its health
+        breaker.record_success()
+        raise error
+    breaker.record_failure()
+    retry_after = retry_after_seconds(error)
+    delay = backoff_delay(attempt, retry_after)
+    last_attempt = attempt + 1 >= getattr(settings, 'LLM_MAX_ATTEMPTS', 4)
+    if last_attempt or time.monotonic() + delay >= deadline_at:
+        increment('llm_failures')
+        raise ProviderUnavailable(
+            f'The AI provider did not respond successfully after {attempt + 1} attempts: {error}',
+            retry_after=retry_after
+        ) from error
+    increment('llm_retries')
+    print(f"LLM {stage} attempt {attempt + 1} failed ({error}); retrying in {delay:.1f}s")
+    return delay
+
+
+def call_with_resilience(call, stage, admit=None, admit_hedge=None, hedge=False):
+    """
+    Call the provider with deadlines, retries, optional hedging and circuit breaking.
+
+    Args:
+        call: Function taking a timeout in seconds and returning the response
+        stage (str): Name of the call, for latency tracking and logs
+        admit: Function run before every attempt, e.g. rate limiter admission
+        admit_hedge: Function returning False to veto sending a hedge request
+        hedge (bool): Allow a hedge request when an attempt is slower than p95
+
+    Returns:
+        The response of the first successful attempt
+
+    Raises:
+        ProviderUnavailable: If the breaker is open or transient failures
+            outlasted the retries or the overall deadline (LLM_DEADLINE)
+    """
+    breaker = get_circuit_breaker()
+    tracker = get_latency_tracker(stage)
+    deadline_at = time.monotonic() + getattr(settings, 'LLM_DEADLINE', 300)
+    attempt = 0
+    while True:
+        # Admitted first: a rate limit timeout must not strand a half-open trial
+        if admit is not None:
+            admit()
+        timeout = _before_attempt(breaker, deadline_at)
+        started = time.monotonic()
+        try:
+            if hedge:
+                response = _call_hedged(call, timeout, tracker, admit_hedge)
+            else:
+                response = call(timeout)
+        except Exception as e:
+            time.sleep(_after_failure(e, attempt, breaker, deadline_at, stage))
+            attempt += 1
+            continue
+        except BaseException:
+            breaker.abandon_trial()
+            raise
+        breaker.record_success()
+        tracker.record(time.monotonic() - started)
+        return response
+
+
+async def acall_with_resilience(call, stage):
+    """
+    Async version of call_with_resilience() for requests on the shared event loop.
+
+    Hedging and per-attempt admission are not available here; callers admit
+    their requests before fanning out.
+
+    Args:
+        call: Coroutine function taking a timeout in seconds
+        stage (str): Name of the call, for latency tracking and logs
+    """
+    breaker = get_circuit_breaker()
+    tracker = get_latency_tracker(stage)
+    deadline_at = time.monotonic() + getattr(settings, 'LLM_DEADLINE', 300)
+    attempt = 0
+    while True:
+        timeout = _before_attempt(breaker, deadline_at)
+        started = time.monotonic()
+        try:
+            response = await call(timeout)
+        except Exception as e:
+            await asyncio.sleep(_after_failure(e, attempt, breaker, deadline_at, stage))
+            attempt += 1
+            continue
+        except BaseException:
+            # Cancelled, e.g. by a section deadline
+            breaker.abandon_trial()
+            raise
+        breaker.record_success()
+        tracker.record(time.monotonic() - started)
+        return response
+
+
+def resilience_stats():
+    """
+    Return retry, hedge and breaker counters.
+
+    Returns:
+        dict: Counters plus the breaker state and the p95 latency per stage
+    """
+    stats = get_metrics(RESILIENCE_METRICS)
+    stats['llm_circuit_state'] = get_circuit_breaker().state
+    with _state_lock:
+        trackers = dict(_trackers)
+    stats['llm_p95_seconds'] = {stage: tracker.percentile(95) for stage, tracker in trackers.items()}
+    return stats
@@ -0,0 +1,336 @@
+"""
+Passage retrieval over the chunks of a user's documents.
+
+Documents are split into passages at ingestion time (chunk_document) and
+each user gets a BM25 inverted index over their passages. Indexes are kept
+in memory per process and persisted under RETRIEVAL_INDEX_DIR, and are
+rebuilt only when the user's chunks change. When NumPy/SciPy are available
+the BM25 ranking is fused with the TF-IDF index from core.similarity.
+"""
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .models import Document, DocumentChunk
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOP_WORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have he her his
+how i if in into is it its me my no not of on or our so such that the their them
+then there these they this to was we were what when where which who will with
+would you your
+""".split())
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _get_similarity():
+    """
+    Return the TF-IDF similarity module, or None when it is disabled or
+    NumPy/SciPy are not installed.
+    """
+    if not getattr(settings, 'RETRIEVAL_USE_TFIDF', True):
+        return None
+    try:
+        # Imported lazily: core.similarity depends on this module's tokenizer
+        from . import similarity
+    except ImportError:
+        return None
+    return similarity
+
+
+def tokenize(text):
+    """
+    Split text into lowercase index terms, dropping stop words.
+
+    Returns:
+        list: Terms in order of appearance
+    """
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in STOP_WORDS
+    ]
+
+
+def split_into_chunks(text, chunk_words=None):
+    """
+    Split text into passages of roughly `chunk_words` words.
+
+    Paragraphs are packed together until the target size is reached;
+    paragraphs longer than the target are split on word boundaries.
+
+    Returns:
+        list: Passage strings in document order
+    """
+    chunk_words = chunk_words or getattr(settings, 'RETRIEVAL_CHUNK_WORDS', 150)
+    chunks = []
+    current = []
+    current_words = 0
+
+    for paragraph in re.split(r'\n\s*\n', text):
+        words = paragraph.split()
+        if not words:
+            continue
+        # Split oversized paragraphs into word windows
+        pieces = [words[i:i + chunk_words] for i in range(0, len(words), chunk_words)]
+        for piece in pieces:
+            if current and current_words + len(piece) > chunk_words:
+                chunks.append('\n\n'.join(current))
+                current, current_words = [], 0
+            current.append(' '.join(piece))
+            current_words += len(piece)
+
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+def chunk_document(document):
+    """
+    Replace the stored passages of a document with fresh ones from its text.
+
+    Returns:
+        int: Number of passages created
+    """
+    DocumentChunk.objects.filter(document=document).delete()
+    if document.status != 'completed' or not document.processed_content:
+        remove_document_from_indexes(document)
+        return 0
+
+    chunks = [
+        DocumentChunk(document=document, position=position, text=text, word_count=len(text.split()))
+        for position, text in enumerate(split_into_chunks(document.processed_content))
+    ]
+    DocumentChunk.objects.bulk_create(chunks, batch_size=500)
+
+    similarity = _get_similarity()
+    if similarity is not None:
+        similarity.index_document(document)
+    return len(chunks)
+
+
+def remove_document_from_indexes(document):
+    """Drop a deleted document's passages from the incremental TF-IDF index."""
+    similarity = _get_similarity()
+    if similarity is not None:
+        similarity.unindex_document(document)
+
+
+def ensure_document_chunks(documents):
+    """Chunk completed documents that were ingested before passages existed."""
+    for document in documents:
+        if document.status == 'completed' and not document.chunks.exists():
+            chunk_document(document)
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over a set of passages.
+
+    Attributes:
+        chunk_ids (list): Passage primary keys, indexed by internal position
+        document_ids (list): Owning document of each passage
+        lengths (list): Number of terms in each passage
+        postings (dict): Term -> list of (position, term frequency)
+        signature (tuple): Version of the chunk table the index was built from
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunk_ids = []
+        self.document_ids = []
+        self.lengths = []
+        self.postings = defaultdict(list)
+        self.avg_length = 0.0
+        self.signature = None
+
+    def build(self, rows, signature=None):
+        """
+        Index passages.
+
+        Args:
+            rows: Iterable of (chunk id, document id, text)
+            signature: Version marker stored with the index
+
+        Returns:
+            BM25Index: self
+        """
+        for chunk_id, document_id, text in rows:
+            position = len(self.chunk_ids)
+            terms = Counter(tokenize(text))
+            self.chunk_ids.append(chunk_id)
+            self.document_ids.append(document_id)
+            self.lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings[term].append((position, frequency))
+
+        self.postings = dict(self.postings)
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.signature = signature
+        return self
+
+    def idf(self, term):
+        """Return the BM25 inverse document frequency of a term."""
+        n = len(self.postings.get(term, ()))
+        total = len(self.chunk_ids)
+        return math.log(1 + (total - n + 0.5) / (n + 0.5))
+
+    def search(self, query, limit=10, document_ids=None):
+        """
+        Score passages against a query.
+
+        Only the postings of the query terms are visited, so the cost grows
+        with the number of matching passages rather than the index size.
+
+        Args:
+            query (str): Free-text query
+            limit (int): Maximum number of results
+            document_ids (iterable): Restrict results to these documents
+
+        Returns:
+            list: (chunk id, document id, score) tuples, best first
+        """
+        allowed = set(document_ids) if document_ids is not None else None
+        scores = defaultdict(float)
+        k1, b, avg_length = self.k1, self.b, self.avg_length or 1.0
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for position, frequency in postings:
+                if allowed is not None and self.document_ids[position] not in allowed:
+                    continue
+                norm = k1 * (1 - b + b * self.lengths[position] / avg_length)
+                scores[position] += idf * frequency * (k1 + 1) / (frequency + norm)
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [(self.chunk_ids[pos], self.document_ids[pos], score) for pos, score in best]
+
+
+def _index_path(user_id):
+    index_dir = getattr(settings, 'RETRIEVAL_INDEX_DIR', None)
+    if not index_dir:
+        return None
+    return os.path.join(index_dir, f'user_{user_id}.bm25')
+
+
+def _chunk_signature(user_id):
+    """Return a cheap version marker for a user's passages."""
+    stats = DocumentChunk.objects.filter(document__user_id=user_id).aggregate(
+        count=Count('id'), last=Max('id')
+    )
+    return (stats['count'], stats['last'])
+
+
+def get_user_index(user_id):
+    """
+    Return an up-to-date BM25 index of a user's passages.
+
+    Looks in the in-process cache first, then the persisted index file, and
+    only rebuilds from the database when the passages have changed.
+    """
+    signature = _chunk_signature(user_id)
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+    if index is not None and index.signature == signature:
+        return index
+
+    path = _index_path(user_id)
+    if path and os.path.isfile(path):
+        try:
+            with open(path, 'rb') as fh:
+                index = pickle.load(fh)
+        except Exception as e:
+            print(f"Error loading retrieval index {path}: {str(e)}")
+            index = None
+
+    if index is None or index.signature != signature:
+        rows = DocumentChunk.objects.filter(document__user_id=user_id).values_list(
+            'id', 'document_id', 'text'
+        ).iterator()
+        index = BM25Index().build(rows, signature=signature)
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as fh:
+                pickle.dump(index, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+
+    with _indexes_lock:
+        _indexes[user_id] = index
+    return index
+
+
+def retrieve_passages(user, documents, query, limit=None):
+    """
+    Return the passages of `documents` most relevant to `query`.
+
+    Args:
+        user (User): Owner of the documents
+        documents: Iterable of Document instances to search
+        query (str): Topic and keywords to match
+        limit (int): Maximum number of passages
+
+    Returns:
+        list: Dicts with document, position, text and score, best first
+    """
+    limit = limit or getattr(settings, 'RETRIEVAL_MAX_PASSAGES', 8)
+    documents = list(documents)
+    ensure_document_chunks(documents)
+
+    document_ids = [doc.id for doc in documents]
+    hits = get_user_index(user.id).search(query, limit=limit * 3, document_ids=document_ids)
+
+    similarity = _get_similarity()
+    if similarity is not None:
+        tfidf_hits = similarity.get_user_index(user.id).search(
+            [query], k=limit * 3, document_ids=document_ids
+        )[0]
+        hits = fuse_rankings([hits, tfidf_hits])
+    hits = hits[:limit]
+    chunks = DocumentChunk.objects.in_bulk([chunk_id for chunk_id, _, _ in hits])
+    by_id = {doc.id: doc for doc in documents}
+
+    passages = []
+    for chunk_id, document_id, score in hits:
+        chunk = chunks.get(chunk_id)
+        if chunk is not None:
+            passages.append({
+                'document': by_id[document_id],
+                'position': chunk.position,
+                'text': chunk.text,
+                'score': score,
+            })
+    return passages
+
+
+def fuse_rankings(rankings, k=60):
+    """
+    Merge several ranked hit lists with reciprocal rank fusion.
+
+    Args:
+        rankings (list): Lists of (chunk id, document id, score), best first
+        k (int): Damping constant; larger values flatten rank differences
+
+    Returns:
+        list: (chunk id, document id, fused score) tuples, best first
+    """
+    fused = defaultdict(float)
+    owners = {}
+    for hits in rankings:
+        for rank, (chunk_id, document_id, _) in enumerate(hits):
+            fused[chunk_id] += 1.0 / (k + rank + 1)
+            owners[chunk_id] = document_id
+    best = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return [(chunk_id, owners[chunk_id], score) for chunk_id, score in best]
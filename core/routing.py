@@ -0,0 +1,254 @@
+"""
+Per-stage model routing for LLM calls.
+
+Every call names its pipeline stage ('blog', 'stream', 'outline',
+'section', 'title', 'continuation'). LLM_ROUTES maps a stage to the model, max_tokens and
+temperature it should use, plus an optional latency budget and a faster
+fallback model:
+
+    LLM_ROUTES = {
+        'section': {'model': 'gpt-4-turbo-preview', 'max_tokens': 1500,
+                    'latency_budget': 45, 'fallback_model': 'gpt-4o-mini'},
+        'title': {'model': 'gpt-4o-mini', 'max_tokens': 100},
+    }
+
+Route values override the caller's parameters; stages without a route
+keep them. With a budget and a fallback, the primary model gets at most
+`latency_budget` seconds before the request is sent to the fallback model
+instead, and once the primary model's recent p95 latency for the stage is
+over budget, calls go straight to the fallback (every
+LLM_ROUTE_PROBE_INTERVAL-th call still tries the primary). After
+LLM_ROUTE_RECOVERY_PROBES consecutive probes within budget the primary's
+latency history is cleared, so the route recovers as soon as the model is
+fast again rather than after hundreds of fresh samples.
+
+Calls, fallbacks, time and token usage are counted per stage so routes
+can be tuned from /metrics/.
+"""
+import itertools
+import threading
+import time
+
+import httpx
+import openai
+from django.conf import settings
+
+from .accounting import record_llm_usage
+from .metrics import get_metrics, increment
+from .resilience import get_latency_tracker
+
+ROUTED_STAGES = ['blog', 'stream', 'outline', 'section', 'title', 'continuation']
+
+STAGE_METRIC_FIELDS = ['calls', 'fallbacks', 'seconds', 'prompt_tokens', 'completion_tokens']
+
+TIMEOUT_ERRORS = (openai.APITimeoutError, httpx.TimeoutException)
+
+_probe_counters = {}
+_probe_successes = {}
+_probe_lock = threading.Lock()
+
+
+def get_route_config(stage):
+    """Return the LLM_ROUTES entry of a stage, or an empty dict."""
+    return dict(getattr(settings, 'LLM_ROUTES', {}).get(stage) or {})
+
+
+def stage_metric_names(stage):
+    return [f'llm_stage_{stage}_{field}' for field in STAGE_METRIC_FIELDS]
+
+
+def _should_probe(stage):
+    interval = getattr(settings, 'LLM_ROUTE_PROBE_INTERVAL', 10)
+    with _probe_lock:
+        counter = _probe_counters.setdefault(stage, itertools.count(1))
+        return interval > 0 and next(counter) % interval == 0
+
+
+class Route:
+    """
+    The model choice for one call of a stage.
+
+    Attributes:
+        stage (str): Pipeline stage
+        params (dict): Completion parameters for the primary model
+        fallback_params (dict): Parameters for the fallback model, or None
+        budget (float): Seconds the primary model may take, or None
+        model (str): Model that answered (set once the call returns)
+        fell_back (bool): True if the fallback model answered
+    """
+
+    def __init__(self, stage, params):
+        config = get_route_config(stage)
+        self.stage = stage
+        self.params = dict(params)
+        for name in ('model', 'max_tokens', 'temperature'):
+            if config.get(name) is not None:
+                self.params[name] = config[name]
+        self.budget = config.get('latency_budget')
+        self.fallback_params = None
+        if config.get('fallback_model') and config['fallback_model'] != self.params.get('model'):
+            self.fallback_params = dict(self.params, model=config['fallback_model'])
+        self.model = self.params.get('model')
+        self.fell_back = False
+        self.probing = False
+        self.skip_primary = self._predict_over_budget()
+
+    def _tracker(self):
+        return get_latency_tracker(f"{self.stage}:{self.params.get('model')}")
+
+    def _predict_over_budget(self):
+        """True if the primary model's recent p95 is over budget (and no probe is due)."""
+        if not self.budget or self.fallback_params is None:
+            return False
+        p95 = self._tracker().percentile(95)
+        if p95 is None or p95 <= self.budget:
+            return False
+        if _should_probe(self.stage):
+            self.probing = True
+            return False
+        return True
+
+    def _record_probe(self, seconds):
+        """Clear the primary's history after enough consecutive probes within budget."""
+        if not self.probing:
+            return
+        needed = getattr(settings, 'LLM_ROUTE_RECOVERY_PROBES', 3)
+        key = f"{self.stage}:{self.params.get('model')}"
+        with _probe_lock:
+            if seconds > self.budget:
+                _probe_successes[key] = 0
+                return
+            _probe_successes[key] = _probe_successes.get(key, 0) + 1
+            recovered = _probe_successes[key] >= needed
+            if recovered:
+                _probe_successes[key] = 0
+        if recovered:
+            print(f"LLM {self.stage}: {self.params.get('model')} is back within its {self.budget}s budget")
+            self._tracker().clear()
+
+    def _record_primary(self, seconds):
+        self._tracker().record(seconds)
+        self._record_probe(seconds)
+
+    def _use_fallback(self):
+        self.fell_back = True
+        self.model = self.fallback_params['model']
+        return self.fallback_params
+
+    def _budgeted(self, timeout):
+        """Return the primary model's timeout, or None to skip the budget split."""
+        if self.fallback_params is None or not self.budget or self.budget >= timeout:
+            return None
+        return self.budget
+
+    def call(self, create, timeout):
+        """
+        Run one attempt, switching to the fallback model if the primary is over budget.
+
+        Args:
+            create: Function taking (params, timeout) that sends the request
+            timeout (float): Seconds left for the attempt
+
+        Returns:
+            The response
+        """
+        if self.skip_primary:
+            return create(self._use_fallback(), timeout)
+        budget = self._budgeted(timeout)
+        started = time.monotonic()
+        try:
+            response = create(self.params, budget or timeout)
+        except TIMEOUT_ERRORS:
+            if budget is None:
+                raise
+            # At least the budget; recorded so the p95 reflects the slowdown
+            self._record_primary(time.monotonic() - started)
+            print(f"LLM {self.stage}: {self.params.get('model')} exceeded its {budget}s budget, "
+                  f"falling back to {self.fallback_params['model']}")
+            return create(self._use_fallback(), timeout - (time.monotonic() - started))
+        self._record_primary(time.monotonic() - started)
+        return response
+
+    async def acall(self, create, timeout):
+        """Async version of call(); `create` is a coroutine function."""
+        if self.skip_primary:
+            return await create(self._use_fallback(), timeout)
+        budget = self._budgeted(timeout)
+        started = time.monotonic()
+        try:
+            response = await create(self.params, budget or timeout)
+        except TIMEOUT_ERRORS:
+            if budget is None:
+                raise
+            # At least the budget; recorded so the p95 reflects the slowdown
+            self._record_primary(time.monotonic() - started)
+            print(f"LLM {self.stage}: {self.params.get('model')} exceeded its {budget}s budget, "
+                  f"falling back to {self.fallback_params['model']}")
+            return await create(self._use_fallback(), timeout - (time.monotonic() - started))
+        self._record_primary(time.monotonic() - started)
+        return response
+
+    def record(self, seconds, usage=None):
+        """
+        Count the finished call in the stage's metrics and in the active
+        generation's accounting (core.accounting).
+
+        Must run in synchronous code (the counters live in the cache).
+
+        Args:
+            seconds (float): Wall-clock time of the call, retries included
+            usage: The response's usage object, or None for streams
+        """
+        increment(f'llm_stage_{self.stage}_calls')
+        increment(f'llm_stage_{self.stage}_seconds', seconds)
+        if self.fell_back:
+            increment(f'llm_stage_{self.stage}_fallbacks')
+        prompt_tokens = getattr(usage, 'prompt_tokens', 0) or 0
+        completion_tokens = getattr(usage, 'completion_tokens', 0) or 0
+        if usage is not None:
+            increment(f'llm_stage_{self.stage}_prompt_tokens', prompt_tokens)
+            increment(f'llm_stage_{self.stage}_completion_tokens', completion_tokens)
+        record_llm_usage(self.model, prompt_tokens, completion_tokens)
+
+
+def reset_routing_state():
+    """Forget the probe counters, e.g. between tests."""
+    with _probe_lock:
+        _probe_counters.clear()
+        _probe_successes.clear()
+
+
+def routing_metric_names():
+    stages = list(dict.fromkeys(ROUTED_STAGES + list(getattr(settings, 'LLM_ROUTES', {}))))
+    return [name for stage in stages for name in stage_metric_names(stage)]
+
+
+def routing_stats():
+    """
+    Return the route and usage of every stage.
+
+    Returns:
+        dict: stage -> configured model, fallback and budget, plus calls,
+        fallbacks, average seconds, token totals and the primary model's p95
+    """
+    stages = list(dict.fromkeys(ROUTED_STAGES + list(getattr(settings, 'LLM_ROUTES', {}))))
+    counters = get_metrics(routing_metric_names())
+    stats = {}
+    for stage in stages:
+        config = get_route_config(stage)
+        values = {field: counters[f'llm_stage_{stage}_{field}'] for field in STAGE_METRIC_FIELDS}
+        calls = values['calls']
+        stats[stage] = {
+            'model': config.get('model'),
+            'fallback_model': config.get('fallback_model'),
+            'latency_budget': config.get('latency_budget'),
+            'calls': calls,
+            'fallbacks': values['fallbacks'],
+            'average_seconds': values['seconds'] / calls if calls else 0.0,
+            'prompt_tokens': values['prompt_tokens'],
+            'completion_tokens': values['completion_tokens'],
+            'primary_p95_seconds': (
+                get_latency_tracker(f"{stage}:{config['model']}").percentile(95) if config.get('model') else None
+            ),
+        }
+    return stats
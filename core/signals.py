@@ -0,0 +1,32 @@
+"""
+Model signal handlers.
+
+Clean-up that must happen however a document is deleted lives here rather
+than in Document.delete(): queryset deletes, including the cascade from
+deleting a user, never call the instance method.
+"""
+import os
+
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Document
+
+
+@receiver(post_delete, sender=Document)
+def release_document_storage(sender, instance, **kwargs):
+    """
+    Drop a deleted document from the indexes and release its stored file.
+
+    Shared blobs are only removed when the last document lets go; files of
+    documents stored before deduplication are removed directly.
+    """
+    # Imported here because core.retrieval depends on the models
+    from .retrieval import remove_document_from_indexes
+
+    remove_document_from_indexes(instance)
+    if instance.blob_id is not None:
+        instance.blob.release()
+    elif instance.file:
+        if os.path.isfile(instance.file.path):
+            os.remove(instance.file.path)
@@ -0,0 +1,332 @@
+"""
+Vectorized TF-IDF similarity search over document passages.
+
+Passages are hashed into a fixed-width sparse term space (no vocabulary to
+maintain, no network models), so a user's index can grow and shrink one
+document at a time. Queries are answered with a single sparse matrix
+product instead of a Python loop over passages.
+
+Indexes are copy-on-write: readers get the cached TfidfIndex object, and
+writers update a copy that replaces it once saved, so a query running in
+another thread never sees a half-updated index. Every ingested or deleted
+document re-pickles its owner's whole index, which is cheap for the few
+thousand passages a user typically has but grows with the library.
+"""
+import os
+import pickle
+import threading
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+from scipy import sparse
+
+from django.conf import settings
+
+from .retrieval import tokenize
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def hash_terms(texts, n_features):
+    """
+    Turn texts into a sparse matrix of hashed term counts.
+
+    Args:
+        texts (list): Strings to vectorize
+        n_features (int): Width of the hashed term space
+
+    Returns:
+        scipy.sparse.csr_matrix: (len(texts), n_features) term counts
+    """
+    indptr = [0]
+    indices = []
+    for text in texts:
+        for term in tokenize(text):
+            indices.append(zlib.crc32(term.encode('utf-8')) % n_features)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    matrix = sparse.csr_matrix(
+        (data, np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+        shape=(len(texts), n_features)
+    )
+    matrix.sum_duplicates()
+    return matrix
+
+
+def _l2_normalize(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ matrix
+
+
+class TfidfIndex:
+    """
+    Incrementally updatable TF-IDF index of passages.
+
+    Attributes:
+        n_features (int): Width of the hashed term space
+        counts (csr_matrix): Raw hashed term counts, one row per passage
+        chunk_ids (ndarray): Passage primary key of each row
+        document_ids (ndarray): Owning document of each row
+        alive (ndarray): False for rows whose document was removed
+        df (ndarray): Number of live passages containing each hashed term
+    """
+
+    def __init__(self, n_features=2 ** 18):
+        self.n_features = n_features
+        self.counts = sparse.csr_matrix((0, n_features), dtype=np.float32)
+        self.chunk_ids = np.zeros(0, dtype=np.int64)
+        self.document_ids = np.zeros(0, dtype=np.int64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self._weighted = None
+
+    def __len__(self):
+        return int(self.alive.sum())
+
+    def copy(self):
+        """
+        Return an index that can be updated without affecting this one.
+
+        The passage matrix and id arrays are replaced rather than modified
+        by add() and _compact(), so they are shared; the arrays updated in
+        place are copied.
+        """
+        clone = TfidfIndex.__new__(TfidfIndex)
+        clone.__dict__.update(self.__dict__)
+        clone.alive = self.alive.copy()
+        clone.df = self.df.copy()
+        return clone
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_weighted'] = None
+        return state
+
+    def add(self, chunk_ids, document_ids, texts):
+        """
+        Add passages to the index.
+
+        Args:
+            chunk_ids (list): Passage primary keys
+            document_ids (list): Owning document of each passage
+            texts (list): Passage texts
+        """
+        if not texts:
+            return
+        counts = hash_terms(texts, self.n_features)
+        self.counts = sparse.vstack([self.counts, counts], format='csr')
+        self.chunk_ids = np.concatenate([self.chunk_ids, np.asarray(chunk_ids, dtype=np.int64)])
+        self.document_ids = np.concatenate([self.document_ids, np.asarray(document_ids, dtype=np.int64)])
+        self.alive = np.concatenate([self.alive, np.ones(len(texts), dtype=bool)])
+        self.df += np.bincount(counts.indices, minlength=self.n_features)
+        self._weighted = None
+
+    def remove_documents(self, document_ids):
+        """
+        Remove every passage of the given documents.
+
+        Rows are tombstoned and the matrix is compacted once a quarter of
+        it is dead, so removals stay cheap.
+
+        Returns:
+            int: Number of passages removed
+        """
+        mask = self.alive & np.isin(self.document_ids, list(document_ids))
+        removed = int(mask.sum())
+        if not removed:
+            return 0
+
+        dead = self.counts[np.flatnonzero(mask)]
+        self.df -= np.bincount(dead.indices, minlength=self.n_features)
+        self.alive[mask] = False
+        if (~self.alive).sum() > len(self.alive) / 4:
+            self._compact()
+        self._weighted = None
+        return removed
+
+    def _compact(self):
+        keep = np.flatnonzero(self.alive)
+        self.counts = self.counts[keep]
+        self.chunk_ids = self.chunk_ids[keep]
+        self.document_ids = self.document_ids[keep]
+        self.alive = self.alive[keep]
+
+    def _idf(self):
+        n = max(len(self), 1)
+        return (np.log((1 + n) / (1 + self.df)) + 1).astype(np.float32)
+
+    def _weighted_matrix(self):
+        """Return the L2-normalized TF-IDF matrix, recomputing it only after changes."""
+        if self._weighted is None:
+            tf = self.counts.copy()
+            tf.data = 1 + np.log(tf.data)  # Sublinear term frequency
+            self._weighted = _l2_normalize(tf @ sparse.diags(self._idf())).tocsr()
+        return self._weighted
+
+    def search(self, queries, k=10, document_ids=None):
+        """
+        Return the top-k passages for each query.
+
+        Args:
+            queries (list): Query strings, scored in one batch
+            k (int): Results per query
+            document_ids (iterable): Restrict results to these documents
+
+        Returns:
+            list: One list of (chunk id, document id, score) per query, best first
+        """
+        if not len(self) or not queries:
+            return [[] for _ in queries]
+
+        query_counts = hash_terms(queries, self.n_features)
+        query_counts.data = 1 + np.log(query_counts.data)
+        query_vectors = _l2_normalize(query_counts @ sparse.diags(self._idf()))
+        scores = (query_vectors @ self._weighted_matrix().T).toarray()
+
+        allowed = self.alive.copy()
+        if document_ids is not None:
+            allowed &= np.isin(self.document_ids, list(document_ids))
+        scores[:, ~allowed] = 0.0
+
+        results = []
+        for row in scores:
+            top = np.argpartition(-row, min(k, len(row) - 1))[:k]
+            top = top[np.argsort(-row[top])]
+            results.append([
+                (int(self.chunk_ids[i]), int(self.document_ids[i]), float(row[i]))
+                for i in top if row[i] > 0
+            ])
+        return results
+
+
+def _index_path(user_id):
+    index_dir = getattr(settings, 'RETRIEVAL_INDEX_DIR', None)
+    if not index_dir:
+        return None
+    return os.path.join(index_dir, f'user_{user_id}.tfidf')
+
+
+def _file_version(path):
+    """Return a marker that changes whenever the index file is rewritten."""
+    if not path or not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+@contextmanager
+def _locked(path, shared=False):
+    """Serialize read-modify-write of an index file across processes; readers share the lock."""
+    if path is None or fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f'{path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _cached(user_id, mtime):
+    """Return the cached index if it matches the file version, else None."""
+    with _indexes_lock:
+        cached = _indexes.get(user_id)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    return None
+
+
+def _load(user_id, path):
+    """Return the user's index, reloading from disk if another process changed it."""
+    mtime = _file_version(path)
+    cached = _cached(user_id, mtime)
+    if cached is not None:
+        return cached
+
+    index = None
+    if mtime is not None:
+        try:
+            with open(path, 'rb') as fh:
+                index = pickle.load(fh)
+        except Exception as e:
+            print(f"Error loading similarity index {path}: {str(e)}")
+    if index is None:
+        index = _build_from_database(user_id)
+        _save(user_id, index, path)
+    else:
+        with _indexes_lock:
+            _indexes[user_id] = (mtime, index)
+    return index
+
+
+def _save(user_id, index, path):
+    mtime = None
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as fh:
+            pickle.dump(index, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        mtime = _file_version(path)
+    with _indexes_lock:
+        _indexes[user_id] = (mtime, index)
+
+
+def _build_from_database(user_id):
+    from .models import DocumentChunk
+
+    index = TfidfIndex(getattr(settings, 'SIMILARITY_HASH_FEATURES', 2 ** 18))
+    rows = list(DocumentChunk.objects.filter(document__user_id=user_id).values_list(
+        'id', 'document_id', 'text'
+    ))
+    if rows:
+        chunk_ids, document_ids, texts = zip(*rows)
+        index.add(chunk_ids, document_ids, texts)
+    return index
+
+
+def get_user_index(user_id):
+    """
+    Return the TF-IDF index of a user's passages.
+
+    The index must not be modified; writers update a copy.
+    """
+    path = _index_path(user_id)
+    if path is not None:
+        cached = _cached(user_id, _file_version(path))
+        if cached is not None:
+            return cached
+    with _locked(path, shared=True):
+        return _load(user_id, path)
+
+
+def index_document(document):
+    """Replace a document's passages in its owner's index with the stored chunks."""
+    path = _index_path(document.user_id)
+    with _locked(path):
+        index = _load(document.user_id, path).copy()
+        index.remove_documents([document.id])
+        rows = list(document.chunks.values_list('id', 'text'))
+        if rows:
+            chunk_ids, texts = zip(*rows)
+            index.add(chunk_ids, [document.id] * len(rows), texts)
+        _save(document.user_id, index, path)
+
+
+def unindex_document(document):
+    """Remove a deleted document's passages from its owner's index."""
+    path = _index_path(document.user_id)
+    with _locked(path):
+        index = _load(document.user_id, path).copy()
+        if index.remove_documents([document.id]):
+            _save(document.user_id, index, path)
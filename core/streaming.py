@@ -0,0 +1,144 @@
+"""
+Helpers for streaming generation output to the browser.
+
+The model streams its JSON answer a few characters at a time. The
+incremental parser below scans only the new characters of each delta and
+reports every top-level field (and every member of an object-valued field,
+such as the H2_n sections of the outline and draft) as soon as its value is
+complete, so the page can render the title and finished sections long
+before the whole document has arrived.
+"""
+import json
+
+WHITESPACE = ' \t\r\n'
+
+
+class _Container:
+    __slots__ = ('kind', 'key', 'index', 'value_start', 'expect_key')
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.key = None
+        self.index = 0
+        self.value_start = None
+        self.expect_key = kind == '{'
+
+    @property
+    def member(self):
+        return self.key if self.kind == '{' else self.index
+
+
+class IncrementalJSONParser:
+    """
+    Streaming scanner that reports JSON values as they complete.
+
+    Attributes:
+        max_depth (int): Deepest path reported; 1 reports top-level fields,
+            2 also reports the members of object or array fields
+        text (str): Everything fed so far
+    """
+
+    def __init__(self, max_depth=2):
+        self.max_depth = max_depth
+        self.text = ''
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self.complete = False
+
+    def feed(self, chunk):
+        """
+        Consume the next piece of the document.
+
+        Args:
+            chunk (str): Newly received text
+
+        Returns:
+            list: (path tuple, value) pairs completed by this chunk
+        """
+        self.text += chunk
+        completed = []
+        text = self.text
+        stack = self._stack
+
+        for pos in range(self._pos, len(text)):
+            char = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    top = stack[-1] if stack else None
+                    if top is not None and top.expect_key:
+                        top.key = json.loads(text[self._string_start:pos + 1])
+                        top.expect_key = False
+                    elif top is not None and top.value_start == self._string_start:
+                        self._finish_value(pos + 1, completed)
+                continue
+
+            if not stack and (self.complete or char not in '{['):
+                # Prose or a code fence around the document; this also keeps
+                # stray commas and closing brackets off an empty stack
+                continue
+            if char in WHITESPACE or char == ':':
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+                if stack and not stack[-1].expect_key and stack[-1].value_start is None:
+                    stack[-1].value_start = pos
+            elif char in '{[':
+                if stack and stack[-1].value_start is None:
+                    stack[-1].value_start = pos
+                stack.append(_Container(char))
+            elif char in '}]':
+                if stack and stack[-1].value_start is not None:
+                    # Pending number or literal ends with its container
+                    self._finish_value(pos, completed)
+                stack.pop()
+                if stack:
+                    self._finish_value(pos + 1, completed)
+                else:
+                    self.complete = True
+            elif char == ',':
+                top = stack[-1]
+                if top.value_start is not None:
+                    self._finish_value(pos, completed)
+                top.index += 1
+                top.key = None
+                top.expect_key = top.kind == '{'
+            elif stack and stack[-1].value_start is None:
+                # Start of a number, true, false or null
+                stack[-1].value_start = pos
+
+        self._pos = len(text)
+        return completed
+
+    def _finish_value(self, end, completed):
+        top = self._stack[-1]
+        start, top.value_start = top.value_start, None
+        if len(self._stack) > self.max_depth:
+            return
+        path = tuple(container.member for container in self._stack)
+        try:
+            completed.append((path, json.loads(self.text[start:end])))
+        except json.JSONDecodeError:
+            pass
+
+
+def sse_event(event, data):
+    """
+    Format one server-sent event.
+
+    Args:
+        event (str): Event name
+        data: JSON-serializable payload
+
+    Returns:
+        bytes: The encoded event, including the blank line terminator
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
@@ -0,0 +1,178 @@
+"""
+Hierarchical extractive summaries of document text.
+
+Summaries are built once at ingestion with a map-reduce pass: the text is
+split into sections, each section is reduced to its most representative
+sentences, and the section summaries are rolled up level by level into a
+single document summary. The result is stored on the Document so
+generation can describe every selected document in a bounded number of
+tokens, however large the source file is.
+"""
+import re
+from collections import Counter
+
+from django.conf import settings
+
+from .context import count_tokens, truncate_to_tokens
+from .retrieval import split_into_chunks, tokenize
+
+# Bump when the algorithm changes so stored summaries are rebuilt
+SUMMARY_VERSION = 1
+
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9"\'(])|\n+')
+
+
+def split_sentences(text):
+    """
+    Split text into sentences on terminal punctuation and line breaks.
+
+    Returns:
+        list: Non-empty sentence strings
+    """
+    return [s.strip() for s in SENTENCE_PATTERN.split(text) if len(s.strip().split()) >= 3]
+
+
+def summarize_section(text, max_sentences=3):
+    """
+    Pick the sentences that best represent a section.
+
+    Sentences are scored by how frequent their terms are within the section
+    (Luhn-style), normalized by length so long sentences are not favoured,
+    and returned in their original order.
+
+    Args:
+        text (str): Section text
+        max_sentences (int): Maximum number of sentences to keep
+
+    Returns:
+        str: The selected sentences
+    """
+    sentences = split_sentences(text)
+    if len(sentences) <= max_sentences:
+        return ' '.join(sentences)
+
+    sentence_terms = [tokenize(sentence) for sentence in sentences]
+    frequencies = Counter(term for terms in sentence_terms for term in set(terms))
+
+    scored = []
+    seen = set()
+    for position, terms in enumerate(sentence_terms):
+        key = frozenset(terms)
+        if not terms or key in seen:
+            continue
+        seen.add(key)
+        score = sum(frequencies[term] for term in set(terms)) / len(terms) ** 0.5
+        scored.append((score, position))
+
+    best = sorted(scored, reverse=True)[:max_sentences]
+    return ' '.join(sentences[position] for _, position in sorted(best, key=lambda item: item[1]))
+
+
+def build_document_summary(text):
+    """
+    Summarize a document with a map-reduce pass over its sections.
+
+    Args:
+        text (str): Extracted document text
+
+    Returns:
+        dict: 'sections' (list of section summaries) and 'summary' (str)
+    """
+    section_words = getattr(settings, 'SUMMARY_SECTION_WORDS', 800)
+    sentences_per_section = getattr(settings, 'SUMMARY_SECTION_SENTENCES', 3)
+    fanout = getattr(settings, 'SUMMARY_FANOUT', 8)
+    max_tokens = getattr(settings, 'SUMMARY_MAX_TOKENS', 400)
+
+    # Map: one summary per section
+    sections = [
+        summarize_section(section, sentences_per_section)
+        for section in split_into_chunks(text, section_words)
+    ]
+    sections = [section for section in sections if section]
+
+    # Reduce: roll groups of summaries up until the result fits the budget
+    level = sections
+    while len(level) > 1 and count_tokens(' '.join(level)) > max_tokens:
+        level = [
+            summarize_section(' '.join(level[i:i + fanout]), sentences_per_section)
+            for i in range(0, len(level), fanout)
+        ]
+    summary = truncate_to_tokens(' '.join(level), max_tokens)
+
+    return {'sections': sections, 'summary': summary}
+
+
+def summary_key(document):
+    """
+    Return the cache key a document's summary must carry to be current.
+
+    The key embeds the document's content hash (the file's SHA-256 for
+    blob-backed documents), so a changed file always invalidates the summary.
+    """
+    return f'v{SUMMARY_VERSION}:{document.get_content_hash()}'
+
+
+def summary_is_current(document):
+    """Return True if the stored summary matches the document's current content."""
+    if not document.summary_key:
+        return False
+    if document.blob_id is None:
+        # Only compare the prefix to avoid hashing the full text on every request;
+        # process_document rebuilds the summary whenever the text is rewritten
+        return document.summary_key.startswith(f'v{SUMMARY_VERSION}:')
+    return document.summary_key == summary_key(document)
+
+
+def update_document_summary(document):
+    """
+    Build and store the summary of a completed document.
+
+    Reuses the summary of another document sharing the same blob when one
+    exists, and clears the summary of documents without usable text.
+
+    Returns:
+        str: The stored document summary
+    """
+    # Imported here because core.models is loaded before this module is needed
+    from .models import Document
+
+    if document.status != 'completed' or not document.processed_content:
+        document.summary = ''
+        document.section_summaries = []
+        document.summary_key = ''
+    else:
+        key = summary_key(document)
+        shared = None
+        if document.blob_id is not None:
+            shared = Document.objects.filter(blob_id=document.blob_id, summary_key=key).exclude(
+                pk=document.pk
+            ).only('summary', 'section_summaries').first()
+        if shared is not None:
+            document.summary = shared.summary
+            document.section_summaries = shared.section_summaries
+        else:
+            result = build_document_summary(document.processed_content)
+            document.summary = result['summary']
+            document.section_summaries = result['sections']
+        document.summary_key = key
+
+    Document.objects.filter(pk=document.pk).update(
+        summary=document.summary,
+        section_summaries=document.section_summaries,
+        summary_key=document.summary_key,
+    )
+    return document.summary
+
+
+def get_document_summary(document):
+    """
+    Return a document's cached summary, rebuilding it only if it is stale.
+
+    Returns:
+        str: Document summary, or an empty string if the document has no text
+    """
+    if document.status != 'completed':
+        return ''
+    if not summary_is_current(document):
+        update_document_summary(document)
+    return document.summary
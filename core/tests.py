@@ -4,13 +4,66 @@ from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
 from django.db import transaction
 from django.conf import settings
-from .models import Blog, Document
+from django.test import override_settings
+from .models import (
+    Blog, BulkGenerationRow, Document, DocumentBlob, GenerationDailyUsage, GenerationRecord, Job
+)
 from unittest.mock import patch, MagicMock
+import asyncio
 import json
 import os
 import concurrent.futures
 import time
+from datetime import timedelta
 from django.core.cache import cache
+import tempfile
+import shutil
+from .utils import process_document, get_document_content, decode_text_stream, extract_text_from_file
+import io
+import zipfile
+from .jobs import (
+    enqueue_document_ingestion, run_job, claim_jobs, queue_stats, requeue_stale_jobs, send_heartbeats,
+    QUEUE_METRICS
+)
+from . import pdf_extraction
+from .pdf_extraction import extract_page_range, extract_pdf_pages_parallel, extraction_workers, split_page_ranges
+from .management.commands.benchmark_pdf_extraction import build_synthetic_pdf
+from . import retrieval
+from .retrieval import BM25Index, split_into_chunks, retrieve_passages
+from . import similarity
+from .similarity import TfidfIndex
+from .context import count_tokens, default_token_model, pack_context, truncate_to_tokens
+from .summaries import build_document_summary, get_document_summary, summarize_section
+from .utils import select_documents_context, generate_blog_content
+from . import llm
+from .fake_llm import FakeLLMServer, fake_completion_content, parse_latency
+from .accounting import track_generation
+from . import grammar
+from .grammar import GRAMMAR_METRICS, GrammarToolPool, GrammarUnavailable
+from .routing import reset_routing_state, routing_metric_names, routing_stats
+from .loadtest import LoadStats, percentile
+from .streaming import IncrementalJSONParser
+from .pipeline import draft_sections, outline_sections, target_word_count
+from .generation_cache import CACHE_METRICS, cache_stats, generation_fingerprint
+from .metrics import get_metrics, reset_metrics
+from . import rate_limit
+from .rate_limit import RATE_LIMIT_METRICS, RateLimitTimeout, rate_limit_stats
+from . import resilience
+from .resilience import (
+    CircuitBreaker, ProviderUnavailable, RESILIENCE_METRICS, backoff_delay, call_with_resilience,
+    reset_resilience_state
+)
+from django.utils import timezone
+from django.core.management import call_command
+import threading
+from .bulk import create_bulk_generation, parse_topic_csv, run_bulk_generation
+from django.core.cache import caches
+import random
+from types import SimpleNamespace
+import openai
+from docx import Document as DocxDocument
+from .utils import BLOG_COMPLETION_PARAMS, REPAIR_METRICS, parse_blog_response
+from .json_repair import JSONRepairError, merge_continuation, repair_json
 
 # Create your tests here.
 
@@ -128,6 +181,2204 @@ class DocumentTests(TestCase):
         # Verify file is cleaned up
         self.assertFalse(os.path.exists(file_path))
 
+class DocumentTestCase(TestCase):
+    """
+    Shared fixture for tests that store documents.
+
+    Every test gets an isolated media root and retrieval index directory,
+    empty in-process indexes and a logged-in `testuser`. Subclasses add
+    settings via `settings_overrides` or get_settings_overrides().
+    """
+    settings_overrides = {}
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        overrides = self.fixture_settings()
+        overrides.update(self.get_settings_overrides())
+        self.settings_override = override_settings(**overrides)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self._clear_indexes()
+        self.addCleanup(self._clear_indexes)
+
+        self.client = Client()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+
+    def fixture_settings(self):
+        """Return the settings the fixture itself needs."""
+        return {
+            'MEDIA_ROOT': self.media_root,
+            'RETRIEVAL_INDEX_DIR': os.path.join(self.media_root, 'indexes'),
+        }
+
+    def get_settings_overrides(self):
+        return dict(self.settings_overrides)
+
+    def _clear_indexes(self):
+        retrieval._indexes.clear()
+        similarity._indexes.clear()
+
+
+class DocumentIngestionTests(DocumentTestCase):
+    """Tests for one-time text extraction at upload"""
+    def _create_document(self, content, name='notes.txt'):
+        return Document.objects.create(
+            user=self.user,
+            title='Product Sheet',
+            file=SimpleUploadedFile(name, content, content_type='text/plain')
+        )
+
+    def test_process_document_stores_content(self):
+        """Test extracted text and word count are stored on the document"""
+        doc = self._create_document(b"Fast solar panels for homes")
+        self.assertTrue(process_document(doc))
+        doc.refresh_from_db()
+        self.assertEqual(doc.status, 'completed')
+        self.assertEqual(doc.processed_content, 'Fast solar panels for homes')
+        self.assertEqual(doc.word_count, 5)
+
+    def test_process_document_marks_failure(self):
+        """Test documents without readable text are marked as failed"""
+        doc = self._create_document(b"")
+        self.assertFalse(process_document(doc))
+        doc.refresh_from_db()
+        self.assertEqual(doc.status, 'failed')
+        self.assertEqual(get_document_content(doc), '')
+
+    def test_generation_reuses_stored_content(self):
+        """Test blog creation reads stored text instead of re-parsing files"""
+        doc = self._create_document(b"Fast solar panels for homes")
+        process_document(doc)
+        result = {
+            'blog_title': 'Solar', 'keywords': {'additional_keywords': []},
+            'blog_outline': '', 'blog_draft': ''
+        }
+        with patch('core.utils.extract_text_from_file') as mock_extract, \
+                patch('core.utils.generate_blog_content', return_value=result) as mock_generate, \
+                override_settings(JOB_QUEUE_ASYNC=False):
+            response = self.client.post(reverse('core:create_blog'), json.dumps({
+                'topic': 'Solar',
+                'user_keywords': 'solar',
+                'document_ids': json.dumps([doc.id])
+            }), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'done')
+        mock_extract.assert_not_called()
+        self.assertIn('Fast solar panels', mock_generate.call_args.kwargs['documents_content'])
+
+@override_settings(JOB_QUEUE_ASYNC=True)
+class JobQueueTests(DocumentTestCase):
+    """Tests for the database-backed background job queue"""
+    def setUp(self):
+        super().setUp()
+        self.document = Document.objects.create(
+            user=self.user,
+            title='Product Sheet',
+            file=SimpleUploadedFile('notes.txt', b'Fast solar panels', content_type='text/plain')
+        )
+
+    def test_ingestion_is_queued(self):
+        """Test ingestion is queued instead of running in the request"""
+        job = enqueue_document_ingestion(self.document)
+        self.assertEqual(job.status, 'queued')
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.status, 'pending')
+
+    def test_run_job_processes_document(self):
+        """Test a worker run completes the job and the document"""
+        job = enqueue_document_ingestion(self.document)
+        self.assertEqual(run_job(job.id), 'done')
+        job.refresh_from_db()
+        self.document.refresh_from_db()
+        self.assertEqual(job.result['word_count'], 3)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(self.document.status, 'completed')
+
+    def test_jobs_are_claimed_once(self):
+        """Test a queued job cannot be claimed twice"""
+        job = enqueue_document_ingestion(self.document)
+        self.assertEqual(claim_jobs(5), [job.id])
+        self.assertEqual(claim_jobs(5), [])
+        self.assertFalse(Job.objects.get(pk=job.id).claim())
+
+    def test_only_jobs_without_heartbeat_are_requeued(self):
+        """Test a long-running job keeps its claim while its dispatcher sends heartbeats"""
+        alive = enqueue_document_ingestion(self.document)
+        lost = Job.objects.create(user=self.user, kind='ingest_document', payload={'document_id': self.document.id})
+        claim_jobs(5)
+        long_ago = timezone.now() - timedelta(hours=2)
+        Job.objects.update(started_at=long_ago, heartbeat_at=long_ago)
+
+        send_heartbeats([alive.id])
+        self.assertEqual(requeue_stale_jobs(max_age=60), 1)
+        self.assertEqual(Job.objects.get(pk=alive.id).status, 'running')
+        lost.refresh_from_db()
+        self.assertEqual(lost.status, 'queued')
+        self.assertIsNone(lost.heartbeat_at)
+
+    def test_document_status_endpoint(self):
+        """Test the status endpoint only reports the user's documents"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        Document.objects.create(
+            user=other, title='Other',
+            file=SimpleUploadedFile('other.txt', b'x', content_type='text/plain')
+        )
+        response = self.client.get(reverse('core:document_status'))
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['documents'], [
+            {'id': self.document.id, 'status': 'pending', 'word_count': 0}
+        ])
+
+class PdfExtractionTests(TestCase):
+    """Tests for page-parallel PDF extraction"""
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'catalogue.pdf')
+        build_synthetic_pdf(self.path, 12, lines_per_page=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_split_page_ranges(self):
+        """Test page ranges cover every page once and in order"""
+        ranges = split_page_ranges(103, workers=4)
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], 103)
+        for (_, stop), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(stop, start)
+        self.assertEqual(split_page_ranges(0, workers=4), [])
+
+    def test_parallel_matches_serial(self):
+        """Test parallel extraction returns pages in the original order"""
+        serial = extract_page_range(self.path, 0, 12)
+        parallel = extract_pdf_pages_parallel(self.path, 12, workers=2, page_timeout=10)
+        self.assertEqual(parallel, serial)
+        self.assertIn('Page 1', parallel[0])
+        self.assertIn('Page 12', parallel[11])
+
+    def test_extraction_workers_share_cpus_with_job_workers(self):
+        """Test the extraction pool is capped at the job worker's CPU share"""
+        self.assertEqual(extraction_workers(4, job_workers=8, cpu_count=8), 1)
+        self.assertEqual(extraction_workers(4, job_workers=2, cpu_count=8), 4)
+        self.assertEqual(extraction_workers(4, job_workers=3, cpu_count=8), 2)
+        self.assertEqual(extraction_workers(4, job_workers=16, cpu_count=8), 1)
+
+    def test_deadline_covers_all_ranges_at_once(self):
+        """Test the backstop is one deadline for all ranges, not a sum per range"""
+        ranges = split_page_ranges(32, workers=2)
+        deadline = pdf_extraction._deadline_seconds(ranges, workers=2, page_timeout=1)
+        self.assertLessEqual(deadline, 16 + 5)
+        self.assertIsNone(pdf_extraction._deadline_seconds(ranges, workers=2, page_timeout=None))
+
+    def test_warm_up_starts_every_worker(self):
+        """Test warming the pool starts all its processes, not just the first"""
+        self.addCleanup(pdf_extraction._discard_executor)
+        self.assertEqual(pdf_extraction.warm_up_executor(2), 2)
+        self.assertEqual(len(pdf_extraction._executor._processes), 2)
+
+    def test_discarding_the_pool_terminates_stuck_workers(self):
+        """Test a stuck range's process is killed rather than left running"""
+        executor = pdf_extraction._get_executor(1)
+        executor.submit(time.sleep, 60)
+        time.sleep(0.5)
+        processes = list(executor._processes.values())
+        self.assertTrue(processes)
+        pdf_extraction._discard_executor()
+        for process in processes:
+            self.assertFalse(process.is_alive())
+        self.assertIsNone(pdf_extraction._executor)
+
+@override_settings(JOB_QUEUE_ASYNC=False)
+class DocumentDeduplicationTests(DocumentTestCase):
+    """Tests for content-addressed storage of uploaded documents"""
+    def _upload(self, title, content=b'Fast solar panels for homes'):
+        return self.client.post(reverse('core:upload_document'), {
+            'title': title,
+            'file': SimpleUploadedFile('brochure.txt', content, content_type='text/plain')
+        })
+
+    def test_identical_uploads_share_blob(self):
+        """Test identical uploads share one stored file and extraction"""
+        self._upload('Brochure')
+        with patch('core.utils.extract_text_from_file') as mock_extract:
+            self._upload('Brochure copy')
+        mock_extract.assert_not_called()
+
+        first, second = Document.objects.order_by('id')
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(second.status, 'completed')
+        self.assertEqual(second.processed_content, 'Fast solar panels for homes')
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 2)
+
+    def test_different_uploads_get_separate_blobs(self):
+        """Test different bytes are stored separately"""
+        self._upload('Brochure')
+        self._upload('Price list', b'Prices for solar panels')
+        self.assertEqual(DocumentBlob.objects.count(), 2)
+
+    def test_delete_keeps_shared_file(self):
+        """Test the file is only removed when the last document is deleted"""
+        self._upload('Brochure')
+        self._upload('Brochure copy')
+        first, second = Document.objects.order_by('id')
+        path = first.file.path
+
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 1)
+
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(DocumentBlob.objects.exists())
+
+    def test_deleting_user_releases_shared_file(self):
+        """Test cascade and queryset deletes release blobs and unindex documents"""
+        self._upload('Brochure')
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.login(username='other', password='testpass123')
+        self._upload('Same brochure')
+        path = Document.objects.first().file.path
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 2)
+
+        with patch('core.retrieval.remove_document_from_indexes') as mock_unindex:
+            self.user.delete()
+        self.assertEqual(mock_unindex.call_count, 1)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(DocumentBlob.objects.get().ref_count, 1)
+
+        Document.objects.filter(user=other).delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(DocumentBlob.objects.exists())
+
+class StreamingExtractionTests(TestCase):
+    """Tests for single-pass decoding and on-disk extraction"""
+    def test_decode_utf8_split_across_chunks(self):
+        """Test multi-byte characters split between chunks decode correctly"""
+        text = 'Café crème ' * 50
+        self.assertEqual(decode_text_stream(io.BytesIO(text.encode('utf-8')), chunk_size=7), text)
+
+    def test_decode_cp1252_fallback(self):
+        """Test bytes that are not UTF-8 fall back to Windows-1252"""
+        data = 'Price: 10€ – naïve'.encode('cp1252')
+        self.assertEqual(decode_text_stream(io.BytesIO(data)), 'Price: 10€ – naïve')
+
+    def test_decode_utf16_bom(self):
+        """Test a UTF-16 byte-order mark selects the codec"""
+        data = 'Solar panels'.encode('utf-16')
+        self.assertEqual(decode_text_stream(io.BytesIO(data), chunk_size=5), 'Solar panels')
+
+    @override_settings(DOCUMENT_MAX_EXTRACTED_CHARS=10)
+    def test_decode_respects_character_cap(self):
+        """Test decoding stops at the configured character cap"""
+        data = io.BytesIO(b'x' * 1000)
+        self.assertEqual(decode_text_stream(data, chunk_size=4), 'x' * 10)
+        self.assertLess(data.tell(), 1000)
+
+    def test_pdf_extracted_from_disk_without_full_read(self):
+        """Test stored PDFs are parsed from the file on disk"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=tmp_dir):
+            path = os.path.join(tmp_dir, 'catalogue.pdf')
+            build_synthetic_pdf(path, 3, lines_per_page=1)
+            user = User.objects.create_user(username='testuser', password='testpass123')
+            doc = Document(user=user, title='Catalogue')
+            doc.file.name = 'catalogue.pdf'
+            with patch.object(type(doc.file), 'read', side_effect=AssertionError('full read')):
+                text = extract_text_from_file(doc.file)
+        self.assertIn('Page 1', text)
+        self.assertIn('Page 3', text)
+
+@override_settings(JOB_QUEUE_ASYNC=True)
+class BulkUploadTests(DocumentTestCase):
+    """Tests for the multi-file and ZIP upload endpoint"""
+    def _pdf(self, name):
+        return SimpleUploadedFile(name, b'%PDF-1.4 test', content_type='application/pdf')
+
+    def _zip(self, entries):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, content in entries.items():
+                archive.writestr(name, content)
+        return SimpleUploadedFile('batch.zip', buffer.getvalue(), content_type='application/zip')
+
+    def test_multiple_files(self):
+        """Test several files are stored and queued in one request"""
+        response = self.client.post(reverse('core:bulk_upload_documents'), {
+            'files': [self._pdf('one.pdf'), self._pdf('two.pdf')]
+        })
+        self.assertEqual(response.status_code, 201)
+        data = json.loads(response.content)
+        self.assertEqual(data['uploaded'], 2)
+        self.assertEqual([r['status'] for r in data['results']], ['queued', 'queued'])
+        self.assertEqual(Job.objects.filter(kind='ingest_document').count(), 2)
+        self.assertEqual(set(Document.objects.values_list('title', flat=True)), {'one', 'two'})
+
+    def test_zip_archive(self):
+        """Test ZIP entries are validated and ingested individually"""
+        archive = self._zip({
+            'docs/brochure.pdf': b'%PDF-1.4 brochure',
+            'docs/notes.exe': b'not allowed',
+            '__MACOSX/._brochure.pdf': b'metadata',
+        })
+        response = self.client.post(reverse('core:bulk_upload_documents'), {'files': [archive]})
+        self.assertEqual(response.status_code, 201)
+        data = json.loads(response.content)
+        results = {r['name']: r for r in data['results']}
+        self.assertEqual(set(results), {'brochure.pdf', 'notes.exe'})
+        self.assertEqual(results['brochure.pdf']['status'], 'queued')
+        self.assertEqual(results['notes.exe']['status'], 'error')
+        self.assertEqual(Document.objects.get().title, 'brochure')
+
+    def test_encrypted_zip_entry_reported(self):
+        """Test an encrypted entry is reported as unreadable and the other entries are kept"""
+        archive = self._zip({'secret.pdf': b'%PDF-1.4 secret', 'brochure.pdf': b'%PDF-1.4 brochure'})
+        content = bytearray(archive.read())
+        # Set the "encrypted" flag on the first entry's central directory record
+        central = content.index(b'PK\x01\x02')
+        content[central + 8] |= 0x1
+        archive = SimpleUploadedFile('batch.zip', bytes(content), content_type='application/zip')
+        response = self.client.post(reverse('core:bulk_upload_documents'), {'files': [archive]})
+        self.assertEqual(response.status_code, 201)
+        results = {r['name']: r for r in json.loads(response.content)['results']}
+        self.assertEqual(results['secret.pdf']['status'], 'error')
+        self.assertIn('Could not read archive entry', results['secret.pdf']['errors'][0])
+        self.assertEqual(results['brochure.pdf']['status'], 'queued')
+        self.assertEqual(Document.objects.get().title, 'brochure')
+
+    @override_settings(MAX_UPLOAD_SIZE=10)
+    def test_zip_entry_size_enforced(self):
+        """Test oversized archive entries are rejected without being stored"""
+        archive = self._zip({'big.pdf': b'%PDF-1.4 ' + b'x' * 100})
+        response = self.client.post(reverse('core:bulk_upload_documents'), {'files': [archive]})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Document.objects.exists())
+
+@override_settings(JOB_QUEUE_ASYNC=False, RETRIEVAL_CHUNK_WORDS=20)
+class RetrievalTests(DocumentTestCase):
+    """Tests for BM25 passage retrieval"""
+    def setUp(self):
+        super().setUp()
+        self.document = self._ingest('Catalogue', (
+            "Our company history began in a small garage in 1998.\n\n"
+            "Monocrystalline solar panels reach 22 percent efficiency and carry a 25 year warranty.\n\n"
+            "Shipping is free for orders over fifty dollars."
+        ))
+
+    def _ingest(self, title, text):
+        document = Document.objects.create(
+            user=self.user, title=title,
+            file=SimpleUploadedFile(f'{title}.txt', text.encode('utf-8'), content_type='text/plain')
+        )
+        process_document(document)
+        return document
+
+    def test_split_into_chunks(self):
+        """Test paragraphs are packed and long paragraphs are split"""
+        chunks = split_into_chunks(' '.join(['word'] * 45), chunk_words=20)
+        self.assertEqual([len(c.split()) for c in chunks], [20, 20, 5])
+        self.assertEqual(split_into_chunks('one\n\ntwo', chunk_words=20), ['one\n\ntwo'])
+
+    def test_bm25_ranks_relevant_passage_first(self):
+        """Test the passage matching the query terms scores highest"""
+        index = BM25Index().build([
+            (1, 1, 'company history and founders'),
+            (2, 1, 'solar panels efficiency warranty solar'),
+            (3, 1, 'shipping and returns'),
+        ])
+        results = index.search('solar panel efficiency', limit=2)
+        self.assertEqual(results[0][0], 2)
+        self.assertEqual(len(results), 1)
+
+    def test_ingestion_creates_chunks(self):
+        """Test ingestion stores passages for the document"""
+        self.assertEqual(self.document.chunks.count(), 3)
+
+    def test_retrieve_passages(self):
+        """Test retrieval returns relevant passages from selected documents only"""
+        other = self._ingest('Other', 'Solar panels solar panels solar panels efficiency.')
+        passages = retrieve_passages(self.user, [self.document], 'solar panels efficiency')
+        self.assertEqual(len(passages), 1)
+        self.assertEqual(passages[0]['document'], self.document)
+        self.assertIn('Monocrystalline', passages[0]['text'])
+        self.assertNotIn(other, [p['document'] for p in passages])
+
+    def test_index_is_persisted_and_refreshed(self):
+        """Test the index is written to disk and rebuilt when chunks change"""
+        retrieve_passages(self.user, [self.document], 'solar')
+        path = os.path.join(self.media_root, 'indexes', f'user_{self.user.id}.bm25')
+        self.assertTrue(os.path.exists(path))
+
+        retrieval._indexes.clear()
+        with patch.object(BM25Index, 'build') as mock_build:
+            retrieve_passages(self.user, [self.document], 'solar')
+        mock_build.assert_not_called()
+
+        self._ingest('Warranty', 'Warranty claims are handled within five days.')
+        passages = retrieve_passages(self.user, list(Document.objects.all()), 'warranty claims')
+        self.assertEqual(passages[0]['document'].title, 'Warranty')
+
+class SimilarityIndexTests(TestCase):
+    """Tests for the incremental hashed TF-IDF index"""
+    def setUp(self):
+        self.index = TfidfIndex(n_features=2 ** 12)
+        self.index.add([1, 2], [10, 10], ['solar panel efficiency ratings', 'company history'])
+        self.index.add([3], [20], ['solar inverter warranty'])
+
+    def test_batched_queries(self):
+        """Test several queries are answered in one call"""
+        results = self.index.search(['panel efficiency', 'history of the company'], k=2)
+        self.assertEqual(results[0][0][0], 1)
+        self.assertEqual(results[1][0][0], 2)
+
+    def test_document_filter(self):
+        """Test results can be restricted to selected documents"""
+        results = self.index.search(['solar'], k=5, document_ids=[20])[0]
+        self.assertEqual([hit[0] for hit in results], [3])
+
+    def test_remove_documents(self):
+        """Test removed documents no longer match and frequencies are updated"""
+        self.assertEqual(self.index.remove_documents([10]), 2)
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.index.search(['efficiency'], k=5)[0], [])
+        self.assertEqual(self.index.df.sum(), 3)
+
+    def test_copy_is_independent(self):
+        """Test updating a copy leaves the original index intact"""
+        clone = self.index.copy()
+        clone.remove_documents([10])
+        clone.add([4], [30], ['battery storage'])
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.df.sum(), 9)
+        self.assertEqual(self.index.search(['efficiency'], k=5)[0][0][0], 1)
+        self.assertEqual(len(clone), 2)
+
+    @override_settings(JOB_QUEUE_ASYNC=False)
+    def test_ingestion_and_delete_update_user_index(self):
+        """Test ingestion adds passages and Document.delete removes them"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        similarity._indexes.clear()
+        with override_settings(MEDIA_ROOT=tmp_dir, RETRIEVAL_INDEX_DIR=tmp_dir):
+            user = User.objects.create_user(username='testuser', password='testpass123')
+            document = Document.create_from_upload(
+                user, 'Sheet',
+                SimpleUploadedFile('sheet.txt', b'Solar inverter warranty terms', content_type='text/plain')
+            )
+            process_document(document)
+            index = similarity.get_user_index(user.id)
+            self.assertEqual(len(index), 1)
+
+            document.delete()
+            # Writers swap in an updated copy; the index already handed out is unchanged
+            self.assertEqual(len(index), 1)
+            self.assertEqual(len(similarity.get_user_index(user.id)), 0)
+            similarity._indexes.clear()
+            self.assertEqual(len(similarity.get_user_index(user.id)), 0)
+
+class ContextPackingTests(TestCase):
+    """Tests for the token-budgeted context packer"""
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.big = Document(id=1, user=self.user, title='Big catalogue')
+        self.small = Document(id=2, user=self.user, title='Spec sheet')
+
+    def _passage(self, document, position, score, words=20):
+        return {
+            'document': document, 'position': position, 'score': score,
+            'text': ' '.join(['panel'] * words),
+        }
+
+    def test_token_model_follows_routes(self):
+        """Test budgets are counted for the routed blog model, else the primary model"""
+        with override_settings(LLM_ROUTES={'blog': {'model': 'gpt-4o'}}, LLM_PRIMARY_MODEL='gpt-4'):
+            self.assertEqual(default_token_model(), 'gpt-4o')
+        with override_settings(LLM_ROUTES={}, LLM_PRIMARY_MODEL='gpt-4'):
+            self.assertEqual(default_token_model(), 'gpt-4')
+
+    def test_count_tokens(self):
+        """Test token counts grow with text and are zero for empty text"""
+        self.assertEqual(count_tokens(''), 0)
+        self.assertGreater(count_tokens('solar panels, inverters.'), 3)
+
+    def test_truncate_to_tokens(self):
+        """Test text is cut to the budget on paragraph boundaries"""
+        text = '\n\n'.join(' '.join(['word'] * 10) for _ in range(10))
+        truncated = truncate_to_tokens(text, 35)
+        self.assertLessEqual(count_tokens(truncated), 35)
+        self.assertEqual(truncated.count('\n\n'), 2)
+
+    def test_fair_share_between_documents(self):
+        """Test a large high-scoring document cannot crowd out the others"""
+        passages = [self._passage(self.big, i, 10 - i) for i in range(10)]
+        passages.append(self._passage(self.small, 0, 0.5))
+        packed = pack_context(passages, budget=200)
+
+        self.assertLessEqual(packed['tokens'], 200)
+        included_docs = {p['document_id'] for p in packed['included']}
+        self.assertEqual(included_docs, {1, 2})
+        self.assertEqual(len(packed['included']) + len(packed['dropped']), 11)
+        self.assertIn('Document: Spec sheet', packed['text'])
+
+    def test_unused_share_is_redistributed(self):
+        """Test budget left by a small document goes to the next best passages"""
+        passages = [self._passage(self.big, i, 10 - i) for i in range(4)]
+        passages.append(self._passage(self.small, 0, 1, words=5))
+        packed = pack_context(passages, budget=180)
+        big_included = [p for p in packed['included'] if p['document_id'] == 1]
+        self.assertEqual(len(big_included), 3)
+
+class DocumentSummaryTests(DocumentTestCase):
+    """Tests for the precomputed hierarchical document summaries"""
+    settings_overrides = {'SUMMARY_SECTION_WORDS': 60, 'SUMMARY_MAX_TOKENS': 120}
+
+    def _long_text(self, sections=40):
+        return '\n\n'.join(
+            f"Section {i} covers solar panel installation step {i}. "
+            f"Panels are mounted on rails and wired to the inverter. "
+            f"Installers check the roof load before mounting panel row {i}. "
+            f"The weather was pleasant that day."
+            for i in range(sections)
+        )
+
+    def _upload(self, title, text):
+        uploaded = SimpleUploadedFile(f'{title}.txt', text.encode('utf-8'), content_type='text/plain')
+        document = Document.create_from_upload(self.user, title, uploaded)
+        process_document(document)
+        document.refresh_from_db()
+        return document
+
+    def test_summarize_section_keeps_representative_sentences(self):
+        """Test the section summary keeps the sentences sharing the most terms"""
+        text = (
+            "Solar panels convert sunlight. Solar panels need sunlight and inverters. "
+            "My cat likes tuna fish. Inverters convert panel output for solar homes."
+        )
+        summary = summarize_section(text, max_sentences=2)
+        self.assertNotIn('tuna', summary)
+        self.assertTrue(summary.startswith('Solar panels'))
+
+    def test_build_document_summary_fits_budget(self):
+        """Test section summaries are rolled up into a bounded document summary"""
+        result = build_document_summary(self._long_text())
+        self.assertGreater(len(result['sections']), 10)
+        self.assertLessEqual(count_tokens(result['summary']), 120)
+        self.assertIn('panel', result['summary'].lower())
+
+    def test_summary_is_stored_at_ingestion(self):
+        """Test ingestion stores the summary keyed by the file hash"""
+        document = self._upload('Guide', self._long_text())
+        self.assertTrue(document.summary)
+        self.assertTrue(document.section_summaries)
+        self.assertEqual(document.summary_key, f'v1:{document.blob.sha256}')
+
+        with patch('core.summaries.build_document_summary') as mock_build:
+            self.assertEqual(get_document_summary(document), document.summary)
+        mock_build.assert_not_called()
+
+    def test_duplicate_upload_reuses_summary(self):
+        """Test a duplicate upload copies the summary instead of rebuilding it"""
+        first = self._upload('Guide', self._long_text())
+        with patch('core.summaries.build_document_summary') as mock_build:
+            second = self._upload('Guide copy', self._long_text())
+        mock_build.assert_not_called()
+        self.assertEqual(second.summary, first.summary)
+
+    def test_stale_summary_is_rebuilt(self):
+        """Test a summary built from other content is invalidated"""
+        document = self._upload('Guide', self._long_text())
+        Document.objects.filter(pk=document.pk).update(summary='old', summary_key='v1:stale')
+        document.refresh_from_db()
+        self.assertNotEqual(get_document_summary(document), 'old')
+        document.refresh_from_db()
+        self.assertEqual(document.summary_key, f'v1:{document.blob.sha256}')
+
+    def test_context_leads_with_summary(self):
+        """Test the generation context includes each document's summary"""
+        document = self._upload('Guide', self._long_text())
+        context = select_documents_context(self.user, [document], 'roof load', ['inverter'])
+        positions = [p['position'] for p in context['included']]
+        self.assertIn(-1, positions)
+        self.assertLessEqual(context['tokens'], context['budget'])
+
+class LLMClientPoolTests(TestCase):
+    """Tests for the pooled OpenAI client registry"""
+    def setUp(self):
+        self.blog_json = json.dumps({
+            'blog_title': 'Solar Guide',
+            'meta_description': 'All about panels',
+            'keywords': {'user_keywords': ['solar'], 'additional_keywords': []},
+            'word_count': '1500-2000 words',
+            'blog_outline': {'H2_1': 'Intro'},
+            'blog_draft': {'H2_1': 'Text'},
+            'seo_recommendations': {},
+        })
+        self.server = FakeLLMServer(content=self.blog_json).start()
+        self.settings_override = override_settings(
+            OPENAI_API_KEY='test-key', OPENAI_BASE_URL=self.server.base_url, OPENAI_MAX_RETRIES=0,
+            GENERATION_PIPELINE='single'
+        )
+        self.settings_override.enable()
+        llm.close_clients()
+        reset_resilience_state()
+
+    def tearDown(self):
+        llm.close_clients()
+        self.settings_override.disable()
+        self.server.stop()
+
+    def test_client_is_shared(self):
+        """Test the registry returns one client per key and base URL"""
+        self.assertIs(llm.get_openai_client(), llm.get_openai_client())
+        self.assertIsNot(llm.get_openai_client(), llm.get_openai_client(api_key='other-key'))
+
+    def test_connections_are_reused(self):
+        """Test consecutive generations share one kept-alive connection"""
+        for _ in range(3):
+            result = generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        self.assertEqual(result['blog_title'], 'Solar Guide')
+        self.assertEqual(self.server.requests, 3)
+        self.assertEqual(self.server.connections, 1)
+
+    def test_warm_up_opens_connection(self):
+        """Test warm-up connects before the first generation"""
+        llm.warm_up_client(background=False)
+        self.assertEqual(self.server.connections, 1)
+        generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        self.assertEqual(self.server.connections, 1)
+
+class GenerationTestCase(DocumentTestCase):
+    """
+    Shared fixture for the generation tests.
+
+    Adds the processed "Product Sheet" document (unless `create_document`
+    is False) and a canned generation result in `self.result` to
+    DocumentTestCase. Subclasses return a FakeLLMServer from
+    make_llm_server() to point the OpenAI client at it.
+    """
+    create_document = True
+
+    def setUp(self):
+        self.server = self.make_llm_server()
+        if self.server is not None:
+            self.server.start()
+            self.addCleanup(self.server.stop)
+        super().setUp()
+        if self.server is not None:
+            llm.close_clients()
+            reset_resilience_state()
+            self.addCleanup(llm.close_clients)
+
+        if self.create_document:
+            self.document = Document.create_from_upload(
+                self.user, 'Product Sheet',
+                SimpleUploadedFile('notes.txt', b'Fast solar panels for homes', content_type='text/plain')
+            )
+            process_document(self.document)
+        self.result = {
+            'blog_title': 'Solar Homes',
+            'keywords': {'user_keywords': ['solar'], 'additional_keywords': ['pv']},
+            'blog_outline': {'H2_1': 'Intro'},
+            'blog_draft': {'H2_1': 'Panels'},
+        }
+
+    def fixture_settings(self):
+        overrides = super().fixture_settings()
+        if self.server is not None:
+            overrides.update(
+                OPENAI_API_KEY='test-key', OPENAI_BASE_URL=self.server.base_url, OPENAI_MAX_RETRIES=0
+            )
+        return overrides
+
+    def make_llm_server(self):
+        """Return an unstarted FakeLLMServer for the test's LLM calls, or None."""
+        return None
+
+
+class BlogGenerationJobTests(GenerationTestCase):
+    """Tests for background blog generation jobs"""
+    settings_overrides = {'JOB_QUEUE_ASYNC': True}
+
+    def _create(self, document_ids=None):
+        return self.client.post(reverse('core:create_blog'), json.dumps({
+            'topic': 'Solar',
+            'user_keywords': 'solar',
+            'document_ids': json.dumps(document_ids or [self.document.id])
+        }), content_type='application/json')
+
+    def test_create_blog_returns_job_immediately(self):
+        """Test the POST queues a job instead of calling the API"""
+        with patch('core.utils.generate_blog_content') as mock_generate:
+            response = self._create()
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertEqual(data['status'], 'queued')
+        self.assertEqual(data['status_url'], reverse('core:job_status', args=[data['job_id']]))
+        mock_generate.assert_not_called()
+        self.assertFalse(Blog.objects.exists())
+
+    def test_worker_creates_blog_and_reports_result(self):
+        """Test running the job saves the blog and the status endpoint reports it"""
+        job_id = self._create().json()['job_id']
+        with patch('core.utils.generate_blog_content', return_value=self.result):
+            self.assertEqual(run_job(job_id), 'done')
+
+        data = self.client.get(reverse('core:job_status', args=[job_id])).json()
+        self.assertEqual(data['status'], 'done')
+        self.assertIsNotNone(data['queue_seconds'])
+        self.assertIsNotNone(data['run_seconds'])
+        blog = Blog.objects.get(pk=data['result']['blog_id'])
+        self.assertEqual(blog.blog_title, 'Solar Homes')
+        self.assertEqual(blog.additional_keywords, ['pv'])
+        self.assertEqual(list(blog.reference_documents.all()), [self.document])
+
+    def test_failed_generation_reports_error(self):
+        """Test API errors mark the job failed with the message"""
+        job_id = self._create().json()['job_id']
+        with patch('core.utils.generate_blog_content', side_effect=Exception('rate limited')):
+            self.assertEqual(run_job(job_id), 'failed')
+        data = self.client.get(reverse('core:job_status', args=[job_id])).json()
+        self.assertEqual(data['status'], 'failed')
+        self.assertIn('rate limited', data['error'])
+        self.assertFalse(Blog.objects.exists())
+
+    def test_job_status_is_private(self):
+        """Test users cannot see each other's jobs"""
+        job_id = self._create().json()['job_id']
+        User.objects.create_user(username='other', password='testpass123')
+        self.client.login(username='other', password='testpass123')
+        response = self.client.get(reverse('core:job_status', args=[job_id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_documents_rejected_upfront(self):
+        """Test requests without usable documents fail before queueing"""
+        response = self._create(document_ids=[9999])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.filter(kind='generate_blog').exists())
+
+class StreamingGenerationTests(GenerationTestCase):
+    """Tests for server-sent-event blog streaming"""
+    def setUp(self):
+        self.blog = {
+            'blog_title': 'Solar "Homes"',
+            'meta_description': 'Panels, explained',
+            'keywords': {'user_keywords': ['solar'], 'additional_keywords': ['pv']},
+            'word_count': 1800,
+            'blog_outline': {'H2_1': 'Intro', 'H2_1_1': 'Why {solar}'},
+            'blog_draft': {'H2_1': 'Panels turn light into power.'},
+            'seo_recommendations': {'internal_linking': []},
+        }
+        super().setUp()
+
+    def make_llm_server(self):
+        return FakeLLMServer(content=json.dumps(self.blog, indent=2), stream_chunk_size=5)
+
+    def _events(self, response):
+        events = []
+        body = b''.join(response.streaming_content).decode('utf-8')
+        for block in body.strip().split('\n\n'):
+            lines = dict(line.split(': ', 1) for line in block.split('\n'))
+            events.append((lines['event'], json.loads(lines['data'])))
+        return events
+
+    def test_parser_reports_fields_as_they_complete(self):
+        """Test fields are reported once complete, whatever the chunking"""
+        text = json.dumps(self.blog)
+        parser = IncrementalJSONParser()
+        completed = []
+        for i in range(0, len(text), 3):
+            completed.extend(parser.feed(text[i:i + 3]))
+        self.assertTrue(parser.complete)
+        top_level = {path[0]: value for path, value in completed if len(path) == 1}
+        self.assertEqual(top_level, self.blog)
+        paths = [path for path, _ in completed]
+        self.assertLess(paths.index(('blog_title',)), paths.index(('blog_outline', 'H2_1')))
+        self.assertLess(paths.index(('blog_outline', 'H2_1')), paths.index(('blog_outline',)))
+
+    def test_parser_waits_for_incomplete_values(self):
+        """Test partial strings and numbers are not reported"""
+        parser = IncrementalJSONParser()
+        self.assertEqual(parser.feed('{"blog_title": "Sol'), [])
+        self.assertEqual(parser.feed('ar", "word_count": 18'), [(('blog_title',), 'Solar')])
+        self.assertEqual(parser.feed('00}'), [(('word_count',), 1800)])
+
+    def test_parser_skips_prose_around_the_document(self):
+        """Test commas, quotes and brackets in prose before or after the JSON are ignored"""
+        parser = IncrementalJSONParser()
+        self.assertEqual(parser.feed('Sure, here "it" is] ```json\n'), [])
+        self.assertEqual(parser.feed('{"a": 1}'), [(('a',), 1)])
+        self.assertTrue(parser.complete)
+        self.assertEqual(parser.feed('\n``` Done, {"b": 2}'), [])
+
+    def test_stream_blog_emits_events_and_saves_blog(self):
+        """Test the endpoint streams tokens and fields, then saves the blog"""
+        response = self.client.post(reverse('core:stream_blog'), json.dumps({
+            'topic': 'Solar',
+            'user_keywords': 'solar',
+            'document_ids': json.dumps([self.document.id])
+        }), content_type='application/json')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = self._events(response)
+
+        names = [name for name, _ in events]
+        self.assertEqual(names[0], 'context')
+        self.assertEqual(names[-1], 'done')
+        self.assertGreater(names.count('token'), 10)
+        fields = [data['path'] for name, data in events if name == 'field']
+        self.assertIn(['blog_outline', 'H2_1_1'], fields)
+        title_event = names.index('field')
+        self.assertEqual(events[title_event][1], {'path': ['blog_title'], 'value': 'Solar "Homes"'})
+
+        blog = Blog.objects.get(pk=events[-1][1]['blog_id'])
+        self.assertEqual(blog.blog_title, 'Solar "Homes"')
+        self.assertEqual(blog.blog_draft, self.blog['blog_draft'])
+        self.assertEqual(list(blog.reference_documents.all()), [self.document])
+
+    def test_stream_blog_reports_api_errors(self):
+        """Test API failures end the stream with an error event"""
+        self.server.stop()
+        response = self.client.post(reverse('core:stream_blog'), json.dumps({
+            'topic': 'Solar',
+            'document_ids': json.dumps([self.document.id])
+        }), content_type='application/json')
+        events = self._events(response)
+        self.assertEqual(events[-1][0], 'error')
+        self.assertFalse(Blog.objects.exists())
+        self.server = FakeLLMServer().start()
+
+class GenerationCacheTests(GenerationTestCase):
+    """Tests for the opt-in generation result cache"""
+    settings_overrides = {'GENERATION_CACHE_ENABLED': True, 'JOB_QUEUE_ASYNC': True}
+
+    def setUp(self):
+        super().setUp()
+        caches['generation'].clear()
+        reset_metrics(CACHE_METRICS)
+
+    def tearDown(self):
+        caches['generation'].clear()
+        reset_metrics(CACHE_METRICS)
+
+    def _create(self, keywords='solar, Panels', regenerate=False):
+        return self.client.post(reverse('core:create_blog'), json.dumps({
+            'topic': 'Solar',
+            'user_keywords': keywords,
+            'document_ids': json.dumps([self.document.id]),
+            'regenerate': regenerate
+        }), content_type='application/json')
+
+    def test_fingerprint_normalizes_keywords(self):
+        """Test keyword order, case and spacing do not change the fingerprint"""
+        docs = [self.document]
+        self.assertEqual(
+            generation_fingerprint('Solar', 'casual', ['Solar', 'home  panels'], docs),
+            generation_fingerprint(' solar ', 'Casual', ['home panels', 'solar', 'solar'], docs)
+        )
+        self.assertNotEqual(
+            generation_fingerprint('Solar', 'casual', ['solar'], docs),
+            generation_fingerprint('Solar', 'formal', ['solar'], docs)
+        )
+
+    def test_fingerprint_changes_with_document_content(self):
+        """Test a document with different content produces a new fingerprint"""
+        other = Document.create_from_upload(
+            self.user, 'Product Sheet',
+            SimpleUploadedFile('notes.txt', b'Slow wind turbines', content_type='text/plain')
+        )
+        self.assertNotEqual(
+            generation_fingerprint('Solar', 'casual', [], [self.document]),
+            generation_fingerprint('Solar', 'casual', [], [other])
+        )
+
+    def test_repeat_request_is_served_from_cache(self):
+        """Test an identical request skips the API and finishes inline"""
+        job_id = self._create().json()['job_id']
+        with patch('core.utils.generate_blog_content', return_value=self.result) as mock_generate:
+            run_job(job_id)
+            response = self._create(keywords='panels,SOLAR')
+        self.assertEqual(mock_generate.call_count, 1)
+        data = response.json()
+        self.assertEqual(data['status'], 'done')
+        self.assertTrue(data['result']['cached'])
+        self.assertEqual(Blog.objects.count(), 2)
+        stats = cache_stats()
+        self.assertEqual(stats['generation_cache_hits'], 1)
+        self.assertEqual(stats['generation_cache_misses'], 1)
+
+    def test_regenerate_bypasses_cache(self):
+        """Test the regenerate flag calls the API again and refreshes the entry"""
+        job_id = self._create().json()['job_id']
+        with patch('core.utils.generate_blog_content', return_value=self.result) as mock_generate:
+            run_job(job_id)
+            data = self._create(regenerate=True).json()
+            self.assertEqual(data['status'], 'queued')
+            run_job(data['job_id'])
+        self.assertEqual(mock_generate.call_count, 2)
+        self.assertEqual(cache_stats()['generation_cache_bypasses'], 1)
+
+    def test_disabled_by_default(self):
+        """Test nothing is cached unless the cache is enabled"""
+        with override_settings(GENERATION_CACHE_ENABLED=False):
+            with patch('core.utils.generate_blog_content', return_value=self.result) as mock_generate:
+                for _ in range(2):
+                    run_job(self._create().json()['job_id'])
+        self.assertEqual(mock_generate.call_count, 2)
+
+    def test_metrics_view_is_staff_only(self):
+        """Test cache counters are exposed to staff users only"""
+        self.assertEqual(self.client.get(reverse('core:metrics')).status_code, 403)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        data = self.client.get(reverse('core:metrics')).json()
+        self.assertIn('generation_cache_hit_rate', data['generation_cache'])
+
+class SectionedGenerationTests(GenerationTestCase):
+    """Tests for outline-first generation with parallel section drafts"""
+    create_document = False
+    settings_overrides = {'GENERATION_PIPELINE': 'sectioned', 'GENERATION_SECTION_CONCURRENCY': 3}
+
+    def setUp(self):
+        self.outline = {
+            'blog_title': 'Solar Homes',
+            'meta_description': 'Panels explained',
+            'keywords': {'user_keywords': ['solar'], 'additional_keywords': []},
+            'word_count': '1,200-1,500 words',
+            'blog_outline': {
+                'introduction': {'content': 'Why solar'},
+                'H2_1': 'How Panels Work',
+                'H2_1_2': {'content': 'Inverters'},
+                'H2_1_1': {'content': 'Cells'},
+                'H2_2': 'Costs',
+                'H2_10': 'Maintenance',
+                'conclusion': {'content': 'Wrap up'},
+            },
+            'seo_recommendations': {},
+        }
+        super().setUp()
+
+    def make_llm_server(self):
+        return FakeLLMServer(content=self._reply, latency=0.2)
+
+    def _reply(self, request):
+        prompt = request['messages'][-1]['content']
+        if prompt.startswith('Plan a high-quality'):
+            return json.dumps(self.outline)
+        heading = prompt.split('"')[1]
+        return f"Body of {heading}."
+
+    def test_outline_sections_order(self):
+        """Test sections follow the outline numbering with sorted subsections"""
+        sections = outline_sections(self.outline['blog_outline'])
+        self.assertEqual(
+            [s['key'] for s in sections],
+            ['introduction', 'H2_1', 'H2_2', 'H2_10', 'conclusion']
+        )
+        self.assertEqual(sections[1]['subheadings'], ['Cells', 'Inverters'])
+        self.assertEqual(target_word_count(self.outline['word_count']), 1200)
+
+    def test_sections_are_drafted_in_parallel(self):
+        """Test sections run concurrently under the cap and are assembled in order"""
+        start = time.perf_counter()
+        result = generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(self.server.requests, 6)
+        self.assertEqual(self.server.max_in_flight, 3)
+        # Outline plus two rounds of sections, rather than six sequential calls
+        self.assertLess(elapsed, 6 * 0.2)
+        draft = result['blog_draft']
+        self.assertTrue(draft.startswith('### Introduction\n\nBody of Introduction.'))
+        self.assertLess(draft.index('### Costs'), draft.index('### Maintenance'))
+        self.assertEqual(result['blog_outline'], self.outline['blog_outline'])
+
+    def test_section_failure_fails_generation(self):
+        """Test a failed section surfaces as a generation error"""
+        self.server.httpd.content = lambda request: (
+            json.dumps(self.outline) if request['messages'][-1]['content'].startswith('Plan')
+            else None
+        )
+        with self.assertRaises(Exception):
+            generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+
+    def _draft(self, acomplete, deadline=None):
+        requests = [({'key': 'H2_1'}, []), ({'key': 'H2_2'}, [])]
+        routes = [SimpleNamespace(model='section-model') for _ in requests]
+        with patch('core.pipeline.acomplete', acomplete):
+            return llm.run_async(draft_sections(requests, {}, routes, deadline=deadline), timeout=5)
+
+    def test_sections_share_a_deadline(self):
+        """Test a hanging section fails the generation once the deadline passes"""
+        async def hang(messages, params, stage, route):
+            await asyncio.sleep(10)
+
+        started = time.perf_counter()
+        with self.assertRaises(ProviderUnavailable):
+            self._draft(hang, deadline=0.2)
+        self.assertLess(time.perf_counter() - started, 2)
+
+    def test_cancelled_section_is_a_failed_section(self):
+        """Test a cancelled section surfaces as ProviderUnavailable, not an unpacking error"""
+        async def cancelled(messages, params, stage, route):
+            raise asyncio.CancelledError()
+
+        with self.assertRaises(ProviderUnavailable):
+            self._draft(cancelled)
+
+class SingleFlightTests(GenerationTestCase):
+    """Tests for single-flight generation jobs and per-blog locking"""
+    settings_overrides = {'JOB_QUEUE_ASYNC': True}
+
+    def setUp(self):
+        super().setUp()
+        self.blog = Blog.objects.create(user=self.user, topic='Solar', target_keywords=['solar'])
+
+    def _create(self, topic='Solar', keywords='solar'):
+        return self.client.post(reverse('core:create_blog'), json.dumps({
+            'topic': topic,
+            'user_keywords': keywords,
+            'document_ids': json.dumps([self.document.id])
+        }), content_type='application/json')
+
+    def test_identical_requests_attach_to_active_job(self):
+        """Test an identical request joins the queued job instead of creating another"""
+        first = self._create().json()
+        second = self._create(topic='  solar ', keywords='Solar').json()
+        self.assertEqual(first['job_id'], second['job_id'])
+        self.assertEqual(Job.objects.filter(kind='generate_blog').count(), 1)
+
+        other = self._create(topic='Wind').json()
+        self.assertNotEqual(other['job_id'], first['job_id'])
+
+    def test_finished_job_does_not_absorb_new_requests(self):
+        """Test a request after the job finished starts a new generation"""
+        first = self._create().json()
+        with patch('core.utils.generate_blog_content', return_value=self.result):
+            run_job(first['job_id'])
+        second = self._create().json()
+        self.assertNotEqual(first['job_id'], second['job_id'])
+
+    def test_generate_blog_rejects_concurrent_generation(self):
+        """Test a second generation of a blog that is being generated gets a 409"""
+        self.assertTrue(self.blog.claim_generation())
+        response = self.client.post(reverse('core:generate_blog'), json.dumps({
+            'blog_id': self.blog.id, 'document_ids': [self.document.id]
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()['success'])
+
+        self.blog.release_generation()
+        with patch('core.views.generate_blog_content', return_value=self.result):
+            response = self.client.post(reverse('core:generate_blog'), json.dumps({
+                'blog_id': self.blog.id, 'document_ids': [self.document.id]
+            }), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.blog_title, 'Solar Homes')
+        self.assertEqual(self.blog.version, 1)
+        self.assertIsNone(self.blog.generation_started_at)
+
+    def test_stale_generation_lock_can_be_taken_over(self):
+        """Test a lock left behind by a crashed request expires"""
+        self.assertTrue(self.blog.claim_generation())
+        self.assertFalse(Blog.objects.get(pk=self.blog.pk).claim_generation())
+        with override_settings(BLOG_GENERATION_LOCK_TIMEOUT=0):
+            self.assertTrue(Blog.objects.get(pk=self.blog.pk).claim_generation())
+
+    def test_update_blog_rejects_stale_version(self):
+        """Test an edit based on an old version is refused instead of overwriting"""
+        url = reverse('core:update_blog', args=[self.blog.id])
+        response = self.client.post(url, json.dumps({'blog_title': 'First', 'version': 0}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], 1)
+
+        response = self.client.post(url, json.dumps({'blog_title': 'Stale', 'version': 0}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 1)
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.blog_title, 'First')
+
+    def test_update_blog_waits_for_generation(self):
+        """Test edits are refused while the blog is being regenerated"""
+        self.blog.claim_generation()
+        response = self.client.post(reverse('core:update_blog', args=[self.blog.id]),
+                                    json.dumps({'blog_title': 'Edit'}), content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('regenerated', response.json()['error'])
+
+
+class RateLimitTests(GenerationTestCase):
+    """Tests for the global LLM rate limiter and fair-share job scheduling"""
+    create_document = False
+    settings_overrides = {
+        'GENERATION_PIPELINE': 'single', 'LLM_REQUESTS_PER_MINUTE': 2, 'LLM_TOKENS_PER_MINUTE': 6000,
+    }
+
+    def setUp(self):
+        super().setUp()
+        reset_metrics(RATE_LIMIT_METRICS + QUEUE_METRICS)
+
+    def tearDown(self):
+        reset_metrics(RATE_LIMIT_METRICS + QUEUE_METRICS)
+
+    def make_llm_server(self):
+        return FakeLLMServer(content=json.dumps({
+            'blog_title': 'Solar Guide',
+            'meta_description': 'All about panels',
+            'keywords': {'user_keywords': ['solar'], 'additional_keywords': []},
+            'word_count': '1500-2000 words',
+            'blog_outline': {'H2_1': 'Intro'},
+            'blog_draft': {'H2_1': 'Text'},
+            'seo_recommendations': {},
+        }))
+
+    def test_request_bucket_limits_calls(self):
+        """Test the bucket admits its capacity and then reports the wait"""
+        self.assertEqual(rate_limit.try_acquire(100), 0.0)
+        self.assertEqual(rate_limit.try_acquire(100), 0.0)
+        wait = rate_limit.try_acquire(100)
+        self.assertGreater(wait, 25)
+        self.assertLessEqual(wait, 30)
+
+    def test_token_bucket_limits_calls(self):
+        """Test a request that does not fit the token balance has to wait"""
+        self.assertEqual(rate_limit.try_acquire(5000), 0.0)
+        wait = rate_limit.try_acquire(3000)
+        # 2000 tokens are missing at 100 tokens per second
+        self.assertAlmostEqual(wait, 20, delta=0.5)
+
+    def test_unused_tokens_are_returned(self):
+        """Test reported usage below the estimate refunds the difference"""
+        rate_limit.try_acquire(5000)
+        rate_limit.record_usage(5000, MagicMock(total_tokens=1000))
+        self.assertEqual(rate_limit.try_acquire(4000), 0.0)
+
+    def test_generation_goes_through_limiter(self):
+        """Test generate_blog_content fails fast once the limit is exhausted"""
+        with override_settings(LLM_RATE_LIMIT_MAX_WAIT=0, LLM_TOKENS_PER_MINUTE=100000):
+            generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+            generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+            with self.assertRaisesRegex(Exception, 'rate limit'):
+                generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(rate_limit_stats()['llm_rate_limit_acquired'], 2)
+
+    def test_disabled_limits_admit_everything(self):
+        """Test zero limits turn the limiter off"""
+        with override_settings(LLM_REQUESTS_PER_MINUTE=0, LLM_TOKENS_PER_MINUTE=0):
+            for _ in range(5):
+                self.assertEqual(rate_limit.acquire(10 ** 6, timeout=0), 0.0)
+
+    def test_claim_jobs_shares_workers_between_users(self):
+        """Test a user with many queued jobs does not starve other users"""
+        heavy = User.objects.create_user(username='heavy', password='testpass123')
+        light = User.objects.create_user(username='light', password='testpass123')
+        heavy_jobs = [Job.objects.create(kind='generate_blog', user=heavy) for _ in range(4)]
+        Job.objects.filter(pk=heavy_jobs[0].pk).update(status='running', started_at=timezone.now())
+        light_job = Job.objects.create(kind='generate_blog', user=light)
+
+        claimed = claim_jobs(2)
+        self.assertEqual(claimed, [light_job.id, heavy_jobs[1].id])
+        self.assertEqual(queue_stats()['jobs_started'], 2)
+        self.assertEqual(queue_stats()['jobs_queued'], 2)
+
+
+class ResilienceTests(GenerationTestCase):
+    """Tests for retries, deadlines, hedging and circuit breaking of LLM calls"""
+    create_document = False
+    settings_overrides = {'GENERATION_PIPELINE': 'single', 'LLM_RETRY_BASE_DELAY': 0.01, 'LLM_MAX_ATTEMPTS': 3}
+
+    def setUp(self):
+        super().setUp()
+        reset_metrics(RESILIENCE_METRICS)
+
+    def tearDown(self):
+        reset_resilience_state()
+        reset_metrics(RESILIENCE_METRICS)
+
+    def make_llm_server(self):
+        return FakeLLMServer(content=json.dumps({
+            'blog_title': 'Solar Guide',
+            'meta_description': 'All about panels',
+            'keywords': {'user_keywords': ['solar'], 'additional_keywords': []},
+            'word_count': '1500-2000 words',
+            'blog_outline': {'H2_1': 'Intro'},
+            'blog_draft': {'H2_1': 'Text'},
+            'seo_recommendations': {},
+        }))
+
+    def _generate(self):
+        return generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+
+    def test_transient_errors_are_retried(self):
+        """Test a 429 is retried after the Retry-After delay"""
+        self.server.fail_next(429, retry_after=0.2)
+        started = time.monotonic()
+        self.assertEqual(self._generate()['blog_title'], 'Solar Guide')
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(resilience.resilience_stats()['llm_retries'], 1)
+
+    def test_client_errors_are_not_retried(self):
+        """Test a 400 fails on the first attempt as a regular error"""
+        self.server.fail_next(400)
+        with self.assertRaises(Exception) as context:
+            self._generate()
+        self.assertNotIsInstance(context.exception, ProviderUnavailable)
+        self.assertEqual(self.server.requests, 1)
+
+    def test_exhausted_retries_raise_provider_unavailable(self):
+        """Test persistent 5xx errors surface as ProviderUnavailable"""
+        self.server.fail_next(503, count=5)
+        with self.assertRaises(ProviderUnavailable):
+            self._generate()
+        self.assertEqual(self.server.requests, 3)
+
+    def test_attempt_deadline_bounds_slow_calls(self):
+        """Test a hung attempt is abandoned at its deadline"""
+        self.server.httpd.latency = 1.0
+        started = time.monotonic()
+        with override_settings(LLM_ATTEMPT_TIMEOUT=0.2, LLM_MAX_ATTEMPTS=1):
+            with self.assertRaises(ProviderUnavailable):
+                self._generate()
+        self.assertLess(time.monotonic() - started, 0.9)
+
+    def test_circuit_breaker_fails_fast_and_recovers(self):
+        """Test the breaker rejects calls after repeated failures, then lets a trial through"""
+        with override_settings(LLM_MAX_ATTEMPTS=1, LLM_CIRCUIT_FAILURE_THRESHOLD=2,
+                               LLM_CIRCUIT_RESET_TIMEOUT=0.2):
+            reset_resilience_state()
+            self.server.fail_next(500, count=2)
+            for _ in range(2):
+                with self.assertRaises(ProviderUnavailable):
+                    self._generate()
+            with self.assertRaises(resilience.CircuitOpenError):
+                self._generate()
+            self.assertEqual(self.server.requests, 2)
+
+            time.sleep(0.25)
+            self.assertEqual(self._generate()['blog_title'], 'Solar Guide')
+            self.assertEqual(resilience.get_circuit_breaker().state, 'closed')
+
+    def test_half_open_failure_reopens_breaker(self):
+        """Test a failed trial call opens the breaker again"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+        breaker.record_failure()
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, 'half_open')
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+
+    def test_lost_trial_does_not_wedge_breaker(self):
+        """Test a half-open trial without an outcome lets another trial through later"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+        breaker.record_failure()
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        self.assertGreater(breaker.retry_after(), 0)
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())
+
+    def test_trial_with_failed_admission_keeps_breaker_usable(self):
+        """Test a trial whose rate limit admission fails does not strand the breaker half-open"""
+        with override_settings(LLM_CIRCUIT_FAILURE_THRESHOLD=1, LLM_CIRCUIT_RESET_TIMEOUT=0.1):
+            breaker = resilience.get_circuit_breaker()
+            breaker.record_failure()
+            time.sleep(0.15)
+
+            def admit():
+                raise RateLimitTimeout('Too many requests', retry_after=1)
+
+            with self.assertRaises(RateLimitTimeout):
+                call_with_resilience(lambda timeout: 'ok', 'admission-test', admit=admit)
+            self.assertEqual(breaker.state, 'open')
+            self.assertEqual(call_with_resilience(lambda timeout: 'ok', 'admission-test'), 'ok')
+            self.assertEqual(breaker.state, 'closed')
+
+    def test_cancelled_async_trial_is_abandoned(self):
+        """Test cancelling the async half-open trial lets the next call try again"""
+        with override_settings(LLM_CIRCUIT_FAILURE_THRESHOLD=1, LLM_CIRCUIT_RESET_TIMEOUT=0.1):
+            breaker = resilience.get_circuit_breaker()
+            breaker.record_failure()
+            time.sleep(0.15)
+
+            async def hang(timeout):
+                await asyncio.sleep(10)
+
+            async def cancelled_trial():
+                task = asyncio.ensure_future(resilience.acall_with_resilience(hang, 'cancel-test'))
+                await asyncio.sleep(0.05)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+            asyncio.run(cancelled_trial())
+            self.assertEqual(breaker.state, 'open')
+            self.assertEqual(call_with_resilience(lambda timeout: 'ok', 'cancel-test'), 'ok')
+
+    def test_slow_attempt_is_hedged(self):
+        """Test a second request is sent once an attempt exceeds the p95 latency"""
+        tracker = resilience.get_latency_tracker('hedge-test')
+        for _ in range(20):
+            tracker.record(0.05)
+        calls = []
+
+        def call(timeout):
+            calls.append(timeout)
+            if len(calls) == 1:
+                time.sleep(1.0)
+                return 'slow'
+            return 'fast'
+
+        with override_settings(LLM_HEDGE_ENABLED=True, LLM_HEDGE_MIN_DELAY=0):
+            started = time.monotonic()
+            self.assertEqual(call_with_resilience(call, 'hedge-test', hedge=True), 'fast')
+        self.assertLess(time.monotonic() - started, 0.5)
+        stats = resilience.resilience_stats()
+        self.assertEqual(stats['llm_hedges'], 1)
+        self.assertEqual(stats['llm_hedge_wins'], 1)
+
+    def test_backoff_honors_retry_after(self):
+        """Test backoff is jittered below the cap but never shorter than Retry-After"""
+        with override_settings(LLM_RETRY_BASE_DELAY=1, LLM_RETRY_MAX_DELAY=4):
+            delays = [backoff_delay(10) for _ in range(50)]
+            self.assertTrue(all(0 <= delay <= 4 for delay in delays))
+            self.assertGreater(len(set(delays)), 1)
+            self.assertGreaterEqual(backoff_delay(0, retry_after=7), 7)
+
+
+class BulkGenerationTests(GenerationTestCase):
+    """Tests for bulk generation from topic CSVs"""
+    settings_overrides = {'JOB_QUEUE_ASYNC': False}
+
+    def setUp(self):
+        super().setUp()
+        self.csv = (
+            'Topic,Tone,Keywords,Documents\n'
+            'Solar panels,casual,"solar, panels",Product Sheet\n'
+            f'Wind turbines,,wind,{self.document.id}\n'
+            ',,,\n'
+            'Heat pumps,professional,,\n'
+        ).encode('utf-8')
+
+    def _result(self, topic, tone, target_keywords, documents_content):
+        return {
+            'blog_title': f'{topic} guide',
+            'keywords': {'user_keywords': target_keywords, 'additional_keywords': ['extra']},
+            'blog_outline': {'H2_1': topic},
+            'blog_draft': {'H2_1': documents_content[:20]},
+        }
+
+    def test_parse_topic_csv(self):
+        """Test topics, tones, keywords and document references are read from the CSV"""
+        rows = parse_topic_csv(self.csv)
+        self.assertEqual([row['topic'] for row in rows], ['Solar panels', 'Wind turbines', 'Heat pumps'])
+        self.assertEqual(rows[0]['keywords'], ['solar', 'panels'])
+        self.assertEqual(rows[0]['document_refs'], ['Product Sheet'])
+        self.assertEqual(rows[1]['tone'], 'professional')
+        self.assertEqual(rows[2]['row_number'], 5)
+        with self.assertRaises(ValueError):
+            parse_topic_csv(b'name,tone\nSolar,casual\n')
+
+    def test_generates_rows_and_writes_blogs(self):
+        """Test every row becomes a blog, written in batches, with its documents"""
+        batch, created = create_bulk_generation(self.user, self.csv, 'topics.csv')
+        self.assertTrue(created)
+        with patch('core.utils.generate_blog_content', side_effect=self._result) as mock_generate:
+            report = run_bulk_generation(batch, concurrency=2, batch_size=2)
+        self.assertEqual(mock_generate.call_count, 3)
+        self.assertEqual((report['done'], report['failed'], report['written']), (3, 0, 3))
+        self.assertGreater(report['blogs_per_minute'], 0)
+
+        solar = Blog.objects.get(topic='Solar panels')
+        self.assertEqual(solar.blog_title, 'Solar panels guide')
+        self.assertEqual(solar.tone, 'casual')
+        self.assertEqual(list(solar.reference_documents.all()), [self.document])
+        self.assertFalse(Blog.objects.get(topic='Heat pumps').reference_documents.exists())
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, 'done')
+        self.assertTrue(all(row.blog_id for row in batch.rows.all()))
+
+    def test_concurrency_is_bounded(self):
+        """Test no more than `concurrency` generations run at once"""
+        lock = threading.Lock()
+        state = {'running': 0, 'max': 0}
+
+        def slow_generate(**kwargs):
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+            return self._result(**kwargs)
+
+        csv_data = ('topic\n' + '\n'.join(f'Topic {i}' for i in range(8)) + '\n').encode('utf-8')
+        batch, _ = create_bulk_generation(self.user, csv_data, 'many.csv')
+        with patch('core.utils.generate_blog_content', side_effect=slow_generate):
+            report = run_bulk_generation(batch, concurrency=3, batch_size=5)
+        self.assertEqual(report['written'], 8)
+        self.assertEqual(state['max'], 3)
+
+    def test_resume_skips_finished_rows(self):
+        """Test a resumed batch only generates unfinished rows and keeps stored results"""
+        batch, _ = create_bulk_generation(self.user, self.csv, 'topics.csv')
+        solar, wind, heat = batch.rows.all()
+        blog = Blog.objects.create(user=self.user, topic=solar.topic)
+        BulkGenerationRow.objects.filter(pk=solar.pk).update(status='done', blog=blog)
+        BulkGenerationRow.objects.filter(pk=wind.pk).update(
+            status='generated', result=self._result('Wind turbines', 'professional', ['wind'], ''),
+            document_ids=[self.document.id]
+        )
+        # Left behind by a crashed run
+        BulkGenerationRow.objects.filter(pk=heat.pk).update(status='running')
+
+        again, created = create_bulk_generation(self.user, self.csv, 'topics.csv')
+        self.assertFalse(created)
+        self.assertEqual(again.pk, batch.pk)
+        with patch('core.utils.generate_blog_content', side_effect=self._result) as mock_generate:
+            report = run_bulk_generation(again)
+        self.assertEqual(mock_generate.call_count, 1)
+        self.assertEqual(report['skipped'], 1)
+        self.assertEqual(report['written'], 2)
+        self.assertEqual(Blog.objects.filter(topic='Solar panels').count(), 1)
+        self.assertEqual(Blog.objects.get(topic='Wind turbines').blog_title, 'Wind turbines guide')
+
+    def test_failures_are_reported_and_retried(self):
+        """Test failed rows are reported and only regenerated on request"""
+        csv_data = b'topic,documents\nSolar,Missing Doc\nWind,\n'
+        batch, _ = create_bulk_generation(self.user, csv_data, 'topics.csv')
+        with patch('core.utils.generate_blog_content', side_effect=self._result):
+            report = run_bulk_generation(batch)
+        self.assertEqual((report['done'], report['failed']), (1, 1))
+        self.assertIn('Missing Doc', report['failures'][0]['error'])
+        self.assertEqual(report['failures'][0]['row'], 2)
+
+        with patch('core.utils.generate_blog_content', side_effect=self._result) as mock_generate:
+            run_bulk_generation(batch)
+            self.assertEqual(mock_generate.call_count, 0)
+            run_bulk_generation(batch, retry_failed=True)
+        # The document is still missing, so the retry fails again without a generation call
+        self.assertEqual(batch.get_counts()['failed'], 1)
+
+    def test_upload_endpoint_runs_batch(self):
+        """Test the upload endpoint imports the CSV and reports progress"""
+        upload = SimpleUploadedFile('topics.csv', self.csv, content_type='text/csv')
+        with patch('core.utils.generate_blog_content', side_effect=self._result):
+            response = self.client.post(reverse('core:bulk_generate'), {'file': upload})
+        self.assertEqual(response.status_code, 202)
+        data = response.json()
+        self.assertTrue(data['created'])
+        self.assertEqual(data['job']['status'], 'done')
+        self.assertEqual(data['rows']['done'], 3)
+
+        status = self.client.get(data['status_url']).json()
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['report']['written'], 3)
+
+        upload = SimpleUploadedFile('bad.csv', b'name\nSolar\n', content_type='text/csv')
+        self.assertEqual(self.client.post(reverse('core:bulk_generate'), {'file': upload}).status_code, 400)
+
+    def test_management_command(self):
+        """Test the command imports, generates and reports throughput"""
+        path = os.path.join(self.media_root, 'topics.csv')
+        with open(path, 'wb') as fh:
+            fh.write(self.csv)
+        out = io.StringIO()
+        with patch('core.utils.generate_blog_content', side_effect=self._result):
+            call_command('bulk_generate', path, user='testuser', stdout=out)
+            call_command('bulk_generate', path, user='testuser', stdout=out)
+        output = out.getvalue()
+        self.assertIn('Imported 3 topics', output)
+        self.assertIn('Resuming batch', output)
+        self.assertIn('3/3 done, 0 failed, 3 skipped', output)
+        self.assertEqual(Blog.objects.count(), 3)
+
+
+class SectionRegenerationTests(GenerationTestCase):
+    """Tests for regenerating a single part of a blog"""
+    create_document = False
+    settings_overrides = {'LLM_REQUESTS_PER_MINUTE': 0, 'LLM_TOKENS_PER_MINUTE': 0}
+
+    def setUp(self):
+        self.requests = []
+        self.reply = 'Fresh section text.'
+        super().setUp()
+        self.outline = {
+            'introduction': {'content': 'Why solar'},
+            'H2_1': 'How Panels Work',
+            'H2_1_1': {'content': 'Cells'},
+            'H2_1_2': {'content': 'Inverters'},
+            'H2_2': 'Costs',
+            'conclusion': {'content': 'Wrap up'},
+        }
+        self.blog = Blog.objects.create(
+            user=self.user, topic='Solar', target_keywords=['solar'], blog_title='Solar Homes',
+            blog_outline=self.outline,
+            blog_draft={
+                'introduction': 'Intro text.',
+                'H2_1': 'Panels text.',
+                'H2_2': 'Costs text.',
+                'conclusion': 'Closing text.',
+            }
+        )
+
+    def make_llm_server(self):
+        return FakeLLMServer(content=self._reply)
+
+    def _reply(self, request):
+        self.requests.append(request)
+        return self.reply
+
+    def _regenerate(self, section, **extra):
+        return self.client.post(
+            reverse('core:regenerate_section', args=[self.blog.id]),
+            json.dumps({'section': section, **extra}), content_type='application/json'
+        )
+
+    def test_regenerates_one_draft_section(self):
+        """Test only the requested key of a JSON draft changes, with neighbors in the prompt"""
+        response = self._regenerate('H2_1', instructions='Mention batteries', version=0)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['content'], 'Fresh section text.')
+        self.assertEqual(data['version'], 1)
+        self.assertGreater(data['usage']['total_tokens'], 0)
+
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.blog_draft, {
+            'introduction': 'Intro text.',
+            'H2_1': 'Fresh section text.',
+            'H2_2': 'Costs text.',
+            'conclusion': 'Closing text.',
+        })
+        self.assertEqual(self.blog.blog_outline, self.outline)
+        self.assertIsNone(self.blog.generation_started_at)
+
+        self.assertEqual(len(self.requests), 1)
+        prompt = self.requests[0]['messages'][-1]['content']
+        self.assertIn('Rewrite the "How Panels Work" section', prompt)
+        self.assertIn('#### Cells\n#### Inverters', prompt)
+        self.assertIn('Mention batteries', prompt)
+        self.assertIn('Panels text.', prompt)
+        self.assertIn('Intro text.', prompt)
+        self.assertIn('Costs text.', prompt)
+
+    def test_regenerates_markdown_subsection(self):
+        """Test a subsection of a sectioned (Markdown) draft is replaced in place"""
+        self.blog.blog_draft = (
+            '### Introduction\n\nIntro text.\n\n'
+            '### How Panels Work\n\nLead.\n\n#### Cells\n\nCells text.\n\n#### Inverters\n\nOld inverters.\n\n'
+            '### Costs\n\nCosts text.'
+        )
+        self.blog.save()
+        self.reply = 'New inverters.'
+        response = self._regenerate('H2_1_2')
+        self.assertEqual(response.status_code, 200)
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.blog_draft, (
+            '### Introduction\n\nIntro text.\n\n'
+            '### How Panels Work\n\nLead.\n\n#### Cells\n\nCells text.\n\n#### Inverters\n\nNew inverters.\n\n'
+            '### Costs\n\nCosts text.'
+        ))
+        prompt = self.requests[0]['messages'][-1]['content']
+        self.assertIn('Old inverters.', prompt)
+        self.assertIn('Cells text.', prompt)
+
+    def test_regenerates_title_and_outline(self):
+        """Test the title and the outline can be regenerated on their own"""
+        self.reply = '"Solar Homes, Explained"'
+        self.assertEqual(self._regenerate('title').status_code, 200)
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.blog_title, 'Solar Homes, Explained')
+
+        new_outline = {'introduction': {'content': 'Hook'}, 'H2_1': 'Basics', 'conclusion': {'content': 'End'}}
+        self.reply = json.dumps({'blog_outline': new_outline})
+        self.assertEqual(self._regenerate('outline').status_code, 200)
+        self.blog.refresh_from_db()
+        self.assertEqual(self.blog.blog_outline, new_outline)
+        self.assertEqual(self.blog.blog_draft['H2_1'], 'Panels text.')
+        self.assertEqual(self.blog.version, 2)
+
+    def test_rejections(self):
+        """Test unknown sections, missing sections, stale versions and running generations"""
+        self.assertEqual(self._regenerate('body').status_code, 400)
+        self.assertEqual(self._regenerate('H2_7').status_code, 404)
+        response = self._regenerate('H2_1', version=5)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 0)
+        self.blog.claim_generation()
+        self.assertEqual(self._regenerate('H2_1').status_code, 409)
+        self.assertEqual(self.requests, [])
+
+class ModelRoutingTests(GenerationTestCase):
+    """Tests for per-stage model routes, latency budgets and fallbacks"""
+    create_document = False
+
+    def setUp(self):
+        self.calls = []
+        self.slow_models = {'big-model'}
+        self.routes = {
+            'blog': {'model': 'big-model', 'max_tokens': 900, 'temperature': 0.3,
+                     'latency_budget': 0.3, 'fallback_model': 'small-model'},
+            'title': {'model': 'small-model', 'max_tokens': 50},
+        }
+        super().setUp()
+        reset_routing_state()
+        reset_metrics(routing_metric_names())
+
+    def get_settings_overrides(self):
+        return {
+            'GENERATION_PIPELINE': 'single', 'LLM_REQUESTS_PER_MINUTE': 0, 'LLM_TOKENS_PER_MINUTE': 0,
+            'LLM_ROUTES': self.routes, 'LLM_HEDGE_MIN_SAMPLES': 2, 'LLM_ROUTE_PROBE_INTERVAL': 3,
+        }
+
+    def make_llm_server(self):
+        return FakeLLMServer(content=self._reply)
+
+    def tearDown(self):
+        reset_metrics(routing_metric_names())
+
+    def _reply(self, request):
+        self.calls.append((request['model'], request.get('max_tokens'), request.get('temperature')))
+        if request['model'] in self.slow_models:
+            time.sleep(0.6)
+        return fake_completion_content(request)
+
+    def test_route_sets_stage_parameters(self):
+        """Test a stage's route overrides model, max_tokens and temperature"""
+        self.slow_models = set()
+        generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        llm.complete([{'role': 'user', 'content': 'Title please'}], {'model': 'other'}, stage='title')
+        self.assertEqual(self.calls, [('big-model', 900, 0.3), ('small-model', 50, None)])
+
+        stats = routing_stats()
+        self.assertEqual(stats['blog']['calls'], 1)
+        self.assertEqual(stats['blog']['fallbacks'], 0)
+        self.assertGreater(stats['blog']['prompt_tokens'], 0)
+        self.assertGreater(stats['blog']['completion_tokens'], 0)
+        self.assertGreater(stats['blog']['average_seconds'], 0)
+        self.assertEqual(stats['title']['calls'], 1)
+
+    def test_falls_back_when_over_budget(self):
+        """Test a primary model slower than the budget is replaced by the fallback"""
+        started = time.perf_counter()
+        result = generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        self.assertLess(time.perf_counter() - started, 0.6)
+        self.assertEqual(result['blog_title'], 'A Practical Guide to Solar')
+        self.assertEqual([model for model, _, _ in self.calls], ['big-model', 'small-model'])
+        self.assertEqual(routing_stats()['blog']['fallbacks'], 1)
+
+    def test_skips_primary_once_p95_is_over_budget(self):
+        """Test the route goes straight to the fallback, probing the primary now and then"""
+        for _ in range(2):
+            generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        self.calls.clear()
+        for _ in range(3):
+            generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        # The third call is a probe of the primary model
+        self.assertEqual(
+            [model for model, _, _ in self.calls], ['small-model', 'small-model', 'big-model', 'small-model']
+        )
+        self.assertEqual(routing_stats()['blog']['fallbacks'], 5)
+
+    def test_route_recovers_after_fast_probes(self):
+        """Test probes within budget clear the slow history so the primary is used again"""
+        for _ in range(2):
+            generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        self.slow_models.clear()
+        self.calls.clear()
+        with override_settings(LLM_ROUTE_RECOVERY_PROBES=1):
+            for _ in range(5):
+                generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        # Two fallbacks, then the probe recovers the route for good
+        self.assertEqual(
+            [model for model, _, _ in self.calls],
+            ['small-model', 'small-model', 'big-model', 'big-model', 'big-model']
+        )
+
+class FakeLLMTests(TestCase):
+    """Tests for the local chat completions stand-in"""
+    def setUp(self):
+        self.settings_override = override_settings(OPENAI_API_KEY='test-key', OPENAI_MAX_RETRIES=0)
+        self.settings_override.enable()
+        llm.close_clients()
+        reset_resilience_state()
+
+    def tearDown(self):
+        llm.close_clients()
+        self.settings_override.disable()
+
+    def _complete(self, server, **params):
+        client = llm.get_openai_client(base_url=server.base_url)
+        return client.chat.completions.create(
+            model='fake-model',
+            messages=[{'role': 'user', 'content': 'Topic: Solar Homes\nTarget Keywords: solar, panels'}],
+            **params
+        )
+
+    def test_latency_distributions(self):
+        """Test latency specs parse into non-negative samplers"""
+        rng = random.Random(1)
+        self.assertEqual(parse_latency(0.5)(), 0.5)
+        self.assertEqual(parse_latency('0.25')(), 0.25)
+        uniform = [parse_latency('uniform:1,2', rng)() for _ in range(50)]
+        self.assertTrue(all(1 <= value <= 2 for value in uniform))
+        normal = [parse_latency('normal:0,1', rng)() for _ in range(50)]
+        self.assertEqual(min(normal), 0.0)
+        lognormal = sorted(parse_latency('lognormal:2,0.3', rng)() for _ in range(201))
+        self.assertAlmostEqual(lognormal[100], 2, delta=0.3)
+        for spec in ('gamma:1,2', 'uniform:1', 'fixed:soon'):
+            with self.assertRaises(ValueError):
+                parse_latency(spec)
+
+    def test_default_reply_is_a_valid_blog(self):
+        """Test JSON requests get a blog the parser accepts"""
+        with FakeLLMServer() as server:
+            response = self._complete(server, response_format={'type': 'json_object'})
+        content = response.choices[0].message.content
+        result = parse_blog_response(content, 'Solar Homes', ['solar', 'panels'])
+        self.assertEqual(result['blog_title'], 'A Practical Guide to Solar Homes')
+        self.assertEqual(result['keywords']['user_keywords'], ['solar', 'panels'])
+        self.assertGreater(response.usage.completion_tokens, 0)
+
+    def test_error_injection(self):
+        """Test a share of requests fails with the configured statuses and Retry-After"""
+        with FakeLLMServer(error_rate=0.5, error_statuses=[503], retry_after=2, seed=7) as server:
+            statuses = []
+            for _ in range(40):
+                try:
+                    self._complete(server)
+                    statuses.append(200)
+                except openai.APIStatusError as e:
+                    statuses.append(e.status_code)
+                    self.assertEqual(e.response.headers['retry-after'], '2')
+        self.assertEqual(set(statuses), {200, 503})
+        self.assertEqual(server.errors, statuses.count(503))
+        self.assertTrue(10 <= server.errors <= 30)
+
+    def test_streaming_with_delay_distribution(self):
+        """Test streamed replies arrive in chunks and reassemble to the full reply"""
+        with FakeLLMServer(content='streamed reply text', stream_chunk_size=4,
+                           stream_delay='uniform:0,0.01') as server:
+            chunks = [
+                chunk.choices[0].delta.content for chunk in self._complete(server, stream=True)
+                if chunk.choices and chunk.choices[0].delta.content
+            ]
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(''.join(chunks), 'streamed reply text')
+
+class LoadTestTests(TestCase):
+    """Tests for the load generator's statistics and the flow it drives"""
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 95), 95)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([3.0], 99), 3.0)
+        self.assertIsNone(percentile([], 50))
+
+    def test_report(self):
+        """Test the report groups latencies and errors per endpoint"""
+        stats = LoadStats()
+        for ms in range(1, 101):
+            stats.record('create_blog', ms / 1000.0)
+        stats.record('upload', 0.2, ok=False, message='HTTP 500')
+        stats.record_flow(True)
+        stats.record_flow(False, 'upload: HTTP 500')
+
+        report = stats.report(elapsed=10.0)
+        self.assertEqual(list(report['endpoints']), ['upload', 'create_blog'])
+        create = report['endpoints']['create_blog']
+        self.assertEqual((create['requests'], create['errors']), (100, 0))
+        self.assertEqual((create['p50_ms'], create['p95_ms'], create['p99_ms']), (50.0, 95.0, 99.0))
+        self.assertEqual(report['endpoints']['upload']['errors'], 1)
+        self.assertEqual(report['requests'], 101)
+        self.assertEqual(report['requests_per_second'], 10.1)
+        self.assertEqual((report['flows'], report['failed_flows']), (1, 1))
+        self.assertEqual(report['errors'], ['upload: HTTP 500', 'upload: HTTP 500'])
+
+    def test_download_of_generated_blog(self):
+        """Test a blog with JSON outline and draft exports to Word"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        blog = Blog.objects.create(
+            user=user, topic='Solar', target_keywords=['solar'], blog_title='Solar Homes',
+            blog_outline={'H2_1': 'Panels', 'H2_1_1': {'content': 'Cells'}},
+            blog_draft={'introduction': 'Why solar'}
+        )
+        response = client.get(reverse('core:download_blog', args=[blog.id]))
+        self.assertEqual(response.status_code, 200)
+        doc = DocxDocument(io.BytesIO(response.content))
+        text = '\n'.join(paragraph.text for paragraph in doc.paragraphs)
+        self.assertIn('Cells', text)
+        self.assertIn('Why solar', text)
+        self.assertIn('solar', text)
+
+class GenerationAccountingTests(GenerationTestCase):
+    """Tests for per-generation token and latency accounting"""
+    settings_overrides = {
+        'GENERATION_PIPELINE': 'single', 'GENERATION_CACHE_ENABLED': True, 'JOB_QUEUE_ASYNC': True,
+        'LLM_REQUESTS_PER_MINUTE': 0, 'LLM_TOKENS_PER_MINUTE': 0, 'LLM_ROUTES': {},
+    }
+
+    def setUp(self):
+        super().setUp()
+        caches['generation'].clear()
+
+    def make_llm_server(self):
+        return FakeLLMServer()
+
+    def _create(self):
+        job_id = self.client.post(reverse('core:create_blog'), json.dumps({
+            'topic': 'Solar',
+            'user_keywords': 'solar',
+            'document_ids': json.dumps([self.document.id])
+        }), content_type='application/json').json()['job_id']
+        return run_job(job_id)
+
+    def test_job_records_tokens_model_and_stage_timings(self):
+        """Test a generated blog gets a record with its usage and a daily total"""
+        self.assertEqual(self._create(), 'done')
+        record = GenerationRecord.objects.get()
+        self.assertEqual(record.kind, 'create')
+        self.assertEqual(record.blog, Blog.objects.get())
+        self.assertEqual(record.model, BLOG_COMPLETION_PARAMS['model'])
+        self.assertEqual(record.llm_calls, 1)
+        self.assertGreater(record.prompt_tokens, 0)
+        self.assertGreater(record.completion_tokens, 0)
+        self.assertTrue(record.succeeded)
+        self.assertFalse(record.cached)
+        self.assertGreater(record.llm_ms + record.db_ms, 0)
+        self.assertGreaterEqual(
+            record.total_ms,
+            record.extraction_ms + record.context_ms + record.llm_ms + record.parse_ms + record.db_ms
+        )
+
+        daily = GenerationDailyUsage.objects.get(user=self.user)
+        self.assertEqual((daily.generations, daily.failed, daily.llm_calls), (1, 0, 1))
+        self.assertEqual(daily.prompt_tokens, record.prompt_tokens)
+        self.assertEqual(daily.completion_tokens, record.completion_tokens)
+
+    def test_cache_hits_and_failures_are_recorded(self):
+        """Test cached results count no LLM calls and failed generations are kept"""
+        self._create()
+        Blog.objects.all().delete()
+        self.assertEqual(self._create(), 'done')
+        cached = GenerationRecord.objects.filter(cached=True).get()
+        self.assertEqual((cached.llm_calls, cached.prompt_tokens), (0, 0))
+
+        caches['generation'].clear()
+        with patch('core.utils.generate_blog_content', side_effect=Exception('rate limited')):
+            self.assertEqual(self._create(), 'failed')
+        failed = GenerationRecord.objects.get(succeeded=False)
+        self.assertIsNone(failed.blog)
+
+        daily = GenerationDailyUsage.objects.get(user=self.user)
+        self.assertEqual((daily.generations, daily.cached_generations, daily.failed), (3, 1, 1))
+
+    def test_stream_and_section_regeneration_are_recorded(self):
+        """Test streamed blogs estimate their tokens and section edits get their own kind"""
+        response = self.client.post(reverse('core:stream_blog'), json.dumps({
+            'topic': 'Solar',
+            'user_keywords': 'solar',
+            'document_ids': json.dumps([self.document.id])
+        }), content_type='application/json')
+        b''.join(response.streaming_content)
+        stream = GenerationRecord.objects.get(kind='stream')
+        blog = Blog.objects.get()
+        self.assertEqual(stream.blog, blog)
+        self.assertEqual(stream.llm_calls, 1)
+        self.assertGreater(stream.completion_tokens, 0)
+
+        response = self.client.post(
+            reverse('core:regenerate_section', args=[blog.id]),
+            json.dumps({'section': 'title'}), content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        section = GenerationRecord.objects.get(kind='section')
+        self.assertEqual(section.blog, blog)
+        self.assertEqual(section.llm_calls, 1)
+        self.assertTrue(section.succeeded)
+        self.assertEqual(blog.generation_records.count(), 2)
+
+    def test_bulk_generation_records_every_row(self):
+        """Test each bulk row gets a record linked to the blog it produced"""
+        csv_data = b'Topic,Documents\nSolar panels,Product Sheet\nWind turbines,Product Sheet\n'
+        batch, _ = create_bulk_generation(self.user, csv_data, 'topics.csv')
+        run_bulk_generation(batch, concurrency=2, batch_size=1)
+        records = GenerationRecord.objects.filter(kind='bulk')
+        self.assertEqual(records.count(), 2)
+        self.assertEqual(
+            sorted(records.values_list('blog__topic', flat=True)), ['Solar panels', 'Wind turbines']
+        )
+        self.assertTrue(all(record.llm_calls == 1 for record in records))
+        self.assertEqual(GenerationDailyUsage.objects.get(user=self.user).generations, 2)
+
+    def test_usage_report(self):
+        """Test the usage endpoint reports the user's days and only staff see others"""
+        self._create()
+        other = User.objects.create_user(username='other', password='testpass123')
+        with track_generation(other, 'create') as accounting:
+            accounting.add_usage('small-model', 10, 5)
+            accounting.succeeded = True
+
+        data = self.client.get(reverse('core:usage'), {'days': 7}).json()
+        self.assertEqual(data['user'], 'testuser')
+        self.assertEqual(len(data['days']), 1)
+        self.assertEqual(data['days'][0]['day'], timezone.localdate().isoformat())
+        self.assertEqual(data['totals']['generations'], 1)
+        self.assertEqual(self.client.get(reverse('core:usage'), {'user': 'other'}).status_code, 403)
+        self.assertEqual(self.client.get(reverse('core:usage'), {'days': 0}).status_code, 400)
+
+        self.user.is_staff = True
+        self.user.save()
+        data = self.client.get(reverse('core:usage'), {'user': 'all'}).json()
+        self.assertEqual(data['totals']['generations'], 2)
+        data = self.client.get(reverse('core:usage'), {'user': 'other'}).json()
+        self.assertEqual((data['totals']['prompt_tokens'], data['totals']['completion_tokens']), (10, 5))
+
+class JSONRepairTests(GenerationTestCase):
+    """Tests for local JSON repair and continuation of incomplete answers"""
+    create_document = False
+    settings_overrides = {
+        'GENERATION_PIPELINE': 'single', 'GENERATION_MAX_CONTINUATIONS': 2,
+        'LLM_REQUESTS_PER_MINUTE': 0, 'LLM_TOKENS_PER_MINUTE': 0,
+    }
+
+    def setUp(self):
+        self.blog = json.loads(fake_completion_content({
+            'messages': [{'role': 'user', 'content': 'Topic: Solar\nTarget Keywords: solar'}],
+            'response_format': {'type': 'json_object'},
+        }))
+        self.replies = []
+        self.requests = []
+        super().setUp()
+        reset_metrics(REPAIR_METRICS)
+
+    def make_llm_server(self):
+        return FakeLLMServer(content=self._reply)
+
+    def tearDown(self):
+        reset_metrics(REPAIR_METRICS)
+
+    def _reply(self, request):
+        self.requests.append(request)
+        return self.replies.pop(0)
+
+    def test_repairs_common_malformations(self):
+        """Test fences, prose, trailing commas, literals and stray quotes are repaired"""
+        repaired = repair_json('Here it is:\n```json\n{"a": [1, 2,], "b": True, c: None,}\n```')
+        self.assertEqual(repaired.value, {'a': [1, 2], 'b': True, 'c': None})
+        self.assertTrue(repaired.repaired)
+        self.assertFalse(repaired.truncated)
+        repaired = repair_json('{"title": "The "best" panels", "draft": "Line one\nLine two"}')
+        self.assertEqual(repaired.value, {'title': 'The "best" panels', 'draft': 'Line one\nLine two'})
+        self.assertFalse(repair_json('{"a": 1}').repaired)
+        with self.assertRaises(JSONRepairError):
+            repair_json('Sorry, I cannot help with that.')
+
+    def test_reports_where_truncated_text_stopped(self):
+        """Test a cut-off document keeps partial strings and drops incomplete values"""
+        repaired = repair_json('{"blog_title": "Solar", "blog_draft": {"H2_1": "Done.", "H2_2": "Panels conv')
+        self.assertEqual(repaired.value, {'blog_title': 'Solar', 'blog_draft': {'H2_1': 'Done.', 'H2_2': 'Panels conv'}})
+        self.assertEqual(repaired.truncated_path, ('blog_draft', 'H2_2'))
+        repaired = repair_json('{"a": "x\\u00e9", "count": 12')
+        self.assertEqual(repaired.value, {'a': 'x\u00e9'})
+        self.assertEqual(repaired.truncated_path, ('count',))
+
+        # A continuation that repeats the last words is joined without the overlap
+        partial = {'draft': {'H2_1': 'Done.', 'H2_2': 'Panels conv'}}
+        merged = merge_continuation(
+            partial, {'draft': {'H2_2': 'convert sunlight.', 'H2_3': 'Costs.'}}, ('draft', 'H2_2')
+        )
+        self.assertEqual(merged['draft'], {'H2_1': 'Done.', 'H2_2': 'Panels convert sunlight.', 'H2_3': 'Costs.'})
+        self.assertEqual(partial['draft']['H2_2'], 'Panels conv')
+
+    def test_malformed_answer_needs_no_second_call(self):
+        """Test a complete but malformed answer is repaired without asking the model again"""
+        self.replies = ['```json\n' + json.dumps(self.blog)[:-1] + ',}\n```']
+        result = generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        self.assertEqual(result['blog_draft'], self.blog['blog_draft'])
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(get_metrics(REPAIR_METRICS)['blog_responses_repaired'], 1)
+
+    def test_truncated_answer_is_continued(self):
+        """Test a cut-off draft is continued instead of regenerated"""
+        text = json.dumps(self.blog)
+        cut = text.index(self.blog['blog_draft']['H2_2']) + 20
+        remainder = self.blog['blog_draft']['H2_2'][20:]
+        self.replies = [
+            text[:cut],
+            json.dumps({'blog_draft': {
+                'H2_2': remainder, 'H2_3': self.blog['blog_draft']['H2_3'],
+                'conclusion': self.blog['blog_draft']['conclusion'],
+            }}),
+        ]
+        result = generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+
+        self.assertEqual(result['blog_draft'], self.blog['blog_draft'])
+        self.assertEqual(result['blog_title'], self.blog['blog_title'])
+        # The SEO block was never written and gets its defaults
+        self.assertEqual(result['seo_recommendations']['content_gaps'], [])
+        self.assertEqual(len(self.requests), 2)
+        continuation = self.requests[1]['messages']
+        self.assertEqual(continuation[-2]['role'], 'assistant')
+        self.assertIn('blog_draft.H2_2', continuation[-1]['content'])
+        self.assertIn('only these keys: blog_draft', continuation[-1]['content'])
+        stats = get_metrics(REPAIR_METRICS)
+        self.assertEqual((stats['blog_responses_repaired'], stats['blog_continuations']), (1, 1))
+
+    def test_missing_field_is_requested_alone(self):
+        """Test a field the model left out is asked for on its own"""
+        partial = {key: value for key, value in self.blog.items() if key != 'blog_outline'}
+        self.replies = [json.dumps(partial), json.dumps({'blog_outline': self.blog['blog_outline']})]
+        result = generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        self.assertEqual(result['blog_outline'], self.blog['blog_outline'])
+        self.assertIn('only these keys: blog_outline', self.requests[1]['messages'][-1]['content'])
+
+    def test_continuations_are_limited(self):
+        """Test the model is asked at most GENERATION_MAX_CONTINUATIONS times"""
+        self.replies = [json.dumps({'blog_title': 'Solar'}), 'not json', '{"other": 1}']
+        with self.assertRaises(Exception):
+            generate_blog_content('Solar', 'professional', ['solar'], 'Panels.')
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(get_metrics(REPAIR_METRICS)['blog_continuations_failed'], 1)
+
+class FakeLanguageTool:
+    """Stand-in for a LanguageTool instance that flags the word 'teh'"""
+    def __init__(self, delay=0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.checks = 0
+        self.closed = False
+
+    def check(self, text):
+        self.checks += 1
+        if self.fail:
+            raise RuntimeError('server died')
+        time.sleep(self.delay)
+        offset = text.find('teh')
+        if offset < 0:
+            return []
+        return [SimpleNamespace(
+            offset=offset, errorLength=3, message='Possible typo', replacements=['the'],
+            context=text, contextOffset=offset
+        )]
+
+    def close(self):
+        self.closed = True
+
+class GrammarPoolTests(TestCase):
+    """Tests for the warm LanguageTool pool behind grammar checks"""
+    def setUp(self):
+        self.tools = []
+        self.delay = 0
+        reset_metrics(GRAMMAR_METRICS)
+
+    def tearDown(self):
+        reset_metrics(GRAMMAR_METRICS)
+
+    def _factory(self):
+        tool = FakeLanguageTool(delay=self.delay)
+        self.tools.append(tool)
+        return tool
+
+    def test_instances_are_reused(self):
+        """Test checks share one warm instance instead of starting a server each time"""
+        pool = GrammarToolPool(size=2, factory=self._factory)
+        for _ in range(5):
+            matches = pool.check('I saw teh cat.')
+        self.assertEqual(matches[0].replacements, ['the'])
+        self.assertEqual(len(self.tools), 1)
+        self.assertEqual(self.tools[0].checks, 5)
+        self.assertEqual(get_metrics(GRAMMAR_METRICS)['grammar_checks'], 5)
+
+    def test_warm_up_waits_for_the_process_first_request(self):
+        """Test per-process warm-up starts nothing at load and runs once per process"""
+        from django.core.signals import request_started
+
+        with patch('core.grammar.warm_up_grammar_pool') as mock_warm_up, \
+                patch.object(grammar, '_warmed_pid', None):
+            grammar.warm_up_grammar_pool_per_process()
+            self.addCleanup(request_started.disconnect, dispatch_uid='grammar-warmup')
+            mock_warm_up.assert_not_called()
+            request_started.send(sender=None)
+            request_started.send(sender=None)
+            self.assertEqual(mock_warm_up.call_count, 1)
+
+            with patch('core.grammar.os.getpid', return_value=os.getpid() + 1):
+                request_started.send(sender=None)
+            self.assertEqual(mock_warm_up.call_count, 2)
+
+    def test_concurrency_is_bounded_and_requests_queue(self):
+        """Test at most `size` instances run and extra requests wait for one"""
+        self.delay = 0.1
+        pool = GrammarToolPool(size=2, factory=self._factory, timeout=5)
+        self.assertEqual(pool.warm_up(), 2)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=6) as executor:
+            list(executor.map(pool.check, ['teh'] * 6))
+        self.assertEqual(len(self.tools), 2)
+        self.assertEqual(sum(tool.checks for tool in self.tools), 6)
+        self.assertEqual(pool.stats(), {'size': 2, 'started': 2, 'idle': 2})
+
+        held = pool.acquire()
+        busy = GrammarToolPool(size=1, factory=self._factory, timeout=0.1)
+        busy_tool = busy.acquire()
+        with self.assertRaises(GrammarUnavailable):
+            busy.check('teh')
+        busy.release(busy_tool)
+        pool.release(held)
+
+    def test_failed_instances_are_replaced(self):
+        """Test a crashed instance is closed and the next check starts a new one"""
+        pool = GrammarToolPool(size=1, factory=self._factory, health_check_interval=0.05)
+        pool.check('fine')
+        self.tools[0].fail = True
+        with self.assertRaises(RuntimeError):
+            pool.check('teh')
+        self.assertTrue(self.tools[0].closed)
+        self.assertEqual(len(pool.check('teh')), 1)
+        self.assertEqual(len(self.tools), 2)
+
+        # An instance that died while idle is caught by the health check
+        self.tools[1].fail = True
+        time.sleep(0.06)
+        self.assertEqual(len(pool.check('teh')), 1)
+        self.assertEqual(len(self.tools), 3)
+        self.assertEqual(get_metrics(GRAMMAR_METRICS)['grammar_tools_replaced'], 2)
+
+    def test_check_grammar_view(self):
+        """Test the endpoint uses the pool and reports a busy pool as 503"""
+        User.objects.create_user(username='testuser', password='testpass123')
+        client = Client()
+        client.login(username='testuser', password='testpass123')
+        pool = GrammarToolPool(size=1, factory=self._factory, timeout=0.05)
+        with patch('core.utils.get_grammar_pool', return_value=pool):
+            response = client.post(
+                reverse('core:check_grammar'), json.dumps({'text': 'Read teh post.'}),
+                content_type='application/json'
+            )
+            self.assertEqual(response.json()['suggestions'][0]['from'], 5)
+            held = pool.acquire()
+            response = client.post(
+                reverse('core:check_grammar'), json.dumps({'text': 'Read teh post.'}),
+                content_type='application/json'
+            )
+            pool.release(held)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '5')
+
 class BlogTests(TransactionTestCase):
     """Tests for blog creation, generation, and editing"""
     def setUp(self):
@@ -0,0 +1,157 @@
+"""
+Upload handling helpers.
+
+The upload handlers hash files while Django streams them to memory or disk.
+They are installed through FILE_UPLOAD_HANDLERS so every UploadedFile arrives
+with a `sha256` attribute and deduplication never needs a second pass over
+the data.
+"""
+import hashlib
+import mimetypes
+import os
+import zipfile
+
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class Sha256UploadMixin:
+    """Compute the SHA-256 digest of each uploaded file chunk by chunk."""
+
+    def new_file(self, *args, **kwargs):
+        # Set before calling super(): the memory handler raises
+        # StopFutureHandlers from new_file when it takes the upload
+        self.sha256 = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(Sha256UploadMixin, MemoryFileUploadHandler):
+    """Keep small uploads in memory and record their SHA-256 digest."""
+
+
+class HashingTemporaryFileUploadHandler(Sha256UploadMixin, TemporaryFileUploadHandler):
+    """Stream large uploads to a temporary file and record their SHA-256 digest."""
+
+
+def file_sha256(file):
+    """
+    Return the SHA-256 hex digest of an uploaded or stored file.
+
+    Uses the digest computed by the upload handlers when available and
+    otherwise hashes the file in chunks.
+
+    Args:
+        file: Django File or UploadedFile
+
+    Returns:
+        str: Hex digest
+    """
+    digest = getattr(file, 'sha256', None)
+    if digest:
+        return digest
+
+    sha256 = hashlib.sha256()
+    for chunk in file.chunks():
+        sha256.update(chunk)
+    file.seek(0)
+    return sha256.hexdigest()
+
+
+# Content types for archive entries, which carry no type of their own
+EXTENSION_CONTENT_TYPES = {
+    '.pdf': 'application/pdf',
+    '.doc': 'application/msword',
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+
+
+class ArchiveEntryTooLarge(Exception):
+    """Raised when a ZIP entry expands beyond the allowed upload size."""
+
+
+def is_zip_upload(uploaded_file):
+    """Return True if the upload looks like a ZIP archive."""
+    return (
+        uploaded_file.name.lower().endswith('.zip')
+        or uploaded_file.content_type in ('application/zip', 'application/x-zip-compressed')
+    )
+
+
+def iter_zip_entries(uploaded_file, max_entries, max_entry_size, chunk_size=64 * 1024):
+    """
+    Yield the files inside an uploaded ZIP archive one at a time.
+
+    Each entry is decompressed chunk by chunk into its own temporary file
+    (hashing it on the way), so only one entry is ever on disk at once and
+    nothing is held fully in memory. Sizes are enforced on the bytes actually
+    decompressed, not just the archive header.
+
+    Args:
+        uploaded_file: Django UploadedFile containing the archive
+        max_entries (int): Maximum number of files to extract
+        max_entry_size (int): Maximum decompressed size of one file in bytes
+        chunk_size (int): Bytes copied per iteration
+
+    Yields:
+        tuple: (entry name, TemporaryUploadedFile or None, error message or None)
+    """
+    uploaded_file.seek(0)
+    with zipfile.ZipFile(uploaded_file) as archive:
+        entries = [
+            info for info in archive.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith('__MACOSX/')
+            and not os.path.basename(info.filename).startswith('.')
+        ]
+        for index, info in enumerate(entries):
+            name = os.path.basename(info.filename)
+            if index >= max_entries:
+                yield name, None, f"Archive contains more than {max_entries} files."
+                continue
+            if info.file_size > max_entry_size:
+                yield name, None, "File size too large."
+                continue
+
+            content_type = (
+                EXTENSION_CONTENT_TYPES.get(os.path.splitext(name)[1].lower())
+                or mimetypes.guess_type(name)[0]
+                or 'application/octet-stream'
+            )
+            entry_file = TemporaryUploadedFile(name, content_type, 0, None)
+            sha256 = hashlib.sha256()
+            try:
+                with archive.open(info) as source:
+                    size = 0
+                    for chunk in iter(lambda: source.read(chunk_size), b''):
+                        size += len(chunk)
+                        if size > max_entry_size:
+                            raise ArchiveEntryTooLarge()
+                        sha256.update(chunk)
+                        entry_file.write(chunk)
+                entry_file.size = size
+                entry_file.sha256 = sha256.hexdigest()
+                entry_file.seek(0)
+            except ArchiveEntryTooLarge:
+                entry_file.close()
+                yield name, None, "File size too large."
+                continue
+            except (zipfile.BadZipFile, OSError, RuntimeError, NotImplementedError) as e:
+                # RuntimeError: encrypted entry; NotImplementedError: unsupported compression
+                entry_file.close()
+                yield name, None, f"Could not read archive entry: {str(e)}"
+                continue
+
+            try:
+                yield name, entry_file, None
+            finally:
+                entry_file.close()
@@ -10,12 +10,22 @@ urlpatterns = [
     path('logout/', views.user_logout, name='logout'),
     path('dashboard/', views.dashboard, name='dashboard'),
     path('upload/', views.upload_document, name='upload_document'),
+    path('upload/bulk/', views.bulk_upload_documents, name='bulk_upload_documents'),
     path('manage-documents/', views.manage_documents, name='manage_documents'),
+    path('document-status/', views.document_status, name='document_status'),
     path('delete-document/<int:document_id>/', views.delete_document, name='delete_document'),
     path('create-blog/', views.create_blog, name='create_blog'),
+    path('bulk-generate/', views.bulk_generate, name='bulk_generate'),
+    path('bulk-generate/<int:batch_id>/', views.bulk_generation_status, name='bulk_generation_status'),
+    path('create-blog/stream/', views.stream_blog, name='stream_blog'),
+    path('generate-blog/', views.generate_blog, name='generate_blog'),
+    path('jobs/<int:job_id>/', views.job_status, name='job_status'),
     path('edit-blog/<int:blog_id>/', views.edit_blog, name='edit_blog'),
     path('update-blog/<int:blog_id>/', views.update_blog, name='update_blog'),
+    path('regenerate-section/<int:blog_id>/', views.regenerate_section, name='regenerate_section'),
     path('delete-blog/<int:blog_id>/', views.delete_blog, name='delete_blog'),
     path('download-blog/<int:blog_id>/', views.download_blog, name='download_blog'),
     path('check-grammar/', views.check_grammar_view, name='check_grammar'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('usage/', views.usage, name='usage'),
 ] 
\ No newline at end of file
@@ -2,14 +2,32 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
 from django.contrib import messages
-from .models import Blog, Document
+from .models import Blog, BulkGeneration, Document, Job
 from django.http import JsonResponse, StreamingHttpResponse, HttpResponse, HttpResponseForbidden
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 import json
+import math
 import time
-from .utils import extract_text_from_file, generate_blog_content, check_grammar
+from .utils import (
+    generate_blog_content, check_grammar,
+    get_document_content, get_readable_documents, repair_stats, select_documents_context,
+    stream_blog_content
+)
+from .grammar import GrammarUnavailable, grammar_stats
+from .jobs import enqueue_blog_generation, enqueue_bulk_generation, enqueue_document_ingestion, queue_stats
+from .bulk import create_bulk_generation
+from .rate_limit import rate_limit_stats
+from .regeneration import REGENERATION_TARGETS, SectionNotFound, is_regeneration_target, regenerate_blog_part
+from .resilience import ProviderUnavailable, resilience_stats
+from .routing import routing_stats
+from .uploads import is_zip_upload, iter_zip_entries
+from .streaming import sse_event
+from .generation_cache import cache_stats, lookup_generation, store_result
+from .accounting import GenerationAccounting, track_generation, track_stage, usage_report
+import zipfile
 from docx import Document as DocxDocument
 from docx.shared import Pt, Inches
 from docx.enum.text import WD_ALIGN_PARAGRAPH
@@ -107,15 +125,16 @@ def upload_document(request):
             user_doc_dir = os.path.join('media', 'documents', f'user_{request.user.id}')
             os.makedirs(user_doc_dir, exist_ok=True)
             
-            # Create and save the document
-            document = Document(
-                user=request.user,
-                title=title,
-                file=uploaded_file
-            )
-            document.save()
+            # Create and save the document, sharing storage with identical uploads
+            document = Document.create_from_upload(request.user, title, uploaded_file)
             
-            messages.success(request, 'Document uploaded successfully!')
+            # Extract the text once in the background so blog generation can reuse it
+            enqueue_document_ingestion(document)
+            document.refresh_from_db()
+            if document.status == 'failed':
+                messages.warning(request, 'Document uploaded, but no readable text could be extracted from it.')
+            else:
+                messages.success(request, 'Document uploaded successfully!')
             return redirect('core:dashboard')
             
         except Exception as e:
@@ -125,6 +144,128 @@ def upload_document(request):
     
     return render(request, 'core/upload_document.html')
 
+def _ingest_upload(user, uploaded_file, title=None):
+    """
+    Validate one uploaded file with DocumentUploadForm and queue it for ingestion.
+
+    Returns:
+        dict: Per-file result for the bulk upload summary
+    """
+    title = title or os.path.splitext(uploaded_file.name)[0]
+    form = DocumentUploadForm(data={'title': title}, files={'file': uploaded_file})
+    if not form.is_valid():
+        errors = [error for field_errors in form.errors.values() for error in field_errors]
+        return {'name': uploaded_file.name, 'status': 'error', 'errors': errors}
+
+    document = Document.create_from_upload(user, title, uploaded_file)
+    job = enqueue_document_ingestion(document)
+    document.refresh_from_db()
+    return {
+        'name': uploaded_file.name,
+        'status': 'queued' if document.status == 'pending' else document.status,
+        'document_id': document.id,
+        'job_id': job.id,
+    }
+
+@login_required
+@require_POST
+def bulk_upload_documents(request):
+    """
+    Handle uploads of many files or ZIP archives in one request.
+
+    Each file (or archive entry) is validated with DocumentUploadForm,
+    stored and queued for background ingestion; the response summarises
+    the outcome per file.
+    """
+    uploaded_files = request.FILES.getlist('files')
+    if not uploaded_files:
+        return JsonResponse({'error': 'No files were uploaded.'}, status=400)
+
+    max_files = settings.BULK_UPLOAD_MAX_FILES
+    results = []
+    for uploaded_file in uploaded_files:
+        if len(results) >= max_files:
+            results.append({'name': uploaded_file.name, 'status': 'error',
+                            'errors': [f'Too many files. Maximum is {max_files}.']})
+            continue
+
+        if not is_zip_upload(uploaded_file):
+            results.append(_ingest_upload(request.user, uploaded_file))
+            continue
+
+        try:
+            entries = iter_zip_entries(uploaded_file, max_files - len(results), settings.MAX_UPLOAD_SIZE)
+            for name, entry_file, error in entries:
+                if error:
+                    results.append({'name': name, 'status': 'error', 'errors': [error]})
+                else:
+                    results.append(_ingest_upload(request.user, entry_file))
+        except zipfile.BadZipFile:
+            results.append({'name': uploaded_file.name, 'status': 'error',
+                            'errors': ['Invalid ZIP archive.']})
+
+    failed = sum(1 for result in results if result['status'] == 'error')
+    return JsonResponse({
+        'results': results,
+        'uploaded': len(results) - failed,
+        'failed': failed,
+    }, status=201 if failed < len(results) else 400)
+
+def bulk_generation_payload(batch):
+    """
+    Build the JSON status report of a bulk generation batch.
+
+    Returns:
+        dict: Batch id, status, row counts and the report of the last run
+    """
+    return {
+        'batch_id': batch.id,
+        'name': batch.name,
+        'status': batch.status,
+        'status_url': reverse('core:bulk_generation_status', args=[batch.id]),
+        'total': batch.total_rows,
+        'rows': batch.get_counts(),
+        'report': batch.report,
+    }
+
+@login_required
+@require_POST
+def bulk_generate(request):
+    """
+    Start generating a blog for every topic in an uploaded CSV.
+
+    Uploading the same file again resumes its batch, skipping finished rows.
+    Set `retry_failed` to also regenerate rows that failed.
+    """
+    csv_file = request.FILES.get('file')
+    if not csv_file:
+        return JsonResponse({'error': 'No CSV file was uploaded.'}, status=400)
+    if csv_file.size > settings.MAX_UPLOAD_SIZE:
+        return JsonResponse({'error': 'The CSV file is too large.'}, status=400)
+
+    try:
+        batch, created = create_bulk_generation(request.user, csv_file.read(), csv_file.name)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    max_rows = getattr(settings, 'BULK_GENERATION_MAX_ROWS', 1000)
+    if batch.total_rows > max_rows:
+        batch.delete()
+        return JsonResponse({'error': f'Too many topics. Maximum is {max_rows}.'}, status=400)
+
+    retry_failed = request.POST.get('retry_failed') in ('true', 'on', '1')
+    job = enqueue_bulk_generation(batch, retry_failed=retry_failed)
+    batch.refresh_from_db()
+    payload = bulk_generation_payload(batch)
+    payload['created'] = created
+    payload['job'] = job_status_payload(job)
+    return JsonResponse(payload, status=202)
+
+@login_required
+def bulk_generation_status(request, batch_id):
+    """Report the progress of one of the user's bulk generation batches."""
+    batch = get_object_or_404(BulkGeneration, id=batch_id, user=request.user)
+    return JsonResponse(bulk_generation_payload(batch))
+
 @login_required
 def delete_blog(request, blog_id):
     """
@@ -151,168 +292,320 @@ def create_blog(request):
     
     # Handle POST request
     try:
-        # Extract data from request
-        if request.content_type == 'application/json':
-            data = json.loads(request.body)
-        else:
-            data = request.POST.dict()
-            # Handle document_ids from form data
-            document_ids = request.POST.getlist('selected_documents', [])
-            data['document_ids'] = json.dumps(document_ids)
-
-        topic = data.get('topic')
-        tone = data.get('tone', 'professional')
-        user_keywords = [kw.strip() for kw in data.get('user_keywords', '').split(',') if kw.strip()]
-        document_ids = json.loads(data.get('document_ids', '[]'))
-
-        # Validate required fields
-        if not topic:
-            return JsonResponse({'error': 'Topic is required'}, status=400)
-        
-        if not document_ids:
-            return JsonResponse({'error': 'Please select at least one document'}, status=400)
+        params, error = _parse_blog_request(request)
+        if error:
+            return error
+
+        # Generation runs on the worker pool; the client polls the job
+        print(f"Queueing blog generation for topic: {params['topic']}")
+        print(f"Parameters - Tone: {params['tone']}, Keywords: {params['user_keywords']}")
+        job = enqueue_blog_generation(
+            request.user, params['topic'], params['tone'], params['user_keywords'],
+            [document.id for document in params['documents']],
+            regenerate=params['regenerate']
+        )
+        return JsonResponse(job_status_payload(job), status=202)
 
-        # Process selected documents
-        documents_content = []
-        successful_extractions = 0
-        
+    except Exception as e:
+        print(f"Unexpected error in create_blog view: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+def _parse_blog_request(request):
+    """
+    Read and validate the topic, tone, keywords and documents of a blog request.
+
+    Accepts JSON bodies and the create-blog form.
+
+    Returns:
+        tuple: (params dict, None) or (None, JsonResponse with the error)
+    """
+    if request.content_type == 'application/json':
+        data = json.loads(request.body)
+    else:
+        data = request.POST.dict()
+        # Handle document_ids from form data
+        document_ids = request.POST.getlist('selected_documents', [])
+        data['document_ids'] = json.dumps(document_ids)
+
+    topic = data.get('topic')
+    tone = data.get('tone', 'professional')
+    user_keywords = [kw.strip() for kw in data.get('user_keywords', '').split(',') if kw.strip()]
+    document_ids = json.loads(data.get('document_ids', '[]'))
+    # "Regenerate" skips any cached result for the same request
+    regenerate = str(data.get('regenerate', '')).lower() in ('1', 'true', 'on', 'yes')
+
+    # Validate required fields
+    if not topic:
+        return None, JsonResponse({'error': 'Topic is required'}, status=400)
+
+    if not document_ids:
+        return None, JsonResponse({'error': 'Please select at least one document'}, status=400)
+
+    documents = list(Document.objects.filter(id__in=document_ids, user=request.user))
+    if not documents:
+        return None, JsonResponse({'error': 'No valid documents selected'}, status=400)
+
+    return {
+        'topic': topic, 'tone': tone, 'user_keywords': user_keywords,
+        'documents': documents, 'regenerate': regenerate,
+    }, None
+
+@login_required
+@require_POST
+def stream_blog(request):
+    """
+    Generate a blog and stream it to the browser as server-sent events.
+
+    Events: `context` (tokens used for reference material), `token` (each
+    text delta from the model), `field` (a top-level field or H2/H3 section
+    as soon as it is complete), then `done` with the saved blog id or
+    `error`.
+    """
+    accounting = GenerationAccounting(request.user, 'stream')
+    try:
+        params, error = _parse_blog_request(request)
+        if error:
+            return error
+        with accounting.stage('extraction'):
+            readable_documents = get_readable_documents(params['documents'])
+        if not readable_documents:
+            return JsonResponse({
+                'error': 'Could not extract content from any of the selected documents. Please ensure the documents contain readable text.'
+            }, status=400)
+        fingerprint, cached_result = lookup_generation(
+            params['topic'], params['tone'], params['user_keywords'], readable_documents,
+            regenerate=params['regenerate']
+        )
+        accounting.cached = cached_result is not None
+        context = None
+        if cached_result is None:
+            with accounting.stage('context'):
+                context = select_documents_context(
+                    request.user, readable_documents, params['topic'], params['user_keywords']
+                )
+    except Exception as e:
+        print(f"Unexpected error in stream_blog view: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=500)
+
+    def events():
+        # Saved once the stream ends, however it ends
+        with accounting.track():
+            yield from stream_events()
+
+    def stream_events():
         try:
-            documents = Document.objects.filter(id__in=document_ids, user=request.user)
-            if not documents.exists():
-                return JsonResponse({'error': 'No valid documents selected'}, status=400)
-            
-            for doc in documents:
-                try:
-                    print(f"Processing document: {doc.title}")
-                    content = extract_text_from_file(doc.file)
-                    
-                    if content and content not in ["Error extracting text from file", 
-                                                 "No content could be extracted",
-                                                 "No text could be extracted from PDF",
-                                                 "No text could be extracted from DOCX"]:
-                        documents_content.append(f"\n\nDocument: {doc.title}\n{content}")
-                        successful_extractions += 1
+            if cached_result is not None:
+                # Replay the cached fields; nothing is sent to the API
+                result = cached_result
+                yield sse_event('context', {'tokens': 0, 'budget': 0, 'cached': True})
+                for field, value in result.items():
+                    yield sse_event('field', {'path': [field], 'value': value})
+            else:
+                result = None
+                yield sse_event('context', {
+                    'tokens': context['tokens'], 'budget': context['budget'], 'cached': False
+                })
+                for event in stream_blog_content(
+                    params['topic'], params['tone'], params['user_keywords'], context['text']
+                ):
+                    if event['type'] == 'result':
+                        result = event['result']
                     else:
-                        print(f"No content extracted from document: {doc.title}")
-                        
-                except Exception as e:
-                    print(f"Error processing document {doc.title}: {str(e)}")
-                    continue
-            
-            if successful_extractions == 0:
-                return JsonResponse({
-                    'error': 'Could not extract content from any of the selected documents. Please ensure the documents contain readable text.'
-                }, status=400)
-                
-            documents_content = "\n\n".join(documents_content)
-                
+                        yield sse_event(event['type'], {k: v for k, v in event.items() if k != 'type'})
+                if fingerprint:
+                    store_result(fingerprint, result)
+
+            with track_stage('db'):
+                blog = Blog.create_from_generation(
+                    request.user, params['topic'], params['tone'], params['user_keywords'],
+                    params['documents'], result
+                )
+            accounting.blog = blog
+            accounting.succeeded = True
+            print(f"Successfully created blog with ID: {blog.id}")
+            yield sse_event('done', {
+                'blog_id': blog.id,
+                'edit_url': reverse('core:edit_blog', args=[blog.id]),
+            })
+        except ProviderUnavailable as e:
+            print(f"Provider unavailable while streaming: {str(e)}")
+            yield sse_event('error', {'error': str(e), 'retry_after': e.retry_after})
         except Exception as e:
-            print(f"Error processing documents: {str(e)}")
-            return JsonResponse({'error': f'Error processing documents: {str(e)}'}, status=400)
+            print(f"Error streaming blog content: {str(e)}")
+            yield sse_event('error', {'error': str(e)})
 
-        print(f"Generating blog content for topic: {topic}")
-        print(f"Parameters - Tone: {tone}, Keywords: {user_keywords}")
-        print(f"Successfully processed {successful_extractions} documents")
-        print(f"Total content length: {len(documents_content)} characters")
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
-        # Generate blog content using OpenAI
-        try:
-            result = generate_blog_content(
-                topic=topic,
-                tone=tone,
-                target_keywords=user_keywords,
-                documents_content=documents_content
-            )
-        except Exception as e:
-            print(f"Error generating blog content: {str(e)}")
-            return JsonResponse({'error': str(e)}, status=500)
+def job_status_payload(job):
+    """
+    Build the JSON status report of a job.
 
-        # Create Blog instance
-        try:
-            # First create the blog with required fields
-            blog = Blog.objects.create(
-                user=request.user,
-                topic=topic,
-                tone=tone,
-                target_keywords=user_keywords,
-                additional_keywords=result.get('keywords', {}).get('additional_keywords', [])
-            )
-            
-            # Then update with generated content
-            blog.blog_title = result.get('blog_title', topic)
-            blog.blog_outline = result.get('blog_outline', '')
-            blog.blog_draft = result.get('blog_draft', '')
-            blog.save()
-            
-            # Associate selected documents with the blog
-            blog.reference_documents.set(documents)
-            
-            print(f"Successfully created blog with ID: {blog.id}")
+    Args:
+        job (Job): The job to report on
 
-            # Return the created blog data
-            return JsonResponse({
-                'id': blog.id,
-                'topic': blog.topic,
-                'blog_title': blog.blog_title,
-                'blog_outline': blog.blog_outline,
-                'blog_draft': blog.blog_draft,
-                'keywords': {
-                    'user_keywords': user_keywords,
-                    'additional_keywords': result.get('keywords', {}).get('additional_keywords', [])
-                }
-            }, status=201)
+    Returns:
+        dict: Job id, status, timings and the result or error once finished
+    """
+    payload = {
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'status_url': reverse('core:job_status', args=[job.id]),
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        **job.get_timings(),
+    }
+    if job.status == 'done':
+        payload['result'] = job.result
+    elif job.status == 'failed':
+        payload['error'] = job.error
+    return payload
 
-        except Exception as e:
-            print(f"Error saving blog to database: {str(e)}")
-            return JsonResponse({'error': f'Error saving blog: {str(e)}'}, status=500)
+@login_required
+def metrics(request):
+    """Report internal counters to staff users."""
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+    return JsonResponse({
+        'generation_cache': cache_stats(),
+        'job_queue': queue_stats(),
+        'rate_limit': rate_limit_stats(),
+        'resilience': resilience_stats(),
+        'routing': routing_stats(),
+        'json_repair': repair_stats(),
+        'grammar': grammar_stats(),
+    })
 
-    except Exception as e:
-        print(f"Unexpected error in create_blog view: {str(e)}")
-        return JsonResponse({'error': str(e)}, status=500)
+@login_required
+def usage(request):
+    """
+    Report token and latency usage per day.
+
+    `days` (default 30, at most 366) sets the period. Staff users can pass
+    `user` (a username, or `all` for everyone) to report on other users.
+    """
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        return JsonResponse({'error': 'days must be a number'}, status=400)
+    if not 1 <= days <= 366:
+        return JsonResponse({'error': 'days must be between 1 and 366'}, status=400)
+
+    user = request.user
+    username = request.GET.get('user')
+    if username and username != request.user.username:
+        if not request.user.is_staff:
+            return HttpResponseForbidden()
+        if username == 'all':
+            user = None
+        else:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                return JsonResponse({'error': f"Unknown user '{username}'"}, status=404)
+
+    report = usage_report(user, days=days)
+    report['user'] = user.username if user else 'all'
+    return JsonResponse(report)
+
+def provider_unavailable_response(error):
+    """
+    Report a transient provider outage as 503 with a Retry-After header.
+
+    Args:
+        error (ProviderUnavailable): The error raised by the generation call
+
+    Returns:
+        JsonResponse: The error response
+    """
+    response = JsonResponse({'success': False, 'error': str(error), 'retry_after': error.retry_after}, status=503)
+    if error.retry_after:
+        response['Retry-After'] = str(max(int(math.ceil(error.retry_after)), 1))
+    return response
+
+@login_required
+def job_status(request, job_id):
+    """Report the progress of one of the user's background jobs."""
+    job = get_object_or_404(Job, id=job_id, user=request.user)
+    return JsonResponse(job_status_payload(job))
 
 @login_required
 @csrf_exempt
 def generate_blog(request):
+    """
+    Regenerate the content of an existing blog.
+
+    Only one generation of a blog runs at a time: concurrent requests for a
+    blog that is already being generated get a 409 instead of racing to
+    overwrite each other's results.
+    """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
             blog_id = data.get('blog_id')
             
             if not blog_id:
-                return JsonResponse({'error': 'Blog ID is required'}, status=400)
+                return JsonResponse({'success': False, 'error': 'Blog ID is required'}, status=400)
 
             blog = Blog.objects.get(id=blog_id, user=request.user)
             
             # Get the selected documents
             documents = Document.objects.filter(id__in=data.get('document_ids', []), user=request.user)
             if not documents.exists():
-                return JsonResponse({'error': 'No valid documents selected'}, status=400)
-
-            # Extract content from all documents
-            documents_content = ""
-            for document in documents:
-                try:
-                    content = extract_text_from_file(document.file)
-                    documents_content += f"\n\nDocument: {document.title}\n{content}"
-                except Exception as e:
-                    return JsonResponse({'error': f'Error processing document {document.title}: {str(e)}'}, status=500)
-
-            # Generate blog content
-            try:
-                result = generate_blog_content(
-                    topic=blog.topic,
-                    tone=blog.tone,
-                    target_keywords=blog.target_keywords,
-                    documents_content=documents_content
-                )
+                return JsonResponse({'success': False, 'error': 'No valid documents selected'}, status=400)
 
-                # Update blog with generated content
-                blog.blog_title = result['blog_title']
-                blog.user_keywords = result['keywords']['user_keywords']
-                blog.additional_keywords = result['keywords']['additional_keywords']
-                blog.blog_outline = result['blog_outline']
-                blog.blog_draft = result['blog_draft']
-                blog.save()
+            if not blog.claim_generation():
+                return JsonResponse({
+                    'success': False,
+                    'error': 'This blog is already being generated. Please wait for it to finish.'
+                }, status=409)
+
+            try:
+                with track_generation(request.user, 'regenerate', blog=blog) as accounting:
+                    # Make sure every document has been extracted
+                    with track_stage('extraction'):
+                        for document in documents:
+                            try:
+                                get_document_content(document)
+                            except Exception as e:
+                                return JsonResponse({
+                                    'success': False,
+                                    'error': f'Error processing document {document.title}: {str(e)}'
+                                }, status=500)
+
+                    with track_stage('context'):
+                        documents_content = select_documents_context(
+                            request.user, documents, blog.topic, blog.target_keywords
+                        )['text']
+
+                    # Generate blog content
+                    try:
+                        result = generate_blog_content(
+                            topic=blog.topic,
+                            tone=blog.tone,
+                            target_keywords=blog.target_keywords,
+                            documents_content=documents_content
+                        )
+                    except ProviderUnavailable as e:
+                        return provider_unavailable_response(e)
+                    except Exception as e:
+                        return JsonResponse({
+                            'success': False,
+                            'error': f'Error generating blog content: {str(e)}'
+                        }, status=500)
+
+                    with track_stage('db'):
+                        applied = blog.apply_generation(result)
+                    if not applied:
+                        return JsonResponse({
+                            'success': False,
+                            'error': 'The blog was claimed by another generation before this one finished.'
+                        }, status=409)
+                    accounting.succeeded = True
 
                 return JsonResponse({
                     'success': True,
@@ -320,17 +613,109 @@ def generate_blog(request):
                     'blog': {
                         'id': blog.id,
                         'title': blog.blog_title,
-                        'outline': blog.blog_outline
+                        'outline': blog.blog_outline,
+                        'version': blog.version
                     }
                 })
-
-            except Exception as e:
-                return JsonResponse({'error': f'Error generating blog content: {str(e)}'}, status=500)
+            finally:
+                # No-op once apply_generation has released the lock
+                if blog.generation_started_at is not None:
+                    blog.release_generation()
 
         except Blog.DoesNotExist:
-            return JsonResponse({'error': 'Blog not found'}, status=404)
+            return JsonResponse({'success': False, 'error': 'Blog not found'}, status=404)
         except Exception as e:
-            return JsonResponse({'error': str(e)}, status=500)
+            return JsonResponse({'success': False, 'error': str(e)}, status=500)
+    return JsonResponse({'success': False, 'error': 'Invalid request method'}, status=405)
+
+@login_required
+@require_POST
+def regenerate_section(request, blog_id):
+    """
+    Regenerate one part of a blog: its title, its outline or one draft section.
+
+    The JSON body names the part in `section` ('title', 'outline',
+    'introduction', 'conclusion', 'H2_n' or 'H2_n_m'), optionally with
+    `instructions` for the model and the `version` the editor is showing.
+    Only that part is rewritten and saved; the rest of the blog is kept.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON data'}, status=400)
+
+    key = str(data.get('section') or '')
+    if not is_regeneration_target(key):
+        return JsonResponse({
+            'success': False,
+            'error': f"Unknown section '{key}'. Use one of: {', '.join(REGENERATION_TARGETS)}."
+        }, status=400)
+
+    blog = get_object_or_404(Blog, id=blog_id, user=request.user)
+    expected_version = data.get('version')
+    if expected_version is not None and expected_version != blog.version:
+        return JsonResponse({
+            'success': False,
+            'error': 'This blog was changed since you opened it. Reload to get the latest version.',
+            'version': blog.version
+        }, status=409)
+
+    if not blog.claim_generation():
+        return JsonResponse({
+            'success': False,
+            'error': 'This blog is already being generated. Please wait for it to finish.'
+        }, status=409)
+
+    try:
+        with track_generation(request.user, 'section', blog=blog) as accounting:
+            documents_content = ''
+            if key != 'title':
+                with track_stage('extraction'):
+                    readable = get_readable_documents(blog.reference_documents.all())
+                if readable:
+                    with track_stage('context'):
+                        documents_content = select_documents_context(
+                            request.user, readable, blog.topic, blog.target_keywords
+                        )['text']
+
+            try:
+                result = regenerate_blog_part(
+                    blog, key, instructions=str(data.get('instructions') or '')[:1000],
+                    documents_content=documents_content
+                )
+            except SectionNotFound as e:
+                return JsonResponse({'success': False, 'error': str(e)}, status=404)
+            except ProviderUnavailable as e:
+                return provider_unavailable_response(e)
+            except Exception as e:
+                print(f"Error regenerating {key} of blog {blog.id}: {str(e)}")
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Error regenerating {key}: {str(e)}'
+                }, status=500)
+
+            with track_stage('db'):
+                applied = blog.apply_partial_generation({result['field']: result['value']})
+            if not applied:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'The blog was claimed by another generation before this one finished.'
+                }, status=409)
+            accounting.succeeded = True
+
+        return JsonResponse({
+            'success': True,
+            'section': key,
+            'field': result['field'],
+            'content': result['content'],
+            'version': blog.version,
+            'usage': result['usage'],
+            'elapsed_seconds': result['elapsed_seconds'],
+        })
+    finally:
+        # No-op once apply_partial_generation has released the lock
+        if blog.generation_started_at is not None:
+            blog.release_generation()
 
 @login_required
 def edit_blog(request, blog_id):
@@ -445,15 +830,28 @@ def update_blog(request, blog_id):
         # Get data from JSON body
         data = json.loads(request.body)
         
-        # Update blog fields
-        blog.blog_title = data.get('blog_title', blog.blog_title)
-        blog.blog_outline = data.get('blog_outline', blog.blog_outline)
-        blog.blog_draft = data.get('blog_draft', blog.blog_draft)
-        blog.save()
+        # Update blog fields; 'version' (optional) is the version the edit is based on
+        fields = {
+            'blog_title': data.get('blog_title', blog.blog_title),
+            'blog_outline': data.get('blog_outline', blog.blog_outline),
+            'blog_draft': data.get('blog_draft', blog.blog_draft),
+        }
+        expected_version = data.get('version')
+        if not blog.update_content(fields, expected_version=expected_version):
+            blog.refresh_from_db()
+            error = ('This blog is being regenerated. Please wait for it to finish.'
+                     if blog.is_generating() else
+                     'This blog was changed since you opened it. Reload to get the latest version.')
+            return JsonResponse({
+                'success': False,
+                'error': error,
+                'version': blog.version
+            }, status=409)
         
         return JsonResponse({
             'success': True,
-            'message': 'Blog updated successfully'
+            'message': 'Blog updated successfully',
+            'version': blog.version
         })
     except Blog.DoesNotExist:
         return JsonResponse({
@@ -471,6 +869,15 @@ def update_blog(request, blog_id):
             'error': str(e)
         }, status=500)
 
+def _plain_text(content):
+    """Flatten a JSON outline or draft into paragraphs for the Word export."""
+    if isinstance(content, dict):
+        return '\n\n'.join(
+            value.get('content', '') if isinstance(value, dict) else str(value)
+            for value in content.values()
+        )
+    return str(content or '')
+
 @login_required
 def download_blog(request, blog_id):
     try:
@@ -487,18 +894,18 @@ def download_blog(request, blog_id):
         doc.add_heading('Keywords', level=2)
         keywords_para = doc.add_paragraph()
         keywords_para.add_run('User Keywords: ').bold = True
-        keywords_para.add_run(', '.join(blog.user_keywords))
+        keywords_para.add_run(', '.join(blog.target_keywords))
         keywords_para = doc.add_paragraph()
         keywords_para.add_run('Additional Keywords: ').bold = True
         keywords_para.add_run(', '.join(blog.additional_keywords))
         
         # Add outline section
         doc.add_heading('Outline', level=2)
-        outline_para = doc.add_paragraph(blog.blog_outline)
+        outline_para = doc.add_paragraph(_plain_text(blog.blog_outline))
         
         # Add draft section
         doc.add_heading('Draft', level=2)
-        draft_para = doc.add_paragraph(blog.blog_draft)
+        draft_para = doc.add_paragraph(_plain_text(blog.blog_draft))
         
         # Create a BytesIO object to save the document
         doc_io = io.BytesIO()
@@ -516,10 +923,10 @@ def download_blog(request, blog_id):
         
     except Blog.DoesNotExist:
         messages.error(request, 'Blog not found')
-        return redirect('dashboard')
+        return redirect('core:dashboard')
     except Exception as e:
         messages.error(request, f'Error downloading blog: {str(e)}')
-        return redirect('dashboard')
+        return redirect('core:dashboard')
 
 @login_required
 @require_POST
@@ -534,6 +941,10 @@ def check_grammar_view(request):
         suggestions = check_grammar(text)
         return JsonResponse({'suggestions': suggestions})
         
+    except GrammarUnavailable as e:
+        response = JsonResponse({'error': str(e)}, status=503)
+        response['Retry-After'] = '5'
+        return response
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -545,6 +956,26 @@ def manage_documents(request):
     documents = Document.objects.filter(user=request.user).order_by('-uploaded_at')
     return render(request, 'core/manage_documents.html', {'documents': documents})
 
+@login_required
+def document_status(request):
+    """
+    Return the processing status of the user's documents as JSON.
+
+    Accepts an optional comma-separated `ids` query parameter so pages can
+    poll only the documents that are still being processed.
+    """
+    documents = Document.objects.filter(user=request.user)
+    ids = request.GET.get('ids')
+    if ids:
+        try:
+            documents = documents.filter(id__in=[int(i) for i in ids.split(',') if i])
+        except ValueError:
+            return JsonResponse({'error': 'Invalid document ids'}, status=400)
+
+    return JsonResponse({
+        'documents': list(documents.values('id', 'status', 'word_count'))
+    })
+
 @login_required
 def delete_document(request, document_id):
     """
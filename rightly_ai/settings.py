@@ -23,6 +23,48 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Get OpenAI API key from environment variables
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 
+# OpenAI client pool (see core.llm). OPENAI_BASE_URL can point at a local
+# fake endpoint for tests and benchmarks.
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))
+OPENAI_KEEPALIVE_EXPIRY = 60  # Seconds an idle connection is kept open
+OPENAI_CONNECT_TIMEOUT = 5
+OPENAI_READ_TIMEOUT = 120
+OPENAI_MAX_RETRIES = 0  # Retries are handled by core.resilience
+OPENAI_WARMUP = os.getenv('OPENAI_WARMUP', 'True') == 'True'
+
+# Grammar checking (see core.grammar). Each web process keeps GRAMMAR_POOL_SIZE
+# warm LanguageTool instances, started with its first request; a request waits
+# up to GRAMMAR_QUEUE_TIMEOUT seconds for an idle one. Every local instance is a
+# Java server using several hundred MB, so N web workers cost N x GRAMMAR_POOL_SIZE
+# JVMs: in production set LANGUAGETOOL_URL to one shared LanguageTool server
+# (e.g. http://localhost:8081), which makes the instances thin HTTP clients.
+GRAMMAR_LANGUAGE = 'en-US'
+GRAMMAR_POOL_SIZE = int(os.getenv('GRAMMAR_POOL_SIZE', 2))
+GRAMMAR_QUEUE_TIMEOUT = 10
+GRAMMAR_HEALTH_CHECK_INTERVAL = 60  # Idle seconds after which an instance is checked before use
+GRAMMAR_WARMUP = os.getenv('GRAMMAR_WARMUP', 'True') == 'True'
+LANGUAGETOOL_URL = os.getenv('LANGUAGETOOL_URL', '')
+
+# Global LLM rate limit shared by all processes (see core.rate_limit); 0 disables a limit.
+# Keep these a little under the account's provider limits.
+LLM_REQUESTS_PER_MINUTE = int(os.getenv('LLM_REQUESTS_PER_MINUTE', 450))
+LLM_TOKENS_PER_MINUTE = int(os.getenv('LLM_TOKENS_PER_MINUTE', 250000))
+LLM_RATE_LIMIT_MAX_WAIT = 120  # Seconds a request may wait for the limiter
+
+# Retries, deadlines, hedging and circuit breaking (see core.resilience)
+LLM_ATTEMPT_TIMEOUT = 120  # Seconds per attempt
+LLM_DEADLINE = 300  # Seconds across all attempts of one call
+LLM_MAX_ATTEMPTS = 4
+LLM_RETRY_BASE_DELAY = 0.5
+LLM_RETRY_MAX_DELAY = 20
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'False') == 'True'
+LLM_HEDGE_PERCENTILE = 95  # Send a hedge request once an attempt is slower than this
+LLM_HEDGE_MIN_SAMPLES = 20  # Calls of a stage needed before it is hedged
+LLM_HEDGE_MIN_DELAY = 1.0
+LLM_CIRCUIT_FAILURE_THRESHOLD = 5  # Consecutive transient failures that open the breaker
+LLM_CIRCUIT_RESET_TIMEOUT = 30  # Seconds before a trial call is let through
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
@@ -86,6 +128,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Seconds a write waits for another connection's lock before failing
+            'timeout': int(os.getenv('SQLITE_TIMEOUT', '20')),
+            # Transactions take the write lock up front; a deferred transaction
+            # that reads and then writes fails at once under concurrent writers
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -142,6 +191,133 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 # Create media directory if it doesn't exist
 os.makedirs(MEDIA_ROOT, exist_ok=True)
 
+# Maximum size of a single uploaded document (10MB)
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+# Limits for the bulk upload endpoint
+BULK_UPLOAD_MAX_FILES = 100
+
+# Hash uploads while they stream in so identical files can be deduplicated
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.HashingMemoryFileUploadHandler',
+    'core.uploads.HashingTemporaryFileUploadHandler',
+]
+
+# Background job queue
+# Jobs are stored in the database and processed by `manage.py run_workers`.
+# Set JOB_QUEUE_ASYNC=False to run jobs inline (no worker process needed).
+JOB_QUEUE_ASYNC = os.getenv('JOB_QUEUE_ASYNC', 'True') == 'True'
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', os.cpu_count() or 1))
+JOB_POLL_INTERVAL = 1.0
+JOB_HEARTBEAT_INTERVAL = 30  # Seconds between dispatcher heartbeats for running jobs
+JOB_STALE_AFTER = 5 * 60  # Seconds without a heartbeat before a running job is requeued
+BLOG_GENERATION_LOCK_TIMEOUT = 10 * 60  # Seconds before an abandoned blog generation lock expires
+
+# Bulk generation from topic CSVs (see core.bulk)
+BULK_GENERATION_CONCURRENCY = int(os.getenv('BULK_GENERATION_CONCURRENCY', 4))
+BULK_GENERATION_BATCH_SIZE = 20  # Blogs written per transaction
+BULK_GENERATION_MAX_ROWS = 1000
+
+# PDF extraction
+# PDFs with at least PDF_PARALLEL_MIN_PAGES pages are split into page ranges
+# and extracted by up to PDF_EXTRACTION_WORKERS processes; pages that take
+# longer than PDF_PAGE_TIMEOUT seconds are skipped. Each job worker runs its
+# own pool, so the pool is also capped at cpu_count // JOB_WORKERS processes:
+# with one job worker per CPU, PDFs are extracted serially. Lower JOB_WORKERS
+# to give PDF-heavy ingestion more processes per file.
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', min(4, os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = 40
+PDF_PAGE_TIMEOUT = 10
+
+# Upper bound on the text kept per document so extraction memory stays
+# bounded for very large files (0 disables the cap)
+DOCUMENT_MAX_EXTRACTED_CHARS = 2_000_000
+
+# Passage retrieval
+# Documents are split into ~RETRIEVAL_CHUNK_WORDS-word passages at ingestion
+# and indexed per user with BM25; indexes are persisted in RETRIEVAL_INDEX_DIR.
+RETRIEVAL_CHUNK_WORDS = 150
+RETRIEVAL_MAX_PASSAGES = 8
+RETRIEVAL_INDEX_DIR = os.path.join(BASE_DIR, 'indexes')
+
+# Fuse BM25 with an incremental hashed TF-IDF index (requires NumPy/SciPy).
+# Each ingested or deleted document rewrites its owner's whole index file.
+RETRIEVAL_USE_TFIDF = True
+SIMILARITY_HASH_FEATURES = 2 ** 18
+
+# Generation context
+# Reference passages are packed into CONTEXT_TOKEN_BUDGET prompt tokens, with
+# an equal share per selected document, from the top
+# CONTEXT_CANDIDATE_PASSAGES retrieved passages. Tokens are counted with the
+# blog route's tokenizer when tiktoken is installed, and estimated otherwise.
+CONTEXT_TOKEN_BUDGET = 3000
+CONTEXT_CANDIDATE_PASSAGES = 40
+
+# Blog generation pipeline
+# 'sectioned' generates the outline first and then drafts up to
+# GENERATION_SECTION_CONCURRENCY sections at once; 'single' asks for the
+# whole blog in one completion.
+GENERATION_PIPELINE = os.getenv('GENERATION_PIPELINE', 'sectioned')
+GENERATION_SECTION_CONCURRENCY = int(os.getenv('GENERATION_SECTION_CONCURRENCY', 4))
+GENERATION_OUTLINE_MAX_TOKENS = 1500
+GENERATION_SECTION_MAX_TOKENS = 1500
+GENERATION_SECTION_CONTEXT_TOKENS = 1500
+# Incomplete or truncated JSON answers are repaired locally; fields that are
+# still missing are requested from the model up to this many times instead
+# of regenerating the whole blog (see core.json_repair)
+GENERATION_MAX_CONTINUATIONS = 2
+
+# Model routing per pipeline stage (see core.routing). A route can set the
+# model, max_tokens and temperature of a stage, and a latency_budget in
+# seconds after which the request goes to fallback_model instead. Stage
+# timings and token usage are reported at /metrics/.
+LLM_PRIMARY_MODEL = os.getenv('LLM_PRIMARY_MODEL', 'gpt-4-turbo-preview')
+LLM_FAST_MODEL = os.getenv('LLM_FAST_MODEL', 'gpt-4o-mini')
+LLM_ROUTES = {
+    'blog': {'model': LLM_PRIMARY_MODEL, 'latency_budget': 90, 'fallback_model': LLM_FAST_MODEL},
+    'stream': {'model': LLM_PRIMARY_MODEL},
+    'outline': {'model': LLM_PRIMARY_MODEL, 'max_tokens': GENERATION_OUTLINE_MAX_TOKENS,
+                'latency_budget': 30, 'fallback_model': LLM_FAST_MODEL},
+    'section': {'model': LLM_PRIMARY_MODEL, 'max_tokens': GENERATION_SECTION_MAX_TOKENS,
+                'latency_budget': 45, 'fallback_model': LLM_FAST_MODEL},
+    # Titles are short; the fast model is good enough
+    'title': {'model': LLM_FAST_MODEL, 'max_tokens': 100, 'temperature': 0.7},
+    # Continuations of incomplete answers keep the voice of the primary model
+    'continuation': {'model': LLM_PRIMARY_MODEL},
+}
+LLM_ROUTE_PROBE_INTERVAL = 10  # Every Nth call of an over-budget route still tries the primary model
+LLM_ROUTE_RECOVERY_PROBES = 3  # Consecutive probes within budget that clear the primary's latency history
+
+# Caches
+# The `generation` alias holds cached blog generation results; its backend
+# evicts least recently used entries past MAX_ENTRIES and expires them after
+# TIMEOUT seconds. Use a shared backend (e.g. Redis) to share results and
+# metrics between processes.
+GENERATION_CACHE_ENABLED = os.getenv('GENERATION_CACHE_ENABLED', 'False') == 'True'
+GENERATION_CACHE_TTL = int(os.getenv('GENERATION_CACHE_TTL', 24 * 60 * 60))
+GENERATION_CACHE_MAX_ENTRIES = 500
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'generation': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'generation',
+        'TIMEOUT': GENERATION_CACHE_TTL,
+        'OPTIONS': {'MAX_ENTRIES': GENERATION_CACHE_MAX_ENTRIES},
+    },
+}
+
+# Document summaries
+# Built once at ingestion: sections of SUMMARY_SECTION_WORDS words are reduced
+# to SUMMARY_SECTION_SENTENCES sentences, then rolled up SUMMARY_FANOUT at a
+# time until the document summary fits in SUMMARY_MAX_TOKENS tokens.
+SUMMARY_SECTION_WORDS = 800
+SUMMARY_SECTION_SENTENCES = 3
+SUMMARY_FANOUT = 8
+SUMMARY_MAX_TOKENS = 400
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rightly_ai.settings')
 
 application = get_wsgi_application()
+
+# Open the pooled API connection before the first request arrives. The grammar
+# checkers start with each process's first request instead, so a preloading
+# master does not start Java servers its forked workers would discard.
+from core.grammar import warm_up_grammar_pool_per_process  # noqa: E402
+from core.llm import warm_up_client  # noqa: E402
+
+warm_up_client()
+warm_up_grammar_pool_per_process()